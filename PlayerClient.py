@@ -7,6 +7,7 @@ import socket
 # import pdb
 # import numpy as np
 # import time
+from protocol import send_message, recv_message
 from texas_holdem import *
 
 
@@ -22,34 +23,35 @@ s = socket.socket()
 s.connect((HOST, PORT))
 
 while True:
-    data = s.recv(1024)
-    if data.decode("utf-8") == 'request_name':
+    cmd, payload = recv_message(s)
+    if cmd == 'request_name':
         print(f'----- ----- ----- ----- ----- ----- Set Player Name ----- ----- ----- ----- ----- -----')
         print(f'Received command: request_name')
-        s.send(str.encode(PLAYER_NAME))
+        send_message(s, 'player_name', PLAYER_NAME)
         print(f'Sent message: {PLAYER_NAME}')
-        client_response = str(s.recv(20480), "utf-8")
+        cmd, client_response = recv_message(s)
         # print(client_response, end="")
         # print('\n')
         break
 
 while True:
-    data = s.recv(20480)
-    # print(data, end=".")
+    cmd, payload = recv_message(s)
+    # print(cmd, payload, end=".")
 
-    if data.decode("utf-8") == f'sending_initial_points':
-        print(f'----- ----- ----- ----- ----- ----- Receive Initial Points ----- ----- ----- ----- ----- -----')
-        print(f'Received command: sending_initial_points')
+    if cmd == 'heartbeat':
+        send_message(s, 'heartbeat')
 
-        my_response = 'acknowledged_initial_points'
-        print(f'Sent message: {my_response}')
-        s.send(str.encode(my_response))
+    if cmd == 'seat_resumed':
+        print(f'----- ----- ----- ----- ----- ----- Seat Resumed ----- ----- ----- ----- ----- -----')
+        print(f'Resumed the seat at table {payload["TABLE"]} with {payload["POINTS"]} points')
+        player_agent.points = int(payload['POINTS'])
 
-        initial_points = str(s.recv(20480), "utf-8")
-        print(f'Received initial points: {int(initial_points)}')
-        player_agent.points = int(initial_points)
+    if cmd == 'sending_initial_points':
+        print(f'----- ----- ----- ----- ----- ----- Receive Initial Points ----- ----- ----- ----- ----- -----')
+        print(f'Received initial points: {int(payload)}')
+        player_agent.points = int(payload)
 
-    if data.decode("utf-8") == f'game_start_reset':
+    if cmd == 'game_start_reset':
         print(f'----- ----- ----- ----- ----- ----- ----- ---- ----- ----- ----- ----- ----- -----')
         print(f'----- ----- ----- ----- ----- ----- Game Start ----- ----- ----- ----- ----- -----')
         print(f'----- ----- ----- ----- ----- ----- ----- ---- ----- ----- ----- ----- ----- -----')
@@ -58,181 +60,64 @@ while True:
         player_agent.hand = []
         player_agent.round_requirement_met = False
         player_agent.in_game = True
+        player_agent.self_past_rounds_commited = 0
+        player_agent.self_current_round_commited = 0
 
-        my_response = 'acknowledged_game_start_reset'
-        print(f'Sent message: {my_response}')
-        s.send(str.encode(my_response))
-
-    if data.decode("utf-8") == f'sending_small_blind':
+    if cmd == 'sending_small_blind':
         print(f'----- ----- ----- ----- ----- ----- Set Small Blind ----- ----- ----- ----- ----- -----')
-        print(f'Received command: sending_small_blind')
-
-        my_response = 'acknowledged_small_blind'
-        print(f'Sent message: {my_response}')
-        s.send(str.encode(my_response))
-
-        small_blind = str(s.recv(20480), "utf-8")
-        print(f'Received small blind: {small_blind}')
-        player_agent.points -= int(small_blind)
-        player_agent.self_current_round_commited = int(small_blind)
+        print(f'Received small blind: {payload}')
+        player_agent.points -= int(payload)
+        player_agent.self_current_round_commited = int(payload)
 
-    if data.decode("utf-8") == f'sending_big_blind':
+    if cmd == 'sending_big_blind':
         print(f'----- ----- ----- ----- ----- ----- Set Big Blind ----- ----- ----- ----- ----- -----')
-        print(f'Received command: sending_big_blind')
+        print(f'Received big blind: {payload}')
+        player_agent.points -= int(payload)
+        player_agent.self_current_round_commited = int(payload)
 
-        my_response = 'acknowledged_big_blind'
-        print(f'Sent message: {my_response}')
-        s.send(str.encode(my_response))
-
-        big_blind = str(s.recv(20480), "utf-8")
-        print(f'Received big blind: {big_blind}')
-        player_agent.points -= int(big_blind)
-        player_agent.self_current_round_commited = int(big_blind)
-
-    if data.decode("utf-8") == f'sending_initial_hand':
+    if cmd == 'sending_initial_hand':
         print(f'----- ----- ----- ----- ----- ----- Receive Initial Hand ----- ----- ----- ----- ----- -----')
-        print(f'Received command: sending_initial_hand')
-
-        my_response = 'acknowledged_initial_hand'
-        print(f'Sent message: {my_response}')
-        s.send(str.encode(my_response))
+        print(f'Received initial hands: {payload}')
+        player_agent.dealed_card(payload['first_card'])
+        player_agent.dealed_card(payload['second_card'])
 
-        initial_hands = str(s.recv(20480), "utf-8")
-        initial_hands = ast.literal_eval(initial_hands)
-        print(f'Received initial hands: {initial_hands}')
-        player_agent.dealed_card(initial_hands['first_card'])
-        player_agent.dealed_card(initial_hands['second_card'])
-
-    if data.decode("utf-8") == f'request_round_0_move':
-        print(f'----- ----- ----- ----- ----- ----- Player Round 0 Move ----- ----- ----- ----- ----- -----')
-        print(f'Received command: request_round_0_move')
-
-        my_response = 'acknowledged_request'
-        print(f'Sent message: {my_response}')
-        s.send(str.encode(my_response))
+    if cmd in ('request_round_0_move', 'request_round_1_move', 'request_round_2_move', 'request_round_3_move'):
+        print(f'----- ----- ----- ----- ----- ----- Player Round {cmd[14]} Move ----- ----- ----- ----- ----- -----')
+        print(f'Received game info: {payload}')
 
         player_agent.round_requirement_met = False
 
-        game_info = str(s.recv(20480), "utf-8")
-        game_info = ast.literal_eval(game_info)
-        print(f'Received game info: {game_info}')
-
-        my_response = player_agent.ask_for_move(int(game_info['CURRENT_BET']))
+        if payload.get('TIME_LIMIT') is not None:
+            print(f'You have {payload["TIME_LIMIT"]:.0f} seconds to move.')
+        my_response = player_agent.ask_for_move(int(payload['CURRENT_BET']))
+        my_response['DECISION'] = payload.get('DECISION')
         print(f'Sent player info: {my_response}')
-        s.send(str.encode(str(my_response)))
-
-    if data.decode("utf-8") == f'round_end_update':
+        send_message(s, 'player_move', my_response)
+
+    if cmd == 'timer_event':
+        if payload['EVENT'] == 'timeout':
+            print(f'Player {payload["PLAYER"]} ran out of time, the server played: {payload["MOVE"]}')
+        else:
+            print(f'Player {payload["PLAYER"]} used {payload["BANK_USED"]:.1f} seconds of the time bank, '
+                  f'{payload["BANK_LEFT"]:.1f} left')
+
+    if cmd in ('move_timeout', 'move_corrected'):
+        print(f'----- ----- ----- ----- ----- ----- Move Corrected ----- ----- ----- ----- ----- -----')
+        print(f'The server played: {payload["MOVE"]} ({cmd})')
+        player_agent.points = int(payload['POINTS'])
+        player_agent.self_current_round_commited = int(payload['CURRENT_COMMITED'])
+        player_agent.in_game = payload['IN_GAME']
+
+    if cmd == 'round_end_update':
         print(f'----- ----- ----- ----- ----- ----- Round End Update ----- ----- ----- ----- ----- -----')
-        print(f'Received command: round_end_update')
-
         player_agent.self_past_rounds_commited += player_agent.self_current_round_commited
         player_agent.self_current_round_commited = 0
 
-        my_response = 'acknowledged_round_end_update'
-        print(f'Sent message: {my_response}')
-        s.send(str.encode(my_response))
-
-    if data.decode("utf-8") == f'request_round_1_move':
-        print(f'----- ----- ----- ----- ----- ----- Player Round 1 Move ----- ----- ----- ----- ----- -----')
-        print(f'Received command: request_round_1_move')
-
-        my_response = 'acknowledged_request'
-        print(f'Sent message: {my_response}')
-        s.send(str.encode(my_response))
-
-        player_agent.round_requirement_met = False
-
-        game_info = str(s.recv(20480), "utf-8")
-        game_info = ast.literal_eval(game_info)
-        print(f'Received game info: {game_info}')
-
-        my_response = player_agent.ask_for_move(int(game_info['CURRENT_BET']))
-        print(f'Sent player info: {my_response}')
-        s.send(str.encode(str(my_response)))
-
-    if data.decode("utf-8") == f'request_round_2_move':
-        print(f'----- ----- ----- ----- ----- ----- Player Round 2 Move ----- ----- ----- ----- ----- -----')
-        print(f'Received command: request_round_2_move')
-
-        my_response = 'acknowledged_request'
-        print(f'Sent message: {my_response}')
-        s.send(str.encode(my_response))
-
-        player_agent.round_requirement_met = False
-
-        game_info = str(s.recv(20480), "utf-8")
-        game_info = ast.literal_eval(game_info)
-        print(f'Received game info: {game_info}')
-
-        my_response = player_agent.ask_for_move(int(game_info['CURRENT_BET']))
-        print(f'Sent player info: {my_response}')
-        s.send(str.encode(str(my_response)))
-
-    if data.decode("utf-8") == f'request_round_3_move':
-        print(f'----- ----- ----- ----- ----- ----- Player Round 3 Move ----- ----- ----- ----- ----- -----')
-        print(f'Received command: request_round_3_move')
-
-        my_response = 'acknowledged_request'
-        print(f'Sent message: {my_response}')
-        s.send(str.encode(my_response))
-
-        player_agent.round_requirement_met = False
-
-        game_info = str(s.recv(20480), "utf-8")
-        game_info = ast.literal_eval(game_info)
-        print(f'Received game info: {game_info}')
-
-        my_response = player_agent.ask_for_move(int(game_info['CURRENT_BET']))
-        print(f'Sent player info: {my_response}')
-        s.send(str.encode(str(my_response)))
-
-    if data.decode("utf-8") == f'game_end_hand_update':
-        print(f'----- ----- ----- ----- ----- ----- Game End Hand Update ----- ----- ----- ----- ----- -----')
-        print(f'Received command: game_end_hand_update')
-
-        my_response = 'acknowledged_game_end_hand_update'
-        print(f'Sent message: {my_response}')
-        s.send(str.encode(my_response))
-
-        hand_info = str(s.recv(20480), "utf-8")
-        hand_info = ast.literal_eval(hand_info)
-        print(f'Received hand info: {hand_info}')
-
-    if data.decode("utf-8") == f'game_end_bet_update':
-        print(f'----- ----- ----- ----- ----- ----- Game End Bet Update ----- ----- ----- ----- ----- -----')
-        print(f'Received command: game_end_bet_update')
-
-        my_response = 'acknowledged_game_end_bet_update'
-        print(f'Sent message: {my_response}')
-        s.send(str.encode(my_response))
-
-        bet_info = str(s.recv(20480), "utf-8")
-        bet_info = ast.literal_eval(bet_info)
-        print(f'Received bet info: {bet_info}')
-
-    if data.decode("utf-8") == f'game_end_return_update':
-        print(f'----- ----- ----- ----- ----- ----- Game End Return Update ----- ----- ----- ----- ----- -----')
-        print(f'Received command: game_end_return_update')
-
-        my_response = 'acknowledged_game_end_return_update'
-        print(f'Sent message: {my_response}')
-        s.send(str.encode(my_response))
-
-        return_info = str(s.recv(20480), "utf-8")
-        return_info = ast.literal_eval(return_info)
-        print(f'Received return info: {bet_info}')
-
-    if data.decode("utf-8") == f'game_end_points_update':
-        print(f'----- ----- ----- ----- ----- ----- Game End Points Update ----- ----- ----- ----- ----- -----')
-        print(f'Received command: game_end_points_update')
-
-        my_response = 'acknowledged_game_end_points_update'
-        print(f'Sent message: {my_response}')
-        s.send(str.encode(my_response))
-
-        points_info = str(s.recv(20480), "utf-8")
-        points_info = ast.literal_eval(points_info)
-        print(f'Received return info: {points_info}')
-
-        player_agent.points += int(points_info['RETURN'])
+    if cmd == 'game_end_update':
+        print(f'----- ----- ----- ----- ----- ----- Game End Update ----- ----- ----- ----- ----- -----')
+        print(f'Received hand info: {payload["HANDS"]}')
+        print(f'Received bet info: {payload["BETS"]}')
+        print(f'Received return info: {payload["RETURNS"]}')
+        print(f'Received points info: {payload}')
 
+        player_agent.points += int(payload['END_RETURN'])
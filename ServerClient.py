@@ -1,222 +1,572 @@
 # %% import libraries
-import json
+import asyncio
+import multiprocessing
+import os
+import signal
 import socket
 import threading
-from queue import Queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.reduction import recv_handle, send_handle
+from hand_history import HandHistoryWriter
+from metrics import ServerMetrics
+from player_stats import StatsAggregator
+from protocol import encode_message, read_message
 from texas_holdem import *
+from tournament import Tournament
 
 
 # %% server parameters
-N_THREADS = 2
-JOB_NUMBER = [1, 2]
-QUEUE = Queue()
-ALL_CONNECTIONS = []
-ALL_ADDRESSES = []
-COUNT = [0]
-NAMES = []
-STORAGE = {}
-ENV = None
-
-host = ''
-port = 12345
-s = None
-
-# scores = []
-# median = 0
-
-
-# %% create worker threads
-def create_workers():
-    for _ in range(N_THREADS):
-        t = threading.Thread(target=work)
-        t.daemon = True
-        t.start()
-
-
-# %% create jobs
-def create_jobs():
-    for x in JOB_NUMBER:
-        QUEUE.put(x)
-    QUEUE.join()
-
-
-# %% do next job that is in the queue (handle connections, send commands)
-def work():
-    while True:
-        x = QUEUE.get()
-        if x == 1:
-            create_socket()
-            bind_socket()
-            accepting_connections()
-        if x == 2:
-            start_command()
-        QUEUE.task_done()
-
-
-# %% create a socket that connects two computers
-def create_socket():
-    try:
-        global host
-        global port
-        global s
-
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.setblocking(True)
-    except socket.error as msg:
-        print(f'***** WARNING: Socket creation error: {str(msg)} *****')
-
-
-# %% binding the socket and listening for connections
-def bind_socket():
-    try:
-        global host
-        global port
-        global s
-        s.bind((host, port))
-        s.listen(5)
-        print(f'Binded the Port: {str(port)}')
-    except socket.error as msg:
-        print(f'***** WARNING: Socket binding error {str(msg)} ***** \nRetrying...')
-        bind_socket()
-
-
-# %% handling connection from multiple clients and saving to a list, closing previous connections when script is restarted
-# count = [0]
-def accepting_connections():
-    global COUNT
-
-    for c in ALL_CONNECTIONS:
-        c.close()
-
-    del ALL_CONNECTIONS[:]
-    del ALL_ADDRESSES[:]
-
-    while True:
+HOST = ''
+PORT = 12345
+TABLE_SIZE = 6  # a table starts as soon as this many players are waiting
+MAX_TABLES = 500
+N_HANDS = 2  # hands played by each table
+INITIAL_POINTS = 1000
+ACTION_TIMEOUT = 60  # seconds a player has to answer a single message
+DECISION_TIME = 30  # seconds for each decision before the time bank is used
+TIME_BANK = 60  # extra seconds a player can spread over the decisions of a table
+HISTORY_DIR = '.'  # hand history files go here
+HISTORY_FORMAT = 'csv'  # 'csv', 'parquet' or 'arrow'
+STATS_PATH = 'player_stats.json'  # snapshot of the player statistics
+STATS_SECONDS = 60  # seconds between two snapshots
+N_WORKERS = 1  # table worker processes, 1 runs every table in the accepting process
+HEARTBEAT_INTERVAL = 10  # seconds between two heartbeats to every connection
+IDLE_TIMEOUT = 120  # seconds without any message before a connection is closed
+METRICS_PORT = 9100  # local Prometheus-style metrics endpoint, None to only dump them
+METRICS_PATH = 'server_metrics.json'  # periodic dump of the server metrics
+METRICS_SECONDS = 60  # seconds between two dumps
+WORKER_METRICS_SECONDS = 1  # seconds between two metrics and statistics snapshots sent by a table worker
+SHUTDOWN_TIMEOUT = 120  # seconds the running hands get to end when the server stops
+
+
+# %% blocking connection used by GameEnv from a table thread, backed by the streams of the event loop
+class TableConnection:
+    """
+    Socket-like send/recv for a player, reads and writes run on the server event loop.
+    -------------------------------------------------------------------------------------------------------------------
+    A reader task on the event loop reads every message of the player: heartbeat answers only refresh "last_seen",
+    the other messages wait in "inbox" for recv. recv raises TimeoutError when the player does not answer within
+    "timeout" seconds and ConnectionError while the player is disconnected, GameEnv folds the player in both cases.
+    attach gives the connection the streams of a new socket when the player reconnects.
+    """
+
+    def __init__(self, reader, writer, loop, timeout=ACTION_TIMEOUT, on_disconnect=None):
+        self.reader = reader
+        self.writer = writer
+        self.loop = loop
+        self.timeout = timeout
+        self.on_disconnect = on_disconnect  # called on the event loop with this connection when the socket is gone
+        self.inbox = asyncio.Queue()  # framed messages from the player, b'' once the socket is gone
+        self.buffer = bytearray()  # bytes of the current message not returned by recv yet
+        self.connected = True
+        self.last_seen = loop.time()
+        self.read_task = loop.create_task(self.read_loop())
+
+    async def read_loop(self):
         try:
-            conn, address = s.accept()
-            s.setblocking(1)  # prevents timeout
-
-            ALL_CONNECTIONS.append(conn)
-            ALL_ADDRESSES.append(address)
-
-            c = COUNT[0]
-            c = c + 1
-            print(f'A connection has been established | IP: {address[0]} | PORT: {address[1]} | Total players: {c}')
-            COUNT[:] = []
-            COUNT.append(c)
-        except():
-            print("***** WARNING: Error accepting connections. *****")
-
-
-# %% start command prompt
-def start_command():
-    while True:
-        cmd = input('Enter command >>> ')
-        if cmd == 'list':
-            test_connections()
-        elif 'all' in cmd:
-            start_collect()
-        elif 'game' in cmd:
-            start_game()
-        # elif 'win' in cmd:
-        #     start_win()
-        # elif 'select' in cmd:
-        #     conn = get_target(cmd)
-        #     if conn is not None:
-        #         get_player_name(conn)
+            while True:
+                cmd, payload = await read_message(self.reader)
+                self.last_seen = self.loop.time()
+                if cmd != 'heartbeat':
+                    self.inbox.put_nowait(encode_message(cmd, payload))
+        except (ConnectionError, ValueError):
+            self.connected = False
+            self.inbox.put_nowait(b'')  # wake up a table thread waiting for this player
+            self.writer.close()
+            if self.on_disconnect is not None:
+                self.on_disconnect(self)
+
+    def attach(self, reader, writer):  # resume on a new socket of the same player, called on the event loop
+        self.read_task.cancel()
+        self.writer.close()
+        while not self.inbox.empty():
+            self.inbox.get_nowait()
+        self.buffer.clear()
+        self.reader = reader
+        self.writer = writer
+        self.connected = True
+        self.last_seen = self.loop.time()
+        self.read_task = self.loop.create_task(self.read_loop())
+
+    def detach(self):  # stop reading so another process can take the socket over, called on the event loop
+        self.read_task.cancel()
+
+    def settimeout(self, timeout):  # same as socket.settimeout, for the reads of recv
+        self.timeout = timeout
+
+    def gettimeout(self):
+        return self.timeout
+
+    def write(self, data):  # on the event loop, dropped while the player is disconnected
+        if self.connected:
+            self.writer.write(data)
+
+    def send(self, data):
+        self.loop.call_soon_threadsafe(self.write, data)
+        return len(data)
+
+    def sendall(self, data):
+        self.send(data)
+
+    def send_batch(self, pairs):  # (connection, data) pairs written together on the event loop
+        def write_all():
+            for conn, data in pairs:
+                conn.write(data)
+        self.loop.call_soon_threadsafe(write_all)
+
+    def recv(self, n_bytes):
+        if not self.buffer:
+            if not self.connected:
+                raise ConnectionError('Player disconnected.')
+            future = asyncio.run_coroutine_threadsafe(asyncio.wait_for(self.inbox.get(), self.timeout), self.loop)
+            data = future.result()
+            if not data:
+                raise ConnectionError('Player disconnected.')
+            self.buffer += data
+        data = bytes(self.buffer[:n_bytes])
+        del self.buffer[:n_bytes]
+        return data
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.writer.close)
+
+
+# %% lobby of every connected player, waiting or seated
+class Lobby:
+    """
+    Players known to the server by name and by connection, all lookups and moves are O(1) dict operations.
+    -------------------------------------------------------------------------------------------------------------------
+    "waiting" keeps the players without a table in arrival order, "seated" the players of running tables. A heartbeat
+    goes to every connection each "heartbeat_interval" seconds and a connection silent for "idle_timeout" seconds is
+    closed: a waiting player leaves the lobby, a seated player keeps the seat (folding when asked to act) and resumes
+    it by connecting again with the same name.
+    """
+
+    def __init__(self, heartbeat_interval=HEARTBEAT_INTERVAL, idle_timeout=IDLE_TIMEOUT, metrics=None):
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.metrics = metrics
+        self.waiting = {}  # name: player, in arrival order
+        self.seated = {}  # name: (table id, player)
+        self.by_conn = {}  # connection: player
+
+    def join(self, name, conn):  # returns the player and the table id of a resumed seat (None in the lobby)
+        if name in self.seated:
+            table_id, player = self.seated[name]
+        elif name in self.waiting:
+            table_id, player = None, self.waiting[name]
         else:
-            print("***** WARNING: Command not recognized. *****")
-
-
-# %% test all connections
-def test_connections():
-    results = ''
-    for i, conn in enumerate(ALL_CONNECTIONS):
+            player = Player(name, conn)
+            self.waiting[name] = player
+            self.by_conn[conn] = player
+            return player, None
+        player.conn.attach(conn.reader, conn.writer)  # the old connection object stays with GameEnv
+        conn.detach()
+        return player, table_id
+
+    def take(self, n_player):  # first "n_player" waiting players
+        names = list(self.waiting)[:n_player]
+        return [self.waiting.pop(name) for name in names]
+
+    def seat(self, table_id, players):
+        for player in players:
+            self.seated[player.name] = (table_id, player)
+
+    def forget(self, player):  # the player leaves the server, or its socket is handed to another process
+        self.waiting.pop(player.name, None)
+        self.seated.pop(player.name, None)
+        self.by_conn.pop(player.conn, None)
+
+    def disconnected(self, conn):
+        player = self.by_conn.get(conn)
+        if player is not None and player.name in self.waiting:
+            self.forget(player)
+            print(f'Player {player.name} left the lobby | Players waiting: {len(self.waiting)}')
+
+    async def heartbeat(self):
+        message = encode_message('heartbeat')
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            now = asyncio.get_running_loop().time()
+            for conn, player in list(self.by_conn.items()):
+                if not conn.connected:
+                    continue
+                if now - conn.last_seen > self.idle_timeout:
+                    print(f'***** WARNING: Player {player.name} timed out, closing the connection. *****')
+                    if self.metrics is not None:
+                        self.metrics.socket_error('idle')
+                    conn.connected = False
+                    conn.writer.close()
+                else:
+                    conn.write(message)
+
+
+# %% table server class definition
+class TableServer:
+    """
+    Accept players on one event loop and run many tables at the same time.
+    -------------------------------------------------------------------------------------------------------------------
+    Every connection is asked for its name and waits in the lobby, a table starts with "table_size" waiting players
+    (or with everyone waiting on the "game" command). Each table is one coroutine driving its own GameEnv, the
+    GameEnv runs in a table thread while all socket reads and writes stay non-blocking on the event loop. Table
+    threads come from a pool of "max_tables" threads: a table started while "max_tables" tables (or tournaments) are
+    running waits for a free thread, and a warning is printed when that happens.
+
+    The server stops on the "quit" command, Ctrl-C or SIGTERM: it stops accepting players, lets every table finish the
+    hand in progress (for at most SHUTDOWN_TIMEOUT seconds) without starting another one, then closes the hand
+    history and saves the player statistics so nothing from the last seconds is lost.
+
+    "record_history" and "keep_stats" turn the hand history and the player statistics off (e.g. for benchmarks), no
+    history file is opened and STATS_PATH is neither loaded nor saved. With "seed" table (or tournament) N deals its
+    decks from seed + N, so a run can be repeated.
+    """
+
+    def __init__(self, host=HOST, port=PORT, table_size=TABLE_SIZE, max_tables=MAX_TABLES, n_hands=N_HANDS,
+                 action_timeout=ACTION_TIMEOUT, heartbeat_interval=HEARTBEAT_INTERVAL, idle_timeout=IDLE_TIMEOUT,
+                 record_history=True, keep_stats=True, seed=None):
+        self.host = host
+        self.port = port
+        self.table_size = table_size
+        self.n_hands = n_hands
+        self.action_timeout = action_timeout
+        self.max_tables = max_tables
+        self.seed = seed
+        self.executor = ThreadPoolExecutor(max_workers=max_tables)
+        self.loop = None
+        self.server = None
+        self.metrics = ServerMetrics(METRICS_PATH, METRICS_SECONDS)
+        self.lobby = Lobby(heartbeat_interval, idle_timeout, self.metrics)
+        self.recorder = HandHistoryWriter(HISTORY_DIR, file_format=HISTORY_FORMAT) if record_history else None
+        self.stats = StatsAggregator(STATS_PATH, STATS_SECONDS) if keep_stats else None
+        self.tables = {}  # table id: list of players
+        self.n_tables = 0
+        self.tournaments = set()  # tournaments running
+        self.stopping = False  # no new hand starts once the server is shutting down
+        self.serve_task = None
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.serve_task = asyncio.current_task()
         try:
-            conn.send(str.encode(' '))
-            conn.recv(20480)
-        except():
-            del ALL_CONNECTIONS[i]
-            del ALL_ADDRESSES[i]
-            continue
-        results = str(i) + "   " + str(ALL_ADDRESSES[i][0]) + "   " + str(ALL_ADDRESSES[i][1]) + "\n"
-    print("---- Clients ----" + "\n" + results)
-
-
-# %% collect each player's name
-def start_collect():
-    global NAMES
-    global STORAGE
-    f = len(ALL_CONNECTIONS)
-    for i in range(f):
-        cmd = i
-        conn, ip, pt = get_target(cmd)
-        if conn is not None:
-            setup_player(conn, ip, pt)
-    print(f'Collected all names. | Player list: {NAMES}')
-
-
-# %% selecting the target
-def get_target(cmd):
-    try:
-        target = cmd
-        conn = ALL_CONNECTIONS[target]
-        ip = ALL_ADDRESSES[target][0]
-        pt = ALL_ADDRESSES[target][1]
-        print(f'Connection to {str(ALL_ADDRESSES[target][0])} established.')
-        return conn, ip, pt
-    except():
-        print("***** WARNING: Selection not valid. *****")
-        return None
-
-
-# %% request player name
-def setup_player(conn, ip, pt):
-    while True:
+            self.loop.add_signal_handler(signal.SIGTERM, self.serve_task.cancel)
+        except (NotImplementedError, RuntimeError):  # Windows event loop or not the main thread, Ctrl-C still works
+            pass
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        print(f'Binded the Port: {str(self.port)}')
+        tasks = [self.server.serve_forever(), self.lobby.heartbeat(), self.start_command()]
+        if METRICS_PORT is not None:
+            metrics_server = await asyncio.start_server(self.metrics.handle_http, 'localhost', METRICS_PORT)
+            print(f'Metrics on http://localhost:{METRICS_PORT}/metrics')
+            tasks.append(metrics_server.serve_forever())
         try:
-            cmd = 'request_name'
-            if cmd == 'quit':
+            async with self.server:
+                await asyncio.gather(*tasks)
+        except asyncio.CancelledError:  # quit command, Ctrl-C or SIGTERM
+            pass
+        finally:
+            await self.shutdown()
+
+    async def shutdown(self):  # stop taking players, let the hands in progress end, then write out what is buffered
+        print('Server shutting down, waiting for the hands in progress to end.')
+        self.stopping = True
+        self.server.close()
+        for tournament in self.tournaments:
+            tournament.stop()
+        deadline = self.loop.time() + SHUTDOWN_TIMEOUT
+        while self.tables and self.loop.time() < deadline:
+            await asyncio.sleep(0.1)
+        if self.tables:
+            print(f'***** WARNING: Tables {list(self.tables)} did not end in {SHUTDOWN_TIMEOUT} seconds. *****')
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.stats is not None:
+            self.stats.save()
+        if self.metrics.dump_path is not None:
+            self.metrics.save()
+        print('Server stopped.')
+
+    async def handle_connection(self, reader, writer):  # request the player name, then join the lobby or resume a seat
+        address = writer.get_extra_info('peername')
+        try:
+            writer.write(encode_message('request_name'))
+            await writer.drain()
+            cmd, name = await asyncio.wait_for(read_message(reader), self.action_timeout)
+            writer.write(encode_message('name_collected', "Connection established, names collected."))
+            await writer.drain()
+        except (TimeoutError, ConnectionError, ValueError):
+            print(f'***** WARNING: Error requesting player name from {address}. *****')
+            self.metrics.socket_error('name')
+            writer.close()
+            return
+        conn = TableConnection(reader, writer, self.loop, self.action_timeout, on_disconnect=self.lobby.disconnected)
+        player, table_id = self.lobby.join(name, conn)
+        if table_id is not None:
+            player.conn.send(encode_message('seat_resumed', {'TABLE': table_id, 'POINTS': player.points}))
+            print(f'Player {name} resumed the seat at table {table_id} | IP: {address[0]} | PORT: {address[1]}')
+            return
+        print(f'A connection has been established | {name} | IP: {address[0]} | PORT: {address[1]} | '
+              f'Players waiting: {len(self.lobby.waiting)}')
+        if len(self.lobby.waiting) >= self.table_size:
+            self.start_table(self.table_size)
+
+    def start_table(self, n_player):
+        players = self.lobby.take(n_player)
+        self.n_tables += 1
+        self.tables[self.n_tables] = players
+        self.lobby.seat(self.n_tables, players)
+        asyncio.ensure_future(self.run_table(self.n_tables, players))
+
+    def warn_if_queued(self, table_id):  # every table thread is busy, the table waits for one to be free
+        if len(self.tables) > self.max_tables:
+            print(f'***** WARNING: {self.max_tables} tables are running, table {table_id} is queued. *****')
+
+    def end_table(self, table_id, players):
+        del self.tables[table_id]
+        for player in players:
+            self.lobby.forget(player)
+            player.conn.close()
+
+    def table_seed(self, table_id):  # every table deals its own decks
+        return None if self.seed is None else self.seed + table_id
+
+    async def run_table(self, table_id, players):
+        print(f'Table {table_id} starts with players {[player.name for player in players]}')
+        env = GameEnv(players, small_blind_points=1, big_blind_points=2, seed=self.table_seed(table_id),
+                      decision_time=DECISION_TIME, time_bank=TIME_BANK, recorder=self.recorder, table_id=table_id,
+                      stats=self.stats, metrics=self.metrics)
+        self.metrics.table_started()
+        self.warn_if_queued(table_id)
+        try:
+            await self.loop.run_in_executor(self.executor, self.play_table, env)
+        except Exception as error:
+            print(f'***** WARNING: Table {table_id} stopped: {error!r} *****')
+        finally:
+            self.metrics.table_ended()
+            self.end_table(table_id, players)
+            print(f'Table {table_id} ends.')
+
+    async def run_tournament(self):  # every waiting player enters one multi-table tournament
+        players = self.lobby.take(len(self.lobby.waiting))
+        self.n_tables += 1
+        table_id = self.n_tables
+        self.tables[table_id] = players
+        self.lobby.seat(table_id, players)
+        tournament = Tournament(players, table_size=self.table_size, starting_points=INITIAL_POINTS,
+                                seed=self.table_seed(table_id), decision_time=DECISION_TIME, time_bank=TIME_BANK,
+                                recorder=self.recorder, stats=self.stats, metrics=self.metrics)
+        print(f'Tournament starts with {len(players)} players')
+        self.metrics.table_started()
+        self.warn_if_queued(table_id)
+        self.tournaments.add(tournament)
+        try:
+            standings = await self.loop.run_in_executor(self.executor, tournament.run)
+            print(f'Tournament ends | Standings: {standings}')
+        except Exception as error:
+            print(f'***** WARNING: Tournament {table_id} stopped: {error!r} *****')
+        finally:
+            self.tournaments.discard(tournament)
+            self.metrics.table_ended()
+            self.end_table(table_id, players)
+
+    def play_table(self, env):
+        env.initial_points(initial_points=INITIAL_POINTS)
+        for i in range(self.n_hands):
+            if self.stopping:
                 break
-            if len(str.encode(cmd)) > 0:
-                conn.send(str.encode(cmd))  # sending command to player client
-                print(f'Sent command: {cmd}')
-
-                player_response = str(conn.recv(20480), "utf-8")  # receiving message from player client
-                print(f'Received message: {player_response}')
-
-                NAMES.append(player_response)
-                print(f'Player names: {NAMES}')
-
-                STORAGE[player_response] = {'CONN': conn, 'IP': ip, 'PORT': pt,
-                                            'PLAYER': Player(player_response, conn)}
-                print(f'{player_response}: {STORAGE[player_response]}')
+            env.play_hand()
+
+    async def read_command(self):  # input in a daemon thread, a prompt left waiting never holds up the shutdown
+        future = self.loop.create_future()
+
+        def deliver(cmd, error):  # on the event loop
+            if future.done():  # the prompt was cancelled
+                return
+            if error is None:
+                future.set_result(cmd)
+            else:
+                future.set_exception(error)
+
+        def read():
+            try:
+                cmd, error = input('Enter command >>> '), None
+            except EOFError as exception:
+                cmd, error = None, exception
+            try:
+                self.loop.call_soon_threadsafe(deliver, cmd, error)
+            except RuntimeError:  # the server stopped while the prompt was waiting
+                pass
+        threading.Thread(target=read, daemon=True).start()
+        return await future
+
+    async def start_command(self):  # command prompt, read in a thread so it does not block the event loop
+        while True:
+            try:
+                cmd = await self.read_command()
+            except EOFError:  # no terminal (nohup, a service, stdin from /dev/null), the server runs without a prompt
+                print('No command input, the command prompt is closed.')
+                return
+            if cmd == 'quit':
+                self.serve_task.cancel()
+                return
+            elif cmd == 'list':
+                print(f'---- Lobby ---- \n{list(self.lobby.waiting)}')
+                for table_id, players in self.tables.items():
+                    print(f'---- Table {table_id} ---- \n{[player.name for player in players]}')
+            elif cmd == 'stats' and self.stats is not None:
+                for name in sorted(self.stats.combined()):
+                    print(f'{name}: {self.stats.summary(name)}')
+            elif cmd == 'metrics':
+                print(self.metrics.render())
+            elif cmd == 'tournament':
+                asyncio.ensure_future(self.run_tournament())
+            elif 'game' in cmd:
+                if len(self.lobby.waiting) >= 2:
+                    self.start_table(len(self.lobby.waiting))
+                else:
+                    print("***** WARNING: Need at least 2 waiting players to start a table. *****")
+            else:
+                print("***** WARNING: Command not recognized. *****")
+
+
+# %% process-sharded table hosting, whole tables are handed to worker processes over a local pipe
+def table_worker(index, pipe, max_tables, n_hands, action_timeout, record_history, keep_stats, seed):  # in a process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C reaches every process, the acceptor tells the workers to stop
+    executor = ThreadPoolExecutor(max_workers=max_tables)
+    recorder = None
+    if record_history:
+        recorder = HandHistoryWriter(HISTORY_DIR, prefix=f'poker_record_worker{index}', file_format=HISTORY_FORMAT)
+    stats = StatsAggregator() if keep_stats else None  # the acceptor saves the counts of every worker
+    metrics = ServerMetrics(f'{os.path.splitext(METRICS_PATH)[0]}_worker{index}.json', METRICS_SECONDS)
+    pipe_lock = threading.Lock()
+    stopping = threading.Event()  # set by the None message, no new hand starts after it
+    snapshots_sent = [0.0]  # time the last metrics and statistics snapshots were sent
+
+    def send_snapshots(force=False):  # the acceptor serves the metrics and statistics of every worker
+        with pipe_lock:
+            if force or time.monotonic() - snapshots_sent[0] > WORKER_METRICS_SECONDS:
+                snapshots_sent[0] = time.monotonic()
+                pipe.send(('metrics', index, metrics.snapshot()))
+                if stats is not None:
+                    pipe.send(('stats', index, stats.snapshot()))
+
+    def play_worker_table(table_id, players):
+        metrics.table_started()
+        try:
+            env = GameEnv(players, small_blind_points=1, big_blind_points=2,
+                          seed=None if seed is None else seed + table_id, decision_time=DECISION_TIME,
+                          time_bank=TIME_BANK, recorder=recorder, table_id=table_id, stats=stats, metrics=metrics)
+            env.initial_points(initial_points=INITIAL_POINTS)
+            for i in range(n_hands):
+                if stopping.is_set():
+                    break
+                env.play_hand()
+                send_snapshots()
+        except Exception as error:
+            print(f'***** WARNING: Table {table_id} stopped: {error!r} *****')
+        finally:
+            metrics.table_ended()
+            for player in players:
+                player.conn.close()
+            send_snapshots(force=True)  # before the table end, so the acceptor has the last hands once no table runs
+            with pipe_lock:
+                pipe.send(('table_end', table_id, {player.name: player.points for player in players}))
 
-                conn.send(str.encode("Connection established, names collected."))
-                break
-        except():
-            print("***** WARNING: Error requesting player name. *****")
+    while True:
+        message = pipe.recv()
+        if message is None:
+            stopping.set()
             break
+        table_id, names = message
+        players = []
+        for name in names:  # the sockets follow the table message, one file descriptor per player
+            conn = socket.socket(fileno=recv_handle(pipe))
+            conn.settimeout(action_timeout)
+            players.append(Player(name, conn))
+        executor.submit(play_worker_table, table_id, players)
+    executor.shutdown()
+    if recorder is not None:
+        recorder.close()
+    metrics.save()
+
+
+class ShardedTableServer(TableServer):
+    """
+    TableServer that accepts players in this process and plays every table in one of "n_workers" processes.
+    -------------------------------------------------------------------------------------------------------------------
+    When a table starts, its player sockets are passed to the least loaded worker over a local pipe (file descriptor
+    passing, no broker) and the table stays on that worker until it ends. Heartbeats and reconnects cover the lobby,
+    a player dropping from a worker table is folded by the worker for the rest of the table. On shutdown every
+    worker is told to stop, ends its hands in progress, closes its hand history and exits before the acceptor does.
+    Workers send their metrics and player statistics snapshots to the acceptor at most every WORKER_METRICS_SECONDS
+    seconds and when a table ends, so the metrics endpoint and dump, the 'stats' command and STATS_PATH of the
+    acceptor cover every worker.
+    """
+
+    def __init__(self, n_workers=N_WORKERS, **kwargs):
+        super().__init__(**kwargs)
+        self.n_workers = n_workers
+        self.workers = []  # (process, pipe) per worker
+        self.worker_load = [0] * n_workers  # tables running on each worker
+        self.table_worker = {}  # table id: worker index
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        for index in range(self.n_workers):
+            pipe, child_pipe = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=table_worker, daemon=True,
+                                              args=(index, child_pipe, self.max_tables, self.n_hands,
+                                                    self.action_timeout, self.recorder is not None,
+                                                    self.stats is not None, self.seed))
+            process.start()
+            self.workers.append((process, pipe))
+            self.loop.run_in_executor(None, self.listen_worker, index)
+        await super().serve()
+
+    async def shutdown(self):
+        for process, pipe in self.workers:
+            pipe.send(None)
+        await super().shutdown()
+        for index, (process, pipe) in enumerate(self.workers):
+            await self.loop.run_in_executor(None, process.join, SHUTDOWN_TIMEOUT)
+            if process.is_alive():
+                print(f'***** WARNING: Worker {index} did not stop in {SHUTDOWN_TIMEOUT} seconds. *****')
+
+    def listen_worker(self, index):  # results sent back by a worker, read in a thread
+        process, pipe = self.workers[index]
+        while True:
+            try:
+                message, key, value = pipe.recv()
+            except EOFError:
+                break
+            if message == 'metrics':
+                self.metrics.update_worker(key, value)
+            elif message == 'stats':
+                self.stats.update_worker(key, value)
+            else:
+                self.loop.call_soon_threadsafe(self.worker_table_end, key, value)
+
+    def worker_table_end(self, table_id, points):
+        self.worker_load[self.table_worker.pop(table_id)] -= 1
+        self.metrics.table_ended()
+        del self.tables[table_id]
+        print(f'Table {table_id} ends | Points: {points}')
+
+    async def run_table(self, table_id, players):
+        index = min(range(self.n_workers), key=lambda i: self.worker_load[i])
+        process, pipe = self.workers[index]
+        self.worker_load[index] += 1
+        self.table_worker[table_id] = index
+        self.metrics.table_started()
+        print(f'Table {table_id} starts on worker {index} with players {[player.name for player in players]}')
+        pipe.send((table_id, [player.name for player in players]))
+        for player in players:  # the worker owns the socket from here, its seat can not be resumed on this process
+            self.lobby.forget(player)
+            player.conn.detach()
+            send_handle(pipe, player.conn.writer.get_extra_info('socket').fileno(), process.pid)
+            player.conn.writer.transport.abort()  # the worker holds its own copy of the socket now
 
 
-# %% start a single game
-def start_game():
-    global ENV
-    global STORAGE
-    global NAMES
-
-    ENV = GameEnv([STORAGE[player]['PLAYER'] for player in NAMES], small_blind_points=1, big_blind_points=2)
-
-    ENV.initial_points(initial_points=1000)
-
-    for i in range(2):
-        ENV.game_start_setup()
-        ENV.round_0_play()
-        ENV.round_1_play()
-        ENV.round_2_play()
-        ENV.round_3_play()
-        ENV.game_end_update()
-
 # %%
 # display all current active connections with client
 # def start_win():
@@ -348,6 +698,11 @@ def start_game():
 #     return points
 
 
+
+
 # %%
-create_workers()
-create_jobs()
+if __name__ == "__main__":
+    if N_WORKERS > 1:
+        asyncio.run(ShardedTableServer().serve())
+    else:
+        asyncio.run(TableServer().serve())
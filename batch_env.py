@@ -0,0 +1,168 @@
+# %% import libraries
+import numpy as np
+from texas_holdem import *
+
+
+# %% actions of the batched environment
+FOLD = 0
+CHECK_CALL = 1
+RAISE = 2
+ALL_IN = 3
+N_BOARD_VISIBLE = np.array([0, 3, 4, 5])  # board cards shown on each street
+
+
+# %% batched game environment class definition
+class BatchGameEnv:
+    """
+    Many independent poker tables stepped together with NumPy arrays, following the betting rules of GameEnv.
+    -------------------------------------------------------------------------------------------------------------------
+    Every table has "n_player" seats sorted like GameEnv: Small Blind, Big Blind, other players, and every hand
+    starts from "initial_points". step(actions) applies one action for the acting player of every table:
+        0 fold, 1 check or call, 2 raise by "raise_amounts" (the big blind by default), 3 all-in.
+    Like BettingState a raise is at least "min_raise", the size of the last raise of the street and never less than
+    the big blind. A call or raise that is not affordable becomes an all-in. When a hand ends the table's reward is
+    the chips won minus the chips committed for every seat, and the table is dealt a new hand straight away.
+    """
+
+    def __init__(self, n_tables, n_player, small_blind_points=1, big_blind_points=2, initial_points=1000, seed=None):
+        self.n_tables = n_tables
+        self.n_player = n_player
+        self.small_blind_points = small_blind_points
+        self.big_blind_points = big_blind_points
+        self.initial_points = initial_points
+        self.rng = np.random.default_rng(seed)
+
+        self.rows = np.arange(n_tables)
+        self.seats = np.arange(n_player)
+        self.deck = np.zeros((n_tables, 52), dtype=np.int64)  # hole cards of seat p at 2p, 2p + 1, then the board
+        self.stacks = np.zeros((n_tables, n_player), dtype=np.int64)
+        self.street_commited = np.zeros((n_tables, n_player), dtype=np.int64)
+        self.total_commited = np.zeros((n_tables, n_player), dtype=np.int64)
+        self.folded = np.zeros((n_tables, n_player), dtype=bool)
+        self.pending = np.zeros((n_tables, n_player), dtype=bool)  # players who still have to act on this street
+        self.street = np.zeros(n_tables, dtype=np.int64)
+        self.current_bet = np.zeros(n_tables, dtype=np.int64)
+        self.min_raise = np.zeros(n_tables, dtype=np.int64)  # last raise of the street, at least the big blind
+        self.to_act = np.zeros(n_tables, dtype=np.int64)
+
+    def reset(self, tables=None):  # deal a new hand on the given tables (all of them by default)
+        tables = self.rows if tables is None else np.asarray(tables)
+        n_p = self.n_player
+        self.deck[tables] = self.rng.permuted(np.tile(np.arange(52), (len(tables), 1)), axis=1)
+        self.stacks[tables] = self.initial_points
+        self.street_commited[tables] = 0
+        self.folded[tables] = False
+        self.street[tables] = 0
+
+        blinds = np.minimum([self.small_blind_points, self.big_blind_points], self.initial_points)
+        self.stacks[tables, :2] -= blinds
+        self.street_commited[tables, :2] = blinds
+        self.total_commited[tables] = self.street_commited[tables]
+        self.current_bet[tables] = blinds[1]
+        self.min_raise[tables] = self.big_blind_points
+        self.pending[tables] = self.stacks[tables] > 0
+        self.pending[tables, 1] = False  # the big blind has matched the bet already, as in BettingState
+        self.to_act[tables] = self._next_to_act(tables, np.full(len(tables), 1 % n_p))
+        return self.observe()
+
+    def _next_to_act(self, tables, after):  # first pending seat after the given seat
+        order = (after[:, None] + 1 + self.seats) % self.n_player
+        first = self.pending[tables[:, None], order].argmax(axis=1)
+        return order[np.arange(len(tables)), first]
+
+    def observe(self):
+        n_p = self.n_player
+        board = self.deck[:, 2 * n_p:2 * n_p + 5]
+        board = np.where(np.arange(5) < N_BOARD_VISIBLE[self.street][:, None], board, -1)
+        hole = self.deck[self.rows[:, None], 2 * self.to_act[:, None] + np.arange(2)]
+        return {'TO_ACT': self.to_act.copy(),
+                'HOLE': hole,
+                'BOARD': board,
+                'STREET': self.street.copy(),
+                'CURRENT_BET': self.current_bet.copy(),
+                'MIN_RAISE': self.min_raise.copy(),
+                'STACKS': self.stacks.copy(),
+                'STREET_COMMITED': self.street_commited.copy(),
+                'TOTAL_COMMITED': self.total_commited.copy(),
+                'FOLDED': self.folded.copy()}
+
+    def step(self, actions, raise_amounts=None):
+        actions = np.asarray(actions)
+        raise_amounts = self.big_blind_points if raise_amounts is None else np.asarray(raise_amounts)
+        raise_amounts = np.maximum(raise_amounts, self.min_raise)
+        t, p = self.rows, self.to_act
+        stack = self.stacks[t, p]
+        to_call = self.current_bet - self.street_commited[t, p]
+
+        fold = actions == FOLD
+        all_in = ((actions == ALL_IN) | ((actions == CHECK_CALL) & (to_call >= stack)) |
+                  ((actions == RAISE) & (to_call + raise_amounts >= stack)))
+        amount = np.select([all_in, (actions == CHECK_CALL) & ~all_in, (actions == RAISE) & ~all_in],
+                           [stack, to_call, to_call + raise_amounts], 0)
+        self.stacks[t, p] -= amount
+        self.street_commited[t, p] += amount
+        self.total_commited[t, p] += amount
+        self.folded[t, p] |= fold
+        self.pending[t, p] = False
+
+        raised = self.street_commited[t, p] > self.current_bet
+        self.min_raise = np.where(raised, np.maximum(self.min_raise, self.street_commited[t, p] - self.current_bet),
+                                  self.min_raise)
+        self.current_bet = np.maximum(self.current_bet, self.street_commited[t, p])
+        reopen = raised[:, None] & ~self.folded & (self.stacks > 0)  # a raise re-opens the betting for the others
+        reopen[t, p] = False
+        self.pending |= reopen
+
+        done = (~self.folded).sum(axis=1) == 1
+        street_over = ~done & ~self.pending.any(axis=1)
+        new_street = np.zeros(self.n_tables, dtype=bool)
+        while street_over.any():  # with fewer than two players able to bet the board is run out
+            showdown = street_over & (self.street == 3)
+            done |= showdown
+            advance = street_over & ~showdown
+            new_street |= advance
+            self.street[advance] += 1
+            self.street_commited[advance] = 0
+            self.current_bet[advance] = 0
+            self.min_raise[advance] = self.big_blind_points
+            can_act = ~self.folded & (self.stacks > 0)
+            self.pending[advance] = (can_act & (can_act.sum(axis=1, keepdims=True) > 1))[advance]
+            street_over = advance & ~self.pending.any(axis=1)
+        playing = np.flatnonzero(~done)
+        after = np.where(new_street, self.n_player - 1, self.to_act)[playing]  # a new street starts at small blind
+        self.to_act[playing] = self._next_to_act(playing, after)
+
+        rewards = np.zeros((self.n_tables, self.n_player), dtype=np.int64)
+        finished = np.flatnonzero(done)
+        if len(finished):
+            rewards[finished] = self._payouts(finished) - self.total_commited[finished]
+            self.reset(finished)
+        return self.observe(), rewards, done, {}
+
+    def _payouts(self, tables):  # main and side pots of finished hands, layer by layer of commitment
+        n_p = self.n_player
+        total = self.total_commited[tables]
+        folded = self.folded[tables]
+        scores = np.zeros((len(tables), n_p), dtype=np.int64)
+        showdown = (~folded).sum(axis=1) > 1
+        if showdown.any():
+            board = self.deck[tables[showdown], 2 * n_p:2 * n_p + 5]
+            hole = self.deck[tables[showdown], :2 * n_p].reshape(-1, n_p, 2)
+            cards = np.concatenate([np.repeat(board[:, None, :], n_p, axis=1), hole], axis=2)
+            scores[showdown] = Comparator.evaluate_batch(cards.reshape(-1, 7)).reshape(-1, n_p)
+        scores = np.where(folded, -1, scores)
+        overall_winners = scores == scores.max(axis=1, keepdims=True)
+
+        payouts = np.zeros((len(tables), n_p), dtype=np.int64)
+        levels = np.sort(total, axis=1)
+        previous = np.zeros(len(tables), dtype=np.int64)
+        for k in range(n_p):
+            contributors = total >= levels[:, k:k + 1]
+            pot = contributors.sum(axis=1) * (levels[:, k] - previous)
+            best = np.where(contributors, scores, -1).max(axis=1, keepdims=True)
+            winners = np.where(best >= 0, contributors & (scores == best), overall_winners)
+            n_winners = winners.sum(axis=1)
+            payouts += winners * (pot // n_winners)[:, None]
+            payouts[np.arange(len(tables)), winners.argmax(axis=1)] += pot % n_winners  # odd chips to the first winner
+            previous = levels[:, k]
+        return payouts
@@ -0,0 +1,236 @@
+# %% import libraries
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+import numpy as np
+from protocol import send_message, recv_message
+from texas_holdem import *
+
+
+# %% benchmark helpers
+def random_hands(n_hands, n_cards, seed):  # (n_hands, n_cards) array of card codes without repeats in a row
+    return Deck.shuffled_orders(n_hands, seed)[:, :n_cards]
+
+
+def timed(function, repeat):  # best wall time of "repeat" runs, the first result
+    best, result = None, None
+    for i in range(repeat):
+        start = time.perf_counter()
+        output = function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+        if result is None:
+            result = output
+    return best, result
+
+
+# %% benchmarks, each returns {name: (count, seconds, unit)}
+def bench_evaluator(seed, scale, repeat):
+    comparator = Comparator()
+    codes = random_hands(20000 * scale, 7, seed)
+    code_lists = codes.tolist()
+    card_lists = [[CARD_TABLE[code] for code in hand] for hand in code_lists]
+    five_names = [[CARD_NAMES[code] for code in hand[:5]] for hand in code_lists[:2000 * scale]]
+    results = {}
+    seconds, _ = timed(lambda: [comparator.find_best_hand(cards) for cards in card_lists], repeat)
+    results['find_best_hand_7_cards'] = (len(card_lists), seconds, 'evaluations/s')
+    seconds, _ = timed(lambda: [Comparator.evaluate_codes(hand) for hand in code_lists], repeat)
+    results['evaluate_codes_7_cards'] = (len(code_lists), seconds, 'evaluations/s')
+    seconds, _ = timed(lambda: Comparator.evaluate_batch(codes), repeat)
+    results['evaluate_batch_7_cards'] = (len(codes), seconds, 'evaluations/s')
+    seconds, _ = timed(lambda: [comparator.check_hand(hand) for hand in five_names], repeat)
+    results['check_hand_5_cards'] = (len(five_names), seconds, 'evaluations/s')
+    return results
+
+
+def bench_rank_cards_list(seed, scale, repeat):
+    comparator = Comparator()
+    results = {}
+    for n_player in range(2, 11):
+        decks = random_hands(2000 * scale, 5 + 2 * n_player, seed).tolist()
+        cards_lists = [[[CARD_TABLE[code] for code in deck[:5] + deck[5 + 2 * p:7 + 2 * p]] for p in range(n_player)]
+                       for deck in decks]
+        seconds, _ = timed(lambda: [comparator.rank_cards_list(cards_list) for cards_list in cards_lists], repeat)
+        results[f'rank_cards_list_{n_player}_players'] = (len(cards_lists), seconds, 'showdowns/s')
+    return results
+
+
+def bench_deck(seed, scale, repeat):
+    n_decks = 20000 * scale
+    results = {}
+
+    def shuffle_and_deal():
+        random.seed(seed)
+        deck = Deck(1)
+        for i in range(n_decks):
+            deck.shuffle()
+            for j in range(23):  # 9 players and the board
+                deck.draw_card()
+    seconds, _ = timed(shuffle_and_deal, repeat)
+    results['deck_shuffle_and_deal'] = (n_decks, seconds, 'decks/s')
+
+    def pool_and_deal():
+        pool = DeckPool(seed=seed)
+        for i in range(n_decks):
+            deck = pool.next_deck()
+            for j in range(23):
+                deck.draw_card()
+    seconds, _ = timed(pool_and_deal, repeat)
+    results['deck_pool_and_deal'] = (n_decks, seconds, 'decks/s')
+    return results
+
+
+def bench_headless(seed, scale, repeat):
+    n_hands = 2000 * scale
+    results = {}
+    for policy_name, make_policy in (('call', lambda i: CallPolicy()),
+                                     ('random', lambda i: RandomPolicy(seed=seed + i))):
+        def play():
+            players = [Player(f'P{i}', None, policy=make_policy(i)) for i in range(6)]
+            env = GameEnv(players, headless=True, seed=seed)
+            env.initial_points(1000)
+            for hand in range(n_hands):
+                for player in players:
+                    if player.points < 10:
+                        player.points = 1000
+                env.play_hand()
+        seconds, _ = timed(play, repeat)
+        results[f'game_env_headless_{policy_name}_6_players'] = (n_hands, seconds, 'hands/s')
+    return results
+
+
+def bot_client(name, port, counts):  # a PlayerClient that always checks or calls, counts the moves it sends
+    player = Player(name, None)
+    player.verbose = False
+    conn = socket.create_connection(('localhost', port))
+    n_moves = 0
+    try:
+        while True:
+            cmd, payload = recv_message(conn)
+            if cmd == 'request_name':
+                send_message(conn, 'player_name', name)
+            elif cmd == 'heartbeat':
+                send_message(conn, 'heartbeat')
+            elif cmd.startswith('request_round'):
+                player.points = 10 ** 9  # the server keeps the real stacks, the bot only needs to afford a call
+                player.self_current_round_commited = 0
+                player.round_requirement_met = False
+                move = player.calling(int(payload['CURRENT_BET']))
+                move['DECISION'] = payload.get('DECISION')
+                send_message(conn, 'player_move', move)
+                n_moves += 1
+    except (ConnectionError, OSError):
+        pass
+    finally:
+        conn.close()
+        counts[name] = n_moves
+
+
+def bench_server(seed, scale, repeat, n_bots=12, table_size=6):  # actions/s through TableServer with local bots
+    import ServerClient
+    n_hands = 20 * scale
+
+    def run():
+        server = ServerClient.TableServer(port=0, table_size=table_size, n_hands=n_hands, action_timeout=30,
+                                          record_history=False, keep_stats=False, seed=seed)
+        server.metrics.dump_path = None
+        ready = threading.Event()
+        finished = threading.Event()
+
+        async def serve():
+            server.loop = asyncio.get_running_loop()
+            server.server = await asyncio.start_server(server.handle_connection, 'localhost', 0)
+            server.port = server.server.sockets[0].getsockname()[1]
+            ready.set()
+            while not finished.is_set():
+                await asyncio.sleep(0.01)
+                if server.n_tables == n_bots // table_size and not server.tables:
+                    finished.set()
+            server.server.close()
+
+        counts = {}
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):  # GameEnv logs every message
+            loop_thread = threading.Thread(target=asyncio.run, args=(serve(),))
+            loop_thread.start()
+            ready.wait()
+            bots = [threading.Thread(target=bot_client, args=(f'bot{i}', server.port, counts)) for i in range(n_bots)]
+            for bot in bots:
+                bot.start()
+            for bot in bots:
+                bot.join()
+            loop_thread.join()
+        return sum(counts.values())
+
+    seconds, n_actions = timed(run, repeat)
+    return {f'server_end_to_end_{n_bots}_bots': (n_actions, seconds, 'actions/s')}
+
+
+BENCHMARKS = {'evaluator': bench_evaluator,
+              'rank_cards_list': bench_rank_cards_list,
+              'deck': bench_deck,
+              'headless': bench_headless,
+              'server': bench_server}
+
+
+# %% running and comparing benchmark results
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmarks(names=None, seed=0, scale=1, repeat=3):
+    results = {}
+    for name in names or BENCHMARKS:
+        for key, (count, seconds, unit) in BENCHMARKS[name](seed, scale, repeat).items():
+            results[key] = {'RATE': count / seconds, 'UNIT': unit, 'COUNT': count, 'SECONDS': seconds}
+            print(f'{key}: {count / seconds:,.0f} {unit}')
+    return {'META': {'TIME': time.time(), 'COMMIT': git_commit(), 'PYTHON': platform.python_version(),
+                     'MACHINE': platform.platform(), 'CPUS': os.cpu_count(), 'NUMPY': np.__version__,
+                     'SEED': seed, 'SCALE': scale, 'REPEAT': repeat},
+            'RESULTS': results}
+
+
+def compare(results, baseline, tolerance):  # benchmarks more than "tolerance" slower than the baseline
+    regressions = []
+    for key, result in results['RESULTS'].items():
+        if key in baseline['RESULTS']:
+            ratio = result['RATE'] / baseline['RESULTS'][key]['RATE']
+            if ratio < 1 - tolerance:
+                regressions.append((key, ratio))
+                print(f'***** WARNING: {key} is {1 - ratio:.0%} slower than the baseline. *****')
+    return regressions
+
+
+# %%
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the evaluator, the game engine and the server.')
+    parser.add_argument('benchmarks', nargs='*', help=f'any of {", ".join(BENCHMARKS)}, all of them by default')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='results of an earlier run, exit with 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='slowdown allowed against the baseline')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scale', type=int, default=1, help='multiplies the work of every benchmark')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f'unknown benchmarks {unknown}, choose from {list(BENCHMARKS)}')
+
+    results = run_benchmarks(args.benchmarks, args.seed, args.scale, args.repeat)
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=1)
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            sys.exit(1 if compare(results, json.load(file), args.tolerance) else 0)
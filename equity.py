@@ -0,0 +1,266 @@
+# %% import libraries
+import os
+from math import comb
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations, repeat
+import numpy as np
+from texas_holdem import *
+
+
+# %% random runouts of one chunk of samples, run inside a worker process
+def _rollout_chunk(hand_codes, board_codes, remaining, n_samples, seed):
+    rng = np.random.default_rng(seed)
+    n_board = 5 - len(board_codes)
+    n_unknown = sum(hand is None for hand in hand_codes)
+    draws = rng.permuted(np.tile(np.asarray(remaining, dtype=np.int64), (n_samples, 1)), axis=1)
+    draws = draws[:, :n_board + 2 * n_unknown]
+    board = np.hstack([np.tile(np.asarray(board_codes, dtype=np.int64), (n_samples, 1)), draws[:, :n_board]])
+
+    scores = []
+    offset = n_board
+    for hand in hand_codes:
+        if hand is None:  # unknown hole cards are dealt from the remaining deck
+            hole = draws[:, offset:offset + 2]
+            offset += 2
+        else:
+            hole = np.tile(np.asarray(hand, dtype=np.int64), (n_samples, 1))
+        scores.append(Comparator.evaluate_batch(np.hstack([board, hole])))
+    scores = np.stack(scores, axis=1)
+
+    best = scores == scores.max(axis=1, keepdims=True)
+    n_best = best.sum(axis=1, keepdims=True)
+    wins = (best & (n_best == 1)).sum(axis=0)
+    ties = (best & (n_best > 1)).sum(axis=0)
+    shares = (best / n_best).sum(axis=0)
+    return wins, ties, shares
+
+
+# %% preflop starting hands, 169 classes on a 13 x 13 grid (pairs on the diagonal, suited above, offsuit below)
+COMBO_INDEX = {combo: i for i, combo in enumerate(combinations(range(52), 2))}  # the 1326 two card combos
+
+
+def preflop_class_index(codes):  # index of the 169 starting hand class of two card codes
+    high, low = 12 - max(codes[0] >> 2, codes[1] >> 2), 12 - min(codes[0] >> 2, codes[1] >> 2)
+    if codes[0] & 3 == codes[1] & 3:
+        return high * 13 + low
+    return low * 13 + high
+
+
+def preflop_class_name(index):  # e.g. 'AA', 'AKs', '109o' (ranks as in RANKS, so ten is '10')
+    row, col = divmod(index, 13)
+    if row == col:
+        return RANKS[12 - row] * 2
+    if row < col:
+        return f'{RANKS[12 - row]}{RANKS[12 - col]}s'
+    return f'{RANKS[12 - col]}{RANKS[12 - row]}o'
+
+
+PREFLOP_CLASSES = [preflop_class_name(index) for index in range(169)]
+
+
+def _preflop_groups(full):  # array of card code combos for every starting hand class, or one group per combo
+    if full:
+        return [np.array([combo]) for combo in COMBO_INDEX]
+    groups = [[] for _ in range(169)]
+    for combo in COMBO_INDEX:
+        groups[preflop_class_index(combo)].append(combo)
+    return [np.array(group) for group in groups]
+
+
+def _preflop_row(groups, row, n_samples, seed, batch_size=100000):  # equity of group "row" against every later group
+    rng = np.random.default_rng(seed)
+    sizes = np.array([len(group) for group in groups])
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    flat = np.concatenate(groups)
+    columns = np.arange(row + 1, len(groups))
+    equities = np.full(len(columns), np.nan)
+    step = max(1, batch_size // n_samples)
+    for first in range(0, len(columns), step):
+        batch = np.repeat(columns[first:first + step], n_samples)
+        hand_a = groups[row][rng.integers(len(groups[row]), size=len(batch))]
+        hand_b = flat[starts[batch] + rng.integers(0, sizes[batch])]
+        used = np.hstack([hand_a, hand_b])
+        valid = np.ones(len(batch), dtype=bool)  # the two hands must not share a card
+        for i, j in combinations(range(4), 2):
+            valid &= used[:, i] != used[:, j]
+
+        keys = rng.random((len(batch), 52), dtype=np.float32)
+        keys[np.arange(len(batch))[:, None], used] = 2.0  # dealt cards sort last
+        board = np.argpartition(keys, 5, axis=1)[:, :5]
+        score_a = Comparator.evaluate_batch(np.hstack([board, hand_a]))
+        score_b = Comparator.evaluate_batch(np.hstack([board, hand_b]))
+        result = np.where(score_a > score_b, 1.0, np.where(score_a == score_b, 0.5, 0.0))
+
+        cells = batch - columns[first]
+        n_cells = min(step, len(columns) - first)
+        n_valid = np.bincount(cells, weights=valid, minlength=n_cells)
+        totals = np.bincount(cells, weights=result * valid, minlength=n_cells)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            equities[first:first + n_cells] = np.where(n_valid > 0, totals / n_valid, np.nan)
+    return row, equities
+
+
+def build_preflop_table(path, full=False, n_samples=2000, seed=None, n_workers=None):
+    """
+    Write the 169 x 169 (or 1326 x 1326 if "full") preflop equity matrix to a .npy file, one random runout sampling
+    per row in a process pool. Cell [i, j] is the equity of hand i against hand j, NaN when the two combos share a card.
+    """
+    groups = _preflop_groups(full)
+    n = len(groups)
+    matrix = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(n, n))
+    matrix[np.arange(n), np.arange(n)] = np.nan if full else 0.5  # a class against itself is even by symmetry
+    seeds = np.random.SeedSequence(seed).spawn(n)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        for row, equities in executor.map(_preflop_row, repeat(groups), range(n), repeat(n_samples), seeds):
+            matrix[row, row + 1:] = equities
+            matrix[row + 1:, row] = 1 - equities
+            print(f'Preflop table row {row + 1}/{n} done.')
+    matrix.flush()
+    return path
+
+
+# %% preflop equity lookup class definition
+class PreflopTable:
+    """
+    Preflop hand-vs-hand equity lookup from a matrix file written by build_preflop_table.
+    The file is memory-mapped read only, so every process loading it shares one page cache copy.
+    """
+
+    def __init__(self, path):
+        self.matrix = np.load(path, mmap_mode='r')
+        self.full = self.matrix.shape[0] == len(COMBO_INDEX)
+        self.comparator = Comparator()
+
+    def index(self, hand):
+        codes = tuple(sorted(self.comparator.encode_cards(hand)))
+        return COMBO_INDEX[codes] if self.full else preflop_class_index(codes)
+
+    def equity(self, hand, other_hand):
+        return float(self.matrix[self.index(hand), self.index(other_hand)])
+
+
+# %% equity calculator class definition
+class EquityCalculator:
+    """
+    Estimate the win and tie probabilities of each player from known hole cards and a partial board.
+    -------------------------------------------------------------------------------------------------------------------
+    Hands are lists of two cards (Card objects or strings such as '10H'), None for a player whose hole cards
+    are unknown. Random runouts are split into chunks of "chunk_size" samples and spread over a process pool,
+    each chunk has its own seed derived from "seed" so results do not depend on the number of workers.
+    When all hole cards are known and few board cards remain, "exact" walks every runout instead.
+    """
+
+    def __init__(self, n_samples=100000, seed=None, n_workers=None, chunk_size=20000, max_runouts=20000):
+        self.n_samples = n_samples
+        self.seed = seed
+        self.n_workers = n_workers if n_workers is not None else os.cpu_count()
+        self.chunk_size = chunk_size
+        self.max_runouts = max_runouts  # largest number of runouts "calculate" enumerates exactly
+        self.comparator = Comparator()
+        self.executor = None
+
+    def get_executor(self):  # the process pool is started once and reused between calls
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.n_workers)
+        return self.executor
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def encode(self, hands, board):  # card codes of the hands and the board, and the codes left in the deck
+        hand_codes = [None if hand is None else self.comparator.encode_cards(hand) for hand in hands]
+        board_codes = self.comparator.encode_cards(board or [])
+        known = [code for hand in hand_codes if hand is not None for code in hand] + board_codes
+        if len(set(known)) != len(known):
+            raise ValueError(f'The same card is dealt more than once: {hands} {board}')
+        if len(board_codes) > 5 or any(hand is not None and len(hand) != 2 for hand in hand_codes):
+            raise ValueError(f'Expected hands of 2 cards and a board of at most 5 cards: {hands} {board}')
+        remaining = [card.code for card in Deck(1).cards if card.code not in known]
+        return hand_codes, board_codes, remaining
+
+    def monte_carlo(self, hands, board=None, n_samples=None, seed=None):
+        n_samples = self.n_samples if n_samples is None else n_samples
+        seed = self.seed if seed is None else seed
+        hand_codes, board_codes, remaining = self.encode(hands, board)
+
+        chunks = [self.chunk_size] * (n_samples // self.chunk_size)
+        if n_samples % self.chunk_size:
+            chunks.append(n_samples % self.chunk_size)
+        seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+        if self.n_workers == 1 or len(chunks) == 1:
+            results = map(_rollout_chunk, repeat(hand_codes), repeat(board_codes), repeat(remaining), chunks, seeds)
+        else:
+            results = self.get_executor().map(_rollout_chunk, repeat(hand_codes), repeat(board_codes),
+                                              repeat(remaining), chunks, seeds)
+
+        wins = np.zeros(len(hands))
+        ties = np.zeros(len(hands))
+        shares = np.zeros(len(hands))
+        for chunk_wins, chunk_ties, chunk_shares in results:
+            wins += chunk_wins
+            ties += chunk_ties
+            shares += chunk_shares
+        return [{'WIN': float(wins[i] / n_samples), 'TIE': float(ties[i] / n_samples),
+                 'EQUITY': float(shares[i] / n_samples)}
+                for i in range(len(hands))]
+
+    def exact(self, hands, board=None):
+        hand_codes, board_codes, remaining = self.encode(hands, board)
+        if any(hand is None for hand in hand_codes):
+            raise ValueError('Exact enumeration needs the hole cards of every player.')
+        states = []  # count of each rank and rank mask of each suit for every player, updated as cards are added
+        for hand in hand_codes:
+            counts = [0] * 13
+            suit_masks = [0, 0, 0, 0]
+            for code in hand + board_codes:
+                counts[code >> 2] += 1
+                suit_masks[code & 3] |= 1 << (code >> 2)
+            states.append((counts, suit_masks))
+
+        wins = [0] * len(hands)
+        ties = [0] * len(hands)
+        shares = [0.0] * len(hands)
+        n_runouts = self._enumerate_runouts(states, remaining, 0, 5 - len(board_codes), wins, ties, shares)
+        return [{'WIN': wins[i] / n_runouts, 'TIE': ties[i] / n_runouts, 'EQUITY': shares[i] / n_runouts}
+                for i in range(len(hands))]
+
+    def _enumerate_runouts(self, states, remaining, start, n_cards, wins, ties, shares):
+        if n_cards == 0:  # a complete board, score every player
+            scores = [Comparator.score_state(counts, suit_masks) for counts, suit_masks in states]
+            best = max(scores)
+            winners = [i for i, score in enumerate(scores) if score == best]
+            for i in winners:
+                if len(winners) == 1:
+                    wins[i] += 1
+                else:
+                    ties[i] += 1
+                shares[i] += 1 / len(winners)
+            return 1
+
+        n_runouts = 0
+        for position in range(start, len(remaining) - n_cards + 1):  # runouts sharing a prefix share its state
+            rank = remaining[position] >> 2
+            bit = 1 << rank
+            suit = remaining[position] & 3
+            for counts, suit_masks in states:
+                counts[rank] += 1
+                suit_masks[suit] |= bit
+            n_runouts += self._enumerate_runouts(states, remaining, position + 1, n_cards - 1, wins, ties, shares)
+            for counts, suit_masks in states:
+                counts[rank] -= 1
+                suit_masks[suit] ^= bit
+        return n_runouts
+
+    def calculate(self, hands, board=None):  # exact when the runouts are few enough, otherwise Monte Carlo
+        n_known = 2 * sum(hand is not None for hand in hands) + len(board or [])
+        if None not in hands and comb(52 - n_known, 5 - len(board or [])) <= self.max_runouts:
+            return self.exact(hands, board)
+        return self.monte_carlo(hands, board)
+
+
+# %% build the preflop equity tables when run as a script
+if __name__ == '__main__':
+    build_preflop_table('preflop_equity_169.npy', full=False, n_samples=5000, seed=0)
+    # build_preflop_table('preflop_equity_1326.npy', full=True, n_samples=500, seed=0)
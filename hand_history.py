@@ -0,0 +1,130 @@
+# %% import libraries
+import csv
+import os
+import threading
+import time
+try:  # only needed for the columnar formats
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+# %% hand history columns, the first ones are those of the poker_record_<timestamp>.csv files
+HISTORY_COLUMNS = ['player', 'hand', 'board', 'move', 'amount', 'past_bet', 'current_bet', 'in_game', 'best_hand',
+                   'table', 'hand_id', 'round', 'time']
+HISTORY_TYPES = {'player': 'string', 'hand': 'string', 'board': 'string', 'move': 'string', 'amount': 'int64',
+                 'past_bet': 'int64', 'current_bet': 'int64', 'in_game': 'bool', 'best_hand': 'string',
+                 'table': 'string', 'hand_id': 'int64', 'round': 'int64', 'time': 'float64'}
+HISTORY_EXTENSIONS = {'csv': 'csv', 'parquet': 'parquet', 'arrow': 'arrow'}
+TIMER_MOVES = ('timeout', 'time_bank')  # rows of the decision timers, written just before the move they timed
+
+
+# %% streaming hand history writer class definition
+class HandHistoryWriter:
+    """
+    Append-only hand history shared by many tables, one row per move.
+    -------------------------------------------------------------------------------------------------------------------
+    Rows are buffered in memory and appended to the current file every "buffer_rows" rows, and at the latest
+    "flush_seconds" after they were written (a timer thread flushes tables that went quiet), so a file is never
+    rewritten. close flushes the last rows and must be called before the process exits. A new file
+    "<prefix>_<timestamp>.<format>" starts once the current one is "max_bytes" large or "max_seconds" old, files opened
+    in the same second get a "_<n>" suffix. "file_format" is 'csv', or 'parquet' and 'arrow' (Arrow IPC) which need
+    pyarrow, a parquet file gets one row group per flush.
+    """
+
+    def __init__(self, directory='.', prefix='poker_record', file_format='csv', buffer_rows=4096, flush_seconds=10,
+                 max_bytes=64 << 20, max_seconds=24 * 3600):
+        if file_format not in HISTORY_EXTENSIONS:
+            raise ValueError(f'Unknown hand history format {file_format}, use one of {list(HISTORY_EXTENSIONS)}.')
+        if file_format != 'csv' and pa is None:
+            raise ImportError(f'pyarrow is needed to write {file_format} hand histories.')
+        self.directory = directory
+        self.prefix = prefix
+        self.file_format = file_format
+        self.buffer_rows = buffer_rows
+        self.flush_seconds = flush_seconds
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.schema = None if pa is None else pa.schema([(column, HISTORY_TYPES[column]) for column in HISTORY_COLUMNS])
+
+        self.lock = threading.Lock()  # tables write from their own threads
+        self.rows = []
+        self.path = None
+        self.sink = None  # open file of the current path
+        self.writer = None  # csv, parquet or arrow writer on the sink
+        self.opened_at = 0
+        self.flushed_at = time.monotonic()
+        self.paths = []  # every file written so far
+        os.makedirs(directory, exist_ok=True)
+        self.closed = threading.Event()
+        self.flusher = threading.Thread(target=self.flush_periodically, daemon=True)
+        self.flusher.start()
+
+    def write(self, row):  # a dict with the HISTORY_COLUMNS keys
+        with self.lock:
+            self.rows.append(row)
+            if len(self.rows) >= self.buffer_rows or time.monotonic() - self.flushed_at > self.flush_seconds:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def flush_periodically(self):  # runs in the timer thread until close
+        while not self.closed.wait(self.flush_seconds):
+            with self.lock:
+                if self.rows:
+                    self._flush()
+
+    def close(self):
+        self.closed.set()
+        self.flusher.join()
+        with self.lock:
+            self._flush()
+            self._close_file()
+
+    def _flush(self):
+        self.flushed_at = time.monotonic()
+        if not self.rows:
+            return
+        if self.sink is None or self.sink.tell() >= self.max_bytes or time.time() - self.opened_at >= self.max_seconds:
+            self._close_file()
+            self._open_file()
+        if self.file_format == 'csv':
+            self.writer.writerows(self.rows)
+            self.sink.flush()
+        else:
+            table = pa.Table.from_pylist(self.rows, schema=self.schema)
+            self.writer.write_table(table)
+        self.rows = []
+
+    def _open_file(self):
+        self.opened_at = time.time()
+        name = f'{self.prefix}_{int(self.opened_at)}'
+        self.path = os.path.join(self.directory, f'{name}.{HISTORY_EXTENSIONS[self.file_format]}')
+        n = 1
+        while os.path.exists(self.path):  # several files in the same second
+            self.path = os.path.join(self.directory, f'{name}_{n}.{HISTORY_EXTENSIONS[self.file_format]}')
+            n += 1
+        if self.file_format == 'csv':
+            self.sink = open(self.path, 'w', newline='', buffering=1 << 20)
+            self.writer = csv.DictWriter(self.sink, fieldnames=HISTORY_COLUMNS)
+            self.writer.writeheader()
+        elif self.file_format == 'parquet':
+            self.sink = pa.OSFile(self.path, 'wb')
+            self.writer = pq.ParquetWriter(self.sink, self.schema)
+        else:
+            self.sink = pa.OSFile(self.path, 'wb')
+            self.writer = pa.ipc.new_file(self.sink, self.schema)
+        self.paths.append(self.path)
+
+    def _close_file(self):
+        if self.sink is None:
+            return
+        if self.file_format != 'csv':
+            self.writer.close()
+        self.sink.close()
+        self.sink = None
+        self.writer = None
@@ -0,0 +1,228 @@
+# %% import libraries
+import csv
+import glob
+import os
+import sqlite3
+import sys
+import time
+from hand_history import HISTORY_COLUMNS, TIMER_MOVES
+try:  # only needed to ingest the columnar formats
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+# %% store parameters
+MOVES = ['fold', 'check', 'call', 'raising', 'all_in', 'showdown', 'uncontested', 'seat', 'timeout', 'time_bank']
+MOVE_CODES = {move: code for code, move in enumerate(MOVES)}
+HAND_NAMES = ['Initial Hand', 'high card', 'one pair', 'two pairs', 'three of a kind', 'straight', 'flush',
+              'full house', 'four of a kind', 'straight flush', 'royal flush']  # index is the Comparator category
+HAND_CODES = {name: code for code, name in enumerate(HAND_NAMES)}
+ROUND_OF_BOARD = {0: 0, 3: 1, 4: 2, 5: 3}  # street of the rows of old files from the number of board cards
+HAND_GAP = 600  # seconds after which the same table and hand id is another hand (tables restart with the server)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT UNIQUE, n_rows INTEGER, ingested REAL);
+CREATE TABLE IF NOT EXISTS players (id INTEGER PRIMARY KEY, name TEXT UNIQUE);
+CREATE TABLE IF NOT EXISTS moves (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE IF NOT EXISTS hand_names (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE IF NOT EXISTS actions (hand_key INTEGER, file_id INTEGER, player_id INTEGER, hand TEXT, board TEXT,
+                                    move INTEGER, amount INTEGER, past_bet INTEGER, current_bet INTEGER,
+                                    in_game INTEGER, best_hand INTEGER, table_name TEXT, hand_id INTEGER,
+                                    round INTEGER, time REAL);
+CREATE INDEX IF NOT EXISTS actions_player ON actions (player_id, time);
+CREATE INDEX IF NOT EXISTS actions_time ON actions (time);
+CREATE INDEX IF NOT EXISTS actions_round ON actions (round, player_id);
+CREATE INDEX IF NOT EXISTS actions_hand ON actions (hand_key);
+"""
+
+
+# %% reading hand history files
+def read_history_file(path):  # rows of a csv, parquet or arrow hand history as dicts of strings or values
+    if path.endswith('.csv'):
+        with open(path, newline='') as file:
+            return list(csv.DictReader(file))
+    if pa is None:
+        raise ImportError(f'pyarrow is needed to read {path}.')
+    if path.endswith('.parquet'):
+        return pq.read_table(path).to_pylist()
+    with pa.OSFile(path, 'rb') as source:
+        return pa.ipc.open_file(source).read_all().to_pylist()
+
+
+def file_timestamp(path):  # poker_record_<timestamp>.csv, the modification time otherwise
+    stem = os.path.splitext(os.path.basename(path))[0]
+    for part in stem.split('_'):
+        if part.isdigit() and len(part) >= 9:
+            return float(part)
+    return os.path.getmtime(path)
+
+
+def file_order(path):  # sort key: file timestamp, then the number of the files opened in the same second (_1, _2, ...)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    head, _, tail = stem.rpartition('_')
+    rotation = int(tail) if head and tail.isdigit() and len(tail) < 9 else 0
+    return file_timestamp(path), rotation, path
+
+
+def parse_bool(value):  # True, 'True', 'TRUE', 'true' or '1' from csv, parquet and arrow files
+    return str(value).strip().lower() in ('true', '1')
+
+
+# %% consolidated hand history store class definition
+class HandStore:
+    """
+    All hand histories in one SQLite file, indexed by player, time and street (round).
+    -------------------------------------------------------------------------------------------------------------------
+    ingest adds csv, parquet or arrow hand history files once each. Players, moves and best hand labels are stored
+    as integer ids. Old poker_record files without the table, hand_id, round and time columns get the file name as
+    table, the file timestamp as time, the round from the board size, and a new hand whenever the round goes back.
+    Every hand gets a "hand_key" that is unique in the store.
+    """
+
+    def __init__(self, path='poker_history.db'):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.db.executemany('INSERT OR IGNORE INTO moves VALUES (?, ?)', list(enumerate(MOVES)))
+        self.db.executemany('INSERT OR IGNORE INTO hand_names VALUES (?, ?)', list(enumerate(HAND_NAMES)))
+        self.db.commit()
+        self.player_ids = dict(self.db.execute('SELECT name, id FROM players'))
+        self.open_hands = {}  # (table, hand id): (hand key, time of its last row), for hands split over two files
+
+    def close(self):
+        self.db.close()
+
+    def player_id(self, name):
+        if name not in self.player_ids:
+            self.player_ids[name] = self.db.execute('INSERT INTO players (name) VALUES (?)', (name,)).lastrowid
+        return self.player_ids[name]
+
+    def ingest(self, paths):  # add the files not in the store yet, oldest first, return the number of rows added
+        ingested = {path for (path,) in self.db.execute('SELECT path FROM files')}
+        next_key = self.db.execute('SELECT COALESCE(MAX(hand_key), 0) + 1 FROM actions').fetchone()[0]
+        n_rows = 0
+        for path in sorted(paths, key=file_order):
+            path = os.path.abspath(path)
+            if path in ingested:
+                continue
+            rows = read_history_file(path)
+            file_id = self.db.execute('INSERT INTO files (path, n_rows, ingested) VALUES (?, ?, ?)',
+                                      (path, len(rows), time.time())).lastrowid
+            default_time = file_timestamp(path)
+            legacy_hand, previous_round = 0, -1
+            values = []
+            for row in rows:
+                board = row['board']
+                round_index = int(row['round']) if row.get('round') not in (None, '') else \
+                    ROUND_OF_BOARD.get(board.count(',') + 1 if board != '[]' else 0, 0)
+                if row.get('hand_id') in (None, ''):  # old files: a new hand starts when the round goes back
+                    legacy_hand += round_index < previous_round
+                    table_name, hand_id = os.path.basename(path), legacy_hand
+                else:
+                    table_name, hand_id = str(row['table']), int(row['hand_id'])
+                previous_round = round_index
+                row_time = float(row['time']) if row.get('time') not in (None, '') else default_time
+
+                hand_key, last_time = self.open_hands.get((table_name, hand_id), (None, None))
+                if hand_key is None or row_time - last_time > HAND_GAP:
+                    hand_key = next_key
+                    next_key += 1
+                self.open_hands[(table_name, hand_id)] = (hand_key, row_time)
+
+                values.append((hand_key, file_id, self.player_id(row['player']), row['hand'], board,
+                               MOVE_CODES.get(row['move'], -1), int(row['amount']), int(row['past_bet']),
+                               int(row['current_bet']), int(parse_bool(row['in_game'])),
+                               HAND_CODES.get(row['best_hand'], -1), table_name, hand_id, round_index, row_time))
+            self.db.executemany(f'INSERT INTO actions VALUES ({", ".join("?" * 15)})', values)
+            self.db.commit()
+            n_rows += len(values)
+        return n_rows
+
+    @staticmethod
+    def filters(player=None, since=None, until=None, street=None):  # SQL conditions and their parameters
+        conditions, parameters = ['1'], []
+        if player is not None:
+            conditions.append('players.name = ?')
+            parameters.append(player)
+        if since is not None:
+            conditions.append('actions.time >= ?')
+            parameters.append(since)
+        if until is not None:
+            conditions.append('actions.time < ?')
+            parameters.append(until)
+        if street is not None:
+            conditions.append('actions.round = ?')
+            parameters.append(street)
+        return ' AND '.join(conditions), parameters
+
+    def actions(self, player=None, since=None, until=None, street=None):  # hand history rows, oldest first
+        conditions, parameters = self.filters(player, since, until, street)
+        query = f"""SELECT players.name, hand, board, moves.name, amount, past_bet, current_bet, in_game,
+                           hand_names.name, table_name, hand_id, round, time
+                    FROM actions JOIN players ON players.id = actions.player_id
+                    LEFT JOIN moves ON moves.id = actions.move LEFT JOIN hand_names ON hand_names.id = actions.best_hand
+                    WHERE {conditions} ORDER BY actions.time, actions.rowid"""
+        rows = []
+        for values in self.db.execute(query, parameters):
+            row = dict(zip(HISTORY_COLUMNS, values))
+            row['in_game'] = bool(row['in_game'])
+            rows.append(row)
+        return rows
+
+    def player_stats(self, player=None, since=None, until=None):
+        """
+        Per player: hands played, VPIP and PFR (share of hands with a voluntary call or a raise pre-flop), fold rate
+        (share of hands folded), showdowns reached and won (a showdown row with chips won). An all-in counts for PFR
+        only when it went over the highest bet before it (the big blind of the 'seat' rows included), a short all-in
+        that only calls does not.
+        """
+        conditions, parameters = self.filters(player, since, until)
+        voluntary = ', '.join(str(MOVE_CODES[move]) for move in ('call', 'raising', 'all_in'))
+        raises = ', '.join(str(MOVE_CODES[move]) for move in ('raising', 'all_in'))
+        timers = ', '.join(str(MOVE_CODES[move]) for move in TIMER_MOVES)  # their current_bet is a time
+        query = f"""
+            WITH preflop AS (
+                SELECT rowid AS action_id, move, current_bet,
+                       MAX(current_bet) OVER (PARTITION BY hand_key ORDER BY rowid
+                                              ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING) AS previous_bet
+                FROM actions WHERE round = 0 AND move NOT IN ({timers})),
+            raised AS (
+                SELECT action_id FROM preflop WHERE move IN ({raises}) AND current_bet > IFNULL(previous_bet, 0)),
+            per_hand AS (
+                SELECT actions.player_id,
+                       MAX(round = 0 AND move IN ({voluntary})) AS vpip,
+                       MAX(raised.action_id IS NOT NULL) AS pfr,
+                       MAX(move = {MOVE_CODES['fold']}) AS folded,
+                       MAX(move = {MOVE_CODES['showdown']}) AS showdown,
+                       MAX(move = {MOVE_CODES['showdown']} AND amount > 0) AS won
+                FROM actions JOIN players ON players.id = actions.player_id
+                LEFT JOIN raised ON raised.action_id = actions.rowid
+                WHERE {conditions}
+                GROUP BY actions.player_id, hand_key)
+            SELECT players.name, COUNT(*), AVG(vpip), AVG(pfr), AVG(folded), SUM(showdown), SUM(won)
+            FROM per_hand JOIN players ON players.id = per_hand.player_id
+            GROUP BY per_hand.player_id ORDER BY players.name"""
+        stats = []
+        for name, n_hands, vpip, pfr, fold_rate, showdowns, won in self.db.execute(query, parameters):
+            stats.append({'PLAYER': name,
+                          'HANDS': n_hands,
+                          'VPIP': vpip,
+                          'PFR': pfr,
+                          'FOLD_RATE': fold_rate,
+                          'SHOWDOWNS': showdowns,
+                          'SHOWDOWN_WINS': won,
+                          'SHOWDOWN_WIN_RATE': won / showdowns if showdowns else None})
+        return stats
+
+
+# %%
+if __name__ == '__main__':  # python hand_store.py [files ...], the poker_record files of this folder by default
+    store = HandStore('poker_history.db')
+    paths = sys.argv[1:] or glob.glob('poker_record_*')
+    print(f'Ingested {store.ingest(paths)} rows from {len(paths)} files.')
+    for player_stats in store.player_stats():
+        print(player_stats)
+    store.close()
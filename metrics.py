@@ -0,0 +1,236 @@
+# %% import libraries
+import asyncio
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+
+# %% metrics parameters
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # seconds, upper bounds
+HANDS_WINDOW = 60  # seconds over which the hands per minute are counted
+METRICS_PREFIX = 'poker'
+
+
+# %% histogram of durations
+class Histogram:
+    """
+    Count of observations per bucket with their sum, each observation adds to them in O(log buckets).
+    """
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):  # (upper bound, observations up to it) as in a Prometheus histogram
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+    def summary(self):
+        return {'COUNT': self.count,
+                'SUM': self.sum,
+                'MEAN': self.sum / self.count if self.count else None,
+                'BUCKETS': {str(bound): total for bound, total in self.cumulative()}}
+
+    @classmethod
+    def from_summary(cls, summary):  # the histogram of a summary, e.g. in the snapshot of a worker process
+        histogram = cls()
+        previous = 0
+        for index, total in enumerate(summary['BUCKETS'].values()):
+            histogram.counts[index] = total - previous
+            previous = total
+        histogram.count = summary['COUNT']
+        histogram.sum = summary['SUM']
+        return histogram
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.sum += other.sum
+
+
+def escape_label(value):  # player names are free text
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):  # (('player', 'bob'),) to '{player="bob"}'
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in labels) + '}'
+
+
+# %% server metrics class definition
+class ServerMetrics:
+    """
+    Timings and counters of the game server, shared by every table thread.
+    -------------------------------------------------------------------------------------------------------------------
+    GameEnv times each message sent to a player ('communication') or to the whole table ('broadcast'), each street
+    ('street_0' to 'street_3'), game_end_update and the Comparator evaluations of a hand, and the response latency of
+    every player. The server counts hands (with the hands of the last "HANDS_WINDOW" seconds for the hands per
+    minute), active tables and socket errors by kind.
+    render gives the Prometheus text format served by handle_http, with "dump_path" the snapshot is also written to
+    a JSON file at most every "dump_seconds" seconds when a hand ends and on save.
+
+    With table worker processes (see ServerClient.ShardedTableServer) each worker keeps its own ServerMetrics and
+    sends its snapshot to the acceptor, which adds the latest one of every worker (update_worker) to its snapshot and
+    render: hands, socket errors, timings and latencies are summed, the acceptor counts the active tables itself.
+    """
+
+    def __init__(self, dump_path=None, dump_seconds=60):
+        self.dump_path = dump_path
+        self.dump_seconds = dump_seconds
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.timings = {}  # section name: Histogram
+        self.latency = {}  # player name: Histogram
+        self.socket_errors = {}  # kind: count
+        self.n_hands = 0
+        self.hand_times = deque()  # end time of the hands of the last HANDS_WINDOW seconds
+        self.active_tables = 0
+        self.started_at = time.time()
+        self.saved_at = time.monotonic()
+        self.worker_snapshots = {}  # worker index: latest snapshot of a table worker process
+
+    def observe(self, name, seconds):
+        with self.lock:
+            if name not in self.timings:
+                self.timings[name] = Histogram()
+            self.timings[name].observe(seconds)
+
+    def observe_latency(self, player, seconds):  # from the move request to the answer of the player
+        with self.lock:
+            if player not in self.latency:
+                self.latency[player] = Histogram()
+            self.latency[player].observe(seconds)
+
+    def socket_error(self, kind):  # 'timeout', 'connection', 'name' or 'idle'
+        with self.lock:
+            self.socket_errors[kind] = self.socket_errors.get(kind, 0) + 1
+
+    def table_started(self):
+        with self.lock:
+            self.active_tables += 1
+
+    def table_ended(self):
+        with self.lock:
+            self.active_tables -= 1
+
+    def hand_played(self):
+        now = time.monotonic()
+        with self.lock:
+            self.n_hands += 1
+            self.hand_times.append(now)
+            due = self.dump_path is not None and now - self.saved_at > self.dump_seconds
+            if due:
+                self.saved_at = now
+        if due:
+            self.save()
+
+    def hands_per_minute(self):
+        with self.lock:
+            now = time.monotonic()
+            while self.hand_times and now - self.hand_times[0] > HANDS_WINDOW:
+                self.hand_times.popleft()
+            return len(self.hand_times) * 60 / HANDS_WINDOW
+
+    def update_worker(self, index, snapshot):
+        with self.lock:
+            self.worker_snapshots[index] = snapshot
+
+    def combined(self):  # counts and histograms of this process plus the latest snapshot of every worker
+        hands_per_minute = self.hands_per_minute()
+        with self.lock:
+            combined = {'HANDS': self.n_hands,
+                        'HANDS_PER_MINUTE': hands_per_minute,
+                        'ACTIVE_TABLES': self.active_tables,
+                        'SOCKET_ERRORS': dict(self.socket_errors),
+                        'TIMINGS': {name: Histogram.from_summary(histogram.summary())
+                                    for name, histogram in self.timings.items()},
+                        'LATENCY': {name: Histogram.from_summary(histogram.summary())
+                                    for name, histogram in self.latency.items()}}
+            worker_snapshots = list(self.worker_snapshots.values())
+        for snapshot in worker_snapshots:
+            combined['HANDS'] += snapshot['HANDS']
+            combined['HANDS_PER_MINUTE'] += snapshot['HANDS_PER_MINUTE']
+            for kind, count in snapshot['SOCKET_ERRORS'].items():
+                combined['SOCKET_ERRORS'][kind] = combined['SOCKET_ERRORS'].get(kind, 0) + count
+            for key in ('TIMINGS', 'LATENCY'):
+                for name, summary in snapshot[key].items():
+                    if name in combined[key]:
+                        combined[key][name].merge(Histogram.from_summary(summary))
+                    else:
+                        combined[key][name] = Histogram.from_summary(summary)
+        return combined
+
+    def snapshot(self):
+        combined = self.combined()
+        return {'TIME': time.time(),
+                'UPTIME': time.time() - self.started_at,
+                'HANDS': combined['HANDS'],
+                'HANDS_PER_MINUTE': combined['HANDS_PER_MINUTE'],
+                'ACTIVE_TABLES': combined['ACTIVE_TABLES'],
+                'SOCKET_ERRORS': combined['SOCKET_ERRORS'],
+                'TIMINGS': {name: histogram.summary() for name, histogram in combined['TIMINGS'].items()},
+                'LATENCY': {name: histogram.summary() for name, histogram in combined['LATENCY'].items()}}
+
+    def render(self):  # Prometheus text exposition format
+        combined = self.combined()
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append(f'# HELP {METRICS_PREFIX}_{name} {description}')
+            lines.append(f'# TYPE {METRICS_PREFIX}_{name} {kind}')
+            for suffix, labels, value in samples:
+                lines.append(f'{METRICS_PREFIX}_{name}{suffix}{format_labels(labels)} {value}')
+
+        def histogram_samples(label, histograms):
+            for key, histogram in sorted(histograms.items()):
+                for bound, total in histogram.cumulative():
+                    yield '_bucket', ((label, key), ('le', '+Inf' if bound == float('inf') else bound)), total
+                yield '_sum', ((label, key),), histogram.sum
+                yield '_count', ((label, key),), histogram.count
+
+        metric('hands_total', 'counter', 'Hands played.', [('', (), combined['HANDS'])])
+        metric('hands_per_minute', 'gauge', f'Hands played in the last {HANDS_WINDOW} seconds, per minute.',
+               [('', (), combined['HANDS_PER_MINUTE'])])
+        metric('active_tables', 'gauge', 'Tables running.', [('', (), combined['ACTIVE_TABLES'])])
+        metric('socket_errors_total', 'counter', 'Socket errors by kind.',
+               [('', (('kind', kind),), count) for kind, count in sorted(combined['SOCKET_ERRORS'].items())])
+        metric('section_seconds', 'histogram', 'Time spent in each section of the game loop.',
+               list(histogram_samples('section', combined['TIMINGS'])))
+        metric('player_response_seconds', 'histogram', 'Time from a move request to the answer of the player.',
+               list(histogram_samples('player', combined['LATENCY'])))
+        return '\n'.join(lines) + '\n'
+
+    async def handle_http(self, reader, writer):  # answer any GET with the metrics, for asyncio.start_server
+        try:
+            await reader.readuntil(b'\r\n\r\n')
+            body = self.render().encode('utf-8')
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                         b'Content-Length: %d\r\nConnection: close\r\n\r\n' % len(body) + body)
+            await writer.drain()
+        except (ConnectionError, EOFError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    def save(self):  # write the snapshot to a temporary file first so a crash never leaves half a snapshot
+        snapshot = self.snapshot()
+        with self.save_lock:
+            with open(f'{self.dump_path}.tmp', 'w') as file:
+                json.dump(snapshot, file)
+            os.replace(f'{self.dump_path}.tmp', self.dump_path)
@@ -0,0 +1,140 @@
+# %% import libraries
+import json
+import os
+import threading
+import time
+
+
+# %% counters of one player
+class PlayerCounters:
+    """
+    Running counts of one player's moves, each move adds to them in O(1).
+    """
+
+    __slots__ = ('hands', 'vpip_hands', 'pfr_hands', 'bets_raises', 'calls', 'faced_raises', 'folds_to_raise',
+                 'showdowns', 'showdown_wins', 'vpip_in_hand', 'pfr_in_hand')
+
+    def __init__(self, counts=None):
+        for name in self.__slots__[:-2]:
+            setattr(self, name, 0 if counts is None else counts.get(name, 0))
+        self.vpip_in_hand = False  # the flags make VPIP and PFR count once per hand
+        self.pfr_in_hand = False
+
+    def counts(self):
+        return {name: getattr(self, name) for name in self.__slots__[:-2]}
+
+    def summary(self):  # the rates shown to players and used for matchmaking, None until there is data
+        return {'HANDS': self.hands,
+                'VPIP': self.vpip_hands / self.hands if self.hands else None,
+                'PFR': self.pfr_hands / self.hands if self.hands else None,
+                'AGGRESSION_FACTOR': self.bets_raises / self.calls if self.calls else None,
+                'FOLD_TO_RAISE': self.folds_to_raise / self.faced_raises if self.faced_raises else None,
+                'SHOWDOWNS': self.showdowns,
+                'SHOWDOWN_WIN_RATE': self.showdown_wins / self.showdowns if self.showdowns else None}
+
+
+# %% incremental player statistics class definition
+class StatsAggregator:
+    """
+    Per player statistics kept up to date by GameEnv while the hands are played.
+    -------------------------------------------------------------------------------------------------------------------
+    start_hand, record_move and record_result update a few counters per call, summary reads the current VPIP, PFR,
+    aggression factor, fold to raise and showdown win rate of a player. With "snapshot_path" the counts are loaded
+    from the last snapshot and saved again, at most every "snapshot_seconds" seconds when a hand starts and on save.
+    Tables running in threads share one aggregator.
+
+    With table worker processes (see ServerClient.ShardedTableServer) each worker keeps its own aggregator and sends
+    its snapshot to the acceptor, which adds the latest counts of every worker (update_worker) to its own, player by
+    player, in summary and snapshot. The acceptor's snapshot file therefore covers the tables of every worker.
+    """
+
+    def __init__(self, snapshot_path=None, snapshot_seconds=60):
+        self.snapshot_path = snapshot_path
+        self.snapshot_seconds = snapshot_seconds
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.players = {}  # name: PlayerCounters
+        self.worker_snapshots = {}  # worker index: latest counts of a table worker process, name: counts
+        self.saved_at = time.monotonic()
+        if snapshot_path is not None and os.path.exists(snapshot_path):
+            with open(snapshot_path) as file:
+                for name, counts in json.load(file)['PLAYERS'].items():
+                    self.players[name] = PlayerCounters(counts)
+
+    def counters(self, name):
+        if name not in self.players:
+            self.players[name] = PlayerCounters()
+        return self.players[name]
+
+    def start_hand(self, names):
+        with self.lock:
+            for name in names:
+                counters = self.counters(name)
+                counters.hands += 1
+                counters.vpip_in_hand = False
+                counters.pfr_in_hand = False
+            due = self.snapshot_path is not None and time.monotonic() - self.saved_at > self.snapshot_seconds
+            if due:
+                self.saved_at = time.monotonic()
+        if due:
+            self.save()
+
+    def record_move(self, name, round_index, move, facing_raise, raised=False):
+        with self.lock:
+            counters = self.counters(name)
+            aggressive = move == 'raising' or (move == 'all_in' and raised)  # raised: went over the current bet
+            calling = move == 'call' or (move == 'all_in' and not raised)  # a short all-in only calls
+            if calling:
+                counters.calls += 1
+            elif aggressive:
+                counters.bets_raises += 1
+            if facing_raise:  # more to call than the blind
+                counters.faced_raises += 1
+                counters.folds_to_raise += move == 'fold'
+            if round_index == 0 and (calling or aggressive) and not counters.vpip_in_hand:
+                counters.vpip_in_hand = True
+                counters.vpip_hands += 1
+            if round_index == 0 and aggressive and not counters.pfr_in_hand:
+                counters.pfr_in_hand = True
+                counters.pfr_hands += 1
+
+    def record_result(self, name, showdown, won):
+        if showdown:
+            with self.lock:
+                counters = self.counters(name)
+                counters.showdowns += 1
+                counters.showdown_wins += won
+
+    def update_worker(self, index, snapshot):
+        with self.lock:
+            self.worker_snapshots[index] = snapshot['PLAYERS']
+
+    def combined(self):  # counts of this process plus the latest counts of every worker, name: counts
+        with self.lock:
+            combined = {name: counters.counts() for name, counters in self.players.items()}
+            worker_snapshots = list(self.worker_snapshots.values())
+        for players in worker_snapshots:
+            for name, counts in players.items():
+                if name in combined:
+                    combined[name] = {key: count + counts.get(key, 0) for key, count in combined[name].items()}
+                else:
+                    combined[name] = dict(counts)
+        return combined
+
+    def summary(self, name):
+        with self.lock:
+            if not self.worker_snapshots:
+                return self.counters(name).summary()
+        return PlayerCounters(self.combined().get(name)).summary()
+
+    def snapshot(self):
+        return {'TIME': time.time(), 'PLAYERS': self.combined()}
+
+    def save(self):  # write the snapshot to a temporary file first so a crash never leaves half a snapshot
+        if self.snapshot_path is None:
+            return
+        snapshot = self.snapshot()
+        with self.save_lock:
+            with open(f'{self.snapshot_path}.tmp', 'w') as file:
+                json.dump(snapshot, file)
+            os.replace(f'{self.snapshot_path}.tmp', self.snapshot_path)
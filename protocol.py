@@ -0,0 +1,65 @@
+# %% import libraries
+import json
+import struct
+
+
+# %% framed messages: a 4 byte big-endian body length, then the body [command, payload] as compact JSON
+HEADER = struct.Struct('!I')
+MAX_MESSAGE_SIZE = 1 << 20
+
+
+def encode_message(cmd, payload=None):  # cards and other objects are sent as their string, e.g. '10H'
+    body = json.dumps([cmd, payload], separators=(',', ':'), default=str).encode('utf-8')
+    return HEADER.pack(len(body)) + body
+
+
+def decode_body(body):  # ValueError unless the body is a [command, payload] JSON list
+    message = json.loads(body.decode('utf-8'))
+    if not isinstance(message, list) or len(message) != 2 or not isinstance(message[0], str):
+        raise ValueError(f'Malformed message: {body[:80]!r}')
+    return message[0], message[1]
+
+
+def send_message(conn, cmd, payload=None):
+    conn.sendall(encode_message(cmd, payload))
+
+
+def recv_exactly(conn, n_bytes):
+    data = b''
+    while len(data) < n_bytes:
+        chunk = conn.recv(n_bytes - len(data))
+        if not chunk:
+            raise ConnectionError('Connection closed.')
+        data += chunk
+    return data
+
+
+def recv_message(conn):  # blocking read of one whole message, however TCP split or merged it
+    (size,) = HEADER.unpack(recv_exactly(conn, HEADER.size))
+    if size > MAX_MESSAGE_SIZE:
+        raise ConnectionError(f'Message of {size} bytes is too large.')
+    return decode_body(recv_exactly(conn, size))
+
+
+async def read_message(reader):  # asyncio counterpart of recv_message
+    try:
+        (size,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+        if size > MAX_MESSAGE_SIZE:
+            raise ConnectionError(f'Message of {size} bytes is too large.')
+        return decode_body(await reader.readexactly(size))
+    except EOFError:
+        raise ConnectionError('Connection closed.')
+
+
+def broadcast_messages(conns, messages):  # one encoded message per connection, returns the connections that failed
+    send_batch = getattr(conns[0], 'send_batch', None) if conns else None
+    if send_batch is not None:  # connections sharing an event loop are written in a single hop
+        send_batch(list(zip(conns, messages)))
+        return []
+    failed = []
+    for conn, message in zip(conns, messages):
+        try:
+            conn.sendall(message)
+        except (TimeoutError, ConnectionError):
+            failed.append(conn)
+    return failed
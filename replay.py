@@ -0,0 +1,194 @@
+# %% import libraries
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from hand_history import TIMER_MOVES
+from hand_store import file_order, read_history_file
+from texas_holdem import *
+
+
+# %% replay parameters
+COMPARED_COLUMNS = ['player', 'move', 'amount', 'past_bet', 'current_bet', 'in_game', 'best_hand', 'round']
+RESULT_MOVES = ('showdown', 'uncontested')
+
+
+# %% replay helpers: recorded moves as a policy, a deck in the recorded order, rows kept in memory
+class ScriptedPolicy:
+    """
+    Play back the recorded (move, amount) of one player, fold once the record has no more moves.
+    """
+
+    def __init__(self, moves):
+        self.moves = deque(moves)
+
+    def act(self, player, board, current_round_commited):
+        return self.moves.popleft() if self.moves else ('fold', 0)
+
+
+class ReplayDeckPool:
+    """
+    Always the same deck, for GameEnv.reset.
+    """
+
+    def __init__(self, order):
+        self.order = order
+
+    def next_deck(self):
+        return Deck(1, self.order)
+
+
+class ListRecorder:
+    """
+    Hand history rows kept in a list, same interface as HandHistoryWriter.
+    """
+
+    def __init__(self):
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append(row)
+
+
+def parse_cards(text):  # '[KC, 8S]' to card codes
+    text = text.strip('[]')
+    return [CARD_CODES[name] for name in text.split(', ')] if text else []
+
+
+def legacy_hand_ids(rows):  # hand numbers of old records without hand ids, per table (the file for old records)
+    hand_ids = []
+    last = {}  # table: (hand number, board so far, hole cards of each player)
+    for row in rows:
+        table = str(row.get('table'))
+        hand_id, board, cards = last.get(table, (0, None, {}))
+        row_board = row['board'].rstrip(']')  # '[3C, JC, 10H' continues '[3C, JC'
+        new_cards = cards.get(row['player'], row['hand']) != row['hand']
+        if board is not None and (not row_board.startswith(board) or new_cards):
+            hand_id, cards = hand_id + 1, {}  # the board started again or a player has new hole cards
+        cards[row['player']] = row['hand']
+        last[table] = (hand_id, row_board, cards)
+        hand_ids.append(hand_id)
+    return hand_ids
+
+
+def group_hands(rows):  # rows of many hands to one list of rows per hand, in the recorded order
+    hands = []
+    open_hands = {}  # (table, hand id): rows of the hand being read
+    legacy_rows = [row for row in rows if row.get('hand_id') in (None, '')]
+    legacy_ids = iter(legacy_hand_ids(legacy_rows))
+    for row in rows:
+        if row.get('hand_id') in (None, ''):  # old records, grouped to be counted but not replayed (no 'seat' rows)
+            key = (str(row.get('table')), f'legacy {next(legacy_ids)}')
+        else:
+            key = (str(row['table']), str(row['hand_id']))
+        current = open_hands.get(key)
+        if current is None or (row['move'] == 'seat' and current[-1]['move'] != 'seat'):  # a new hand
+            current = []
+            open_hands[key] = current
+            hands.append(current)
+        current.append(row)
+    return hands
+
+
+# %% replay of one hand
+def replay_hand(rows):  # diffs between the recorded rows and the rows of GameEnv replaying the hand
+    rows = [row for row in rows if row['move'] not in TIMER_MOVES]  # headless replays have no decision timers
+    seats = [row for row in rows if row['move'] == 'seat']
+    if not seats:
+        return None  # old records without 'seat' rows do not have the stacks and the seat order
+    moves = {row['player']: [] for row in seats}
+    for row in rows:
+        if row['move'] not in RESULT_MOVES and row['move'] != 'seat':
+            moves[row['player']].append((row['move'], int(row['amount'])))
+
+    players = [Player(row['player'], None, points=int(row['amount']), policy=ScriptedPolicy(moves[row['player']]))
+               for row in seats]
+    board = parse_cards(rows[-1]['board'])
+    dealt = [code for row in seats for code in parse_cards(row['hand'])] + board
+    order = dealt + sorted(set(range(52)) - set(dealt))
+    env = GameEnv(players, small_blind_points=int(seats[0]['current_bet']),
+                  big_blind_points=int(seats[1]['current_bet']), headless=True, recorder=ListRecorder(),
+                  table_id=rows[0]['table'])
+    env.deck_pool = ReplayDeckPool(order)
+    env.n_hands = int(rows[0]['hand_id']) - 1
+    env.play_hand()
+
+    diffs = []
+    replayed = env.recorder.rows
+    for index in range(max(len(rows), len(replayed))):
+        recorded_row = rows[index] if index < len(rows) else {}
+        replayed_row = replayed[index] if index < len(replayed) else {}
+        for column in COMPARED_COLUMNS:
+            if str(recorded_row.get(column)) != str(replayed_row.get(column)):
+                diffs.append({'TABLE': str(rows[0]['table']),
+                              'HAND_ID': int(rows[0]['hand_id']),
+                              'ROW': index,
+                              'COLUMN': column,
+                              'RECORDED': recorded_row.get(column),
+                              'REPLAYED': replayed_row.get(column)})
+    return diffs
+
+
+def _replay_chunk(hands):  # runs inside a worker process
+    return [replay_hand(rows) for rows in hands]
+
+
+# %% hand replayer class definition
+class HandReplayer:
+    """
+    Replay recorded hands through GameEnv and Comparator and report where the engine disagrees with the record.
+    -------------------------------------------------------------------------------------------------------------------
+    Hands need the 'seat' rows GameEnv writes at the start of every hand: stacks, blinds, seat order and hole cards,
+    which with the final board give the deck. Every move is played back by a ScriptedPolicy and each replayed row
+    (moves, bets, best hands and the chips won at the end) is compared with the recorded one. Hands are replayed in
+    chunks of "chunk_size" on "n_workers" processes.
+    """
+
+    def __init__(self, n_workers=None, chunk_size=2000):
+        self.n_workers = n_workers if n_workers is not None else os.cpu_count()
+        self.chunk_size = chunk_size
+        self.executor = None
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.n_workers)
+        return self.executor
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def replay(self, rows):  # summary of the replay of every hand in the rows, with the diffs
+        hands = group_hands(rows)
+        chunks = [hands[i:i + self.chunk_size] for i in range(0, len(hands), self.chunk_size)]
+        if self.n_workers > 1 and len(chunks) > 1:
+            results = [diffs for chunk in self.get_executor().map(_replay_chunk, chunks) for diffs in chunk]
+        else:
+            results = [diffs for chunk in chunks for diffs in _replay_chunk(chunk)]
+        return {'HANDS': len(hands),
+                'SKIPPED': sum(diffs is None for diffs in results),
+                'MATCHED': sum(diffs == [] for diffs in results),
+                'MISMATCHED': sum(bool(diffs) for diffs in results),
+                'DIFFS': [diff for diffs in results if diffs for diff in diffs]}
+
+    def replay_files(self, paths):  # files in the order they were written, see hand_store.file_order
+        rows = []
+        for path in sorted(paths, key=file_order):
+            for row in read_history_file(path):
+                if row.get('table') in (None, ''):  # old records: the file is the table, as in HandStore
+                    row['table'] = os.path.basename(path)
+                rows.append(row)
+        return self.replay(rows)
+
+
+# %%
+if __name__ == '__main__':  # python replay.py files ..., the diffs go to replay_diffs.json
+    replayer = HandReplayer()
+    summary = replayer.replay_files(sys.argv[1:])
+    replayer.close()
+    print(f"Hands: {summary['HANDS']} | Matched: {summary['MATCHED']} | Mismatched: {summary['MISMATCHED']} | "
+          f"Skipped: {summary['SKIPPED']}")
+    with open('replay_diffs.json', 'w') as file:
+        json.dump(summary['DIFFS'], file, indent=1, default=str)
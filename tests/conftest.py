@@ -0,0 +1,5 @@
+# %% the modules of the repository are top level scripts, import them from the repository folder
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
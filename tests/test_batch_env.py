@@ -0,0 +1,84 @@
+# %% import libraries
+import numpy as np
+import pytest
+from batch_env import ALL_IN, CHECK_CALL, FOLD, RAISE, BatchGameEnv
+from replay import ReplayDeckPool, ScriptedPolicy
+from texas_holdem import GameEnv, Player
+
+
+# %% helpers
+def game_env_rewards(order, moves, initial_points):  # chips won or lost by each seat when GameEnv plays the hand
+    players = [Player(f'P{seat}', None, policy=ScriptedPolicy(seat_moves)) for seat, seat_moves in enumerate(moves)]
+    env = GameEnv(players, headless=True)
+    env.deck_pool = ReplayDeckPool(order)
+    env.initial_points(initial_points)
+    env.play_hand()
+    return [player.points - initial_points for player in sorted(players, key=lambda player: player.name)]
+
+
+def game_env_move(action, to_call, raise_amount):
+    if action == FOLD:
+        return 'fold', 0
+    if action == CHECK_CALL:
+        return ('check' if to_call == 0 else 'call'), 0
+    return ('raising', raise_amount) if action == RAISE else ('all_in', 0)
+
+
+# %% tests
+@pytest.mark.parametrize('n_player, initial_points', [(2, 30), (4, 40), (6, 12)])
+def test_hands_match_game_env(n_player, initial_points):
+    env = BatchGameEnv(n_tables=64, n_player=n_player, initial_points=initial_points, seed=n_player)
+    observation = env.reset()
+    rng = np.random.default_rng(0)
+    decks = env.deck.copy()
+    moves = [[[] for seat in range(n_player)] for table in range(env.n_tables)]
+    n_checked = 0
+    for step in range(400):
+        actions = rng.choice(4, size=env.n_tables, p=[0.15, 0.55, 0.2, 0.1])
+        raise_amounts = rng.integers(1, 9, size=env.n_tables)  # some below the minimum raise
+        for table, action in enumerate(actions):
+            seat = observation['TO_ACT'][table]
+            to_call = observation['CURRENT_BET'][table] - observation['STREET_COMMITED'][table, seat]
+            moves[table][seat].append(game_env_move(action, to_call, raise_amounts[table]))
+        observation, rewards, done, info = env.step(actions, raise_amounts)
+        for table in np.flatnonzero(done):
+            assert rewards[table].sum() == 0
+            assert rewards[table].tolist() == game_env_rewards(decks[table].tolist(), moves[table], initial_points)
+            decks[table] = env.deck[table]
+            moves[table] = [[] for seat in range(n_player)]
+            n_checked += 1
+    assert n_checked > 200
+
+
+def test_observation_shows_the_board_of_the_street():
+    env = BatchGameEnv(n_tables=3, n_player=3, seed=0)
+    observation = env.reset()
+    assert (observation['BOARD'] == -1).all() and (observation['TO_ACT'] == 2).all()
+    assert observation['STREET_COMMITED'][0].tolist() == [1, 2, 0]
+    for action in range(2):  # the button and the small blind call, the big blind has matched the bet already
+        observation, rewards, done, info = env.step(np.full(3, CHECK_CALL))
+    assert (observation['STREET'] == 1).all() and (observation['TO_ACT'] == 0).all()
+    assert (observation['BOARD'][:, :3] >= 0).all() and (observation['BOARD'][:, 3:] == -1).all()
+    assert observation['HOLE'].tolist() == env.deck[:, :2].tolist()  # the small blind acts first after the flop
+
+
+def test_a_fold_to_one_player_ends_the_hand_and_deals_a_new_one():
+    env = BatchGameEnv(n_tables=2, n_player=2, seed=1)
+    env.reset()
+    observation, rewards, done, info = env.step(np.array([FOLD, ALL_IN]))
+    assert done.tolist() == [True, False]
+    assert rewards[0].tolist() == [-1, 1]
+    assert observation['STACKS'][0].tolist() == [999, 998]  # the blinds of the new hand
+
+
+def test_a_raise_is_at_least_the_last_raise_of_the_street():
+    env = BatchGameEnv(n_tables=1, n_player=3, seed=2)
+    env.reset()
+    observation, rewards, done, info = env.step([RAISE], [10])  # the button raises the big blind by 10
+    assert (observation['CURRENT_BET'][0], observation['MIN_RAISE'][0]) == (12, 10)
+    observation, rewards, done, info = env.step([RAISE], [2])  # the small blind can not raise by less
+    assert observation['STREET_COMMITED'][0].tolist() == [22, 2, 12]
+    assert (observation['CURRENT_BET'][0], observation['MIN_RAISE'][0]) == (22, 10)
+    for action in range(2):
+        observation, rewards, done, info = env.step([CHECK_CALL])
+    assert observation['STREET'][0] == 1 and observation['MIN_RAISE'][0] == 2  # a new street starts over
@@ -0,0 +1,58 @@
+# %% import libraries
+import json
+import os
+import subprocess
+import sys
+import benchmark
+from benchmark import compare, run_benchmarks, timed
+
+
+# %% helpers
+def results_of(rates):
+    return {'META': {}, 'RESULTS': {key: {'RATE': rate, 'UNIT': 'hands/s', 'COUNT': 1, 'SECONDS': 1 / rate}
+                                    for key, rate in rates.items()}}
+
+
+# %% tests
+def test_timed_keeps_the_best_time_and_the_first_result():
+    calls = []
+    seconds, result = timed(lambda: calls.append(len(calls)) or len(calls), 3)
+    assert (result, len(calls)) == (1, 3)
+    assert seconds >= 0
+
+
+def test_compare_reports_only_slowdowns_beyond_the_tolerance(capsys):
+    baseline = results_of({'evaluator': 1000, 'deck': 1000, 'server': 1000, 'removed': 1000})
+    results = results_of({'evaluator': 850, 'deck': 700, 'server': 2000, 'added': 1})
+    assert compare(results, baseline, 0.2) == [('deck', 0.7)]
+    assert '***** WARNING: deck is 30% slower than the baseline. *****' in capsys.readouterr().out
+    assert compare(results, baseline, 0.1) == [('evaluator', 0.85), ('deck', 0.7)]
+
+
+def test_run_benchmarks_records_rates_and_the_environment(monkeypatch):
+    monkeypatch.setitem(benchmark.BENCHMARKS, 'fake', lambda seed, scale, repeat: {
+        'fake_hands': (100 * scale, 0.5, 'hands/s')})
+    results = run_benchmarks(['fake', 'deck'], seed=1, scale=1, repeat=1)
+    assert results['RESULTS']['fake_hands'] == {'RATE': 200, 'UNIT': 'hands/s', 'COUNT': 100, 'SECONDS': 0.5}
+    assert sorted(results['RESULTS']) == ['deck_pool_and_deal', 'deck_shuffle_and_deal', 'fake_hands']
+    assert {'COMMIT', 'PYTHON', 'NUMPY', 'CPUS'} <= set(results['META'])
+    assert (results['META']['SEED'], results['META']['SCALE'], results['META']['REPEAT']) == (1, 1, 1)
+    assert compare(json.loads(json.dumps(results)), results, 0) == []  # the saved file is a valid baseline
+
+
+def test_server_benchmark_opens_no_history_or_statistics(monkeypatch, tmp_path):
+    import ServerClient
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ServerClient, 'HandHistoryWriter', None)  # would fail if a table server opened one
+    monkeypatch.setattr(ServerClient, 'StatsAggregator', None)
+    results = benchmark.bench_server(seed=0, scale=1, repeat=1, n_bots=4, table_size=2)
+    assert results['server_end_to_end_4_bots'][0] > 0
+    assert not list(tmp_path.iterdir())
+
+
+def test_unknown_benchmark_names_are_rejected(tmp_path):
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmark.py')
+    process = subprocess.run([sys.executable, script, 'deck', 'nope'], capture_output=True, text=True, cwd=tmp_path)
+    assert process.returncode == 2
+    assert "unknown benchmarks ['nope']" in process.stderr
+    assert not list(tmp_path.iterdir())
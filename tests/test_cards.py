@@ -0,0 +1,57 @@
+# %% import libraries
+import pickle
+import numpy as np
+import pytest
+from texas_holdem import CARD_CODES, CARD_TABLE, Card, Deck, DeckPool, Player
+
+
+# %% decks
+def test_shuffled_orders_are_seeded_permutations():
+    orders = Deck.shuffled_orders(500, seed=3, n_pack=2)
+    assert orders.shape == (500, 104)
+    assert (np.sort(orders, axis=1) == np.repeat(np.arange(52), 2)).all()
+    assert (orders == Deck.shuffled_orders(500, seed=3, n_pack=2)).all()
+    assert not (orders == Deck.shuffled_orders(500, seed=4, n_pack=2)).all()
+
+
+def test_draw_card_follows_the_order():
+    order = Deck.shuffled_orders(1, seed=0)[0].tolist()
+    deck = Deck(1, order)
+    assert [deck.draw_card() for card in range(5)] == [CARD_TABLE[code] for code in order[:5]]
+    assert deck.cards == [CARD_TABLE[code] for code in order[5:]]
+    deck.shuffle()
+    assert len(deck.cards) == 52 and sorted(deck.order) == list(range(52))
+
+
+def test_deck_pool_is_seeded_and_refills():
+    first, second = DeckPool(size=4, seed=9), DeckPool(size=4, seed=9)
+    decks = [first.next_deck().order for deck in range(10)]  # two refills
+    assert decks == [second.next_deck().order for deck in range(10)]
+    assert all(sorted(order) == list(range(52)) for order in decks)
+    assert len({tuple(order) for order in decks}) == 10  # a refill continues the random stream
+    assert decks[:4] == Deck.shuffled_orders(4, np.random.default_rng(9)).tolist()
+
+
+# %% cards and players
+def test_cards_are_interned():
+    card = Card('A', 'H')
+    assert card is CARD_TABLE[CARD_CODES['AH']] is Card('A', 'H')
+    assert pickle.loads(pickle.dumps(card)) is card
+    assert pickle.loads(pickle.dumps(list(CARD_TABLE))) == list(CARD_TABLE)
+    assert (card.rank, card.suit, card.val, str(card)) == ('A', 'H', 14, 'AH')
+    with pytest.raises(AttributeError):
+        card.owner = 'P0'  # no instance dictionary
+
+
+def test_cards_order_and_hash_by_code():
+    assert [card.code for card in CARD_TABLE] == list(range(52))
+    assert sorted(reversed(CARD_TABLE)) == list(CARD_TABLE)
+    assert {Card('10', 'S'): 1}[CARD_TABLE[CARD_CODES['10S']]] == 1
+    assert Card('2', 'C') != '2C'
+
+
+def test_players_have_no_instance_dictionary():
+    player = Player('P0', None, points=100)
+    assert not hasattr(player, '__dict__')
+    with pytest.raises(AttributeError):
+        player.nickname = 'bob'
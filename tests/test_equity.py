@@ -0,0 +1,107 @@
+# %% import libraries
+from itertools import combinations
+import numpy as np
+import pytest
+from equity import (COMBO_INDEX, PREFLOP_CLASSES, EquityCalculator, PreflopTable, build_preflop_table,
+                    preflop_class_index)
+from texas_holdem import Comparator
+
+
+# %% Monte Carlo
+def test_monte_carlo_is_reproducible_and_independent_of_the_workers():
+    hands = [['AH', 'AS'], ['KD', 'KC'], None]
+    single = EquityCalculator(n_samples=30000, seed=7, n_workers=1, chunk_size=10000)
+    pooled = EquityCalculator(n_samples=30000, seed=7, n_workers=2, chunk_size=10000)
+    try:
+        assert single.monte_carlo(hands) == single.monte_carlo(hands) == pooled.monte_carlo(hands)
+    finally:
+        pooled.close()
+
+
+def test_monte_carlo_equities_add_up_and_match_known_values():
+    calculator = EquityCalculator(n_samples=40000, seed=1, n_workers=1)
+    results = calculator.monte_carlo([['AH', 'AS'], ['KD', 'KC']])
+    assert results[0]['EQUITY'] == pytest.approx(0.82, abs=0.01)
+    assert sum(result['EQUITY'] for result in results) == pytest.approx(1)
+    assert results[0]['WIN'] + results[1]['WIN'] + results[0]['TIE'] == pytest.approx(1)
+    assert results[0]['TIE'] == results[1]['TIE']
+
+
+def test_known_board_cards_are_used():
+    calculator = EquityCalculator(n_samples=2000, seed=0, n_workers=1)
+    results = calculator.monte_carlo([['AH', 'AS'], ['KD', 'KC']], board=['KH', 'KS', '2C', '3D', '4H'])
+    assert [result['WIN'] for result in results] == [0.0, 1.0]
+
+
+@pytest.mark.parametrize('hands, board', [([['AH', 'AS'], ['AH', 'KC']], None), ([['AH', 'AS']], ['AS']),
+                                          ([['AH']], None), ([['AH', 'AS']], ['2C', '3C', '4C', '5C', '6C', '7C'])])
+def test_impossible_deals_are_rejected(hands, board):
+    with pytest.raises(ValueError):
+        EquityCalculator(n_workers=1).monte_carlo(hands, board)
+
+
+# %% exact enumeration
+def brute_force_equity(hands, board):  # every runout scored with evaluate_codes
+    known = [code for cards in hands + [board] for code in Comparator.encode_cards(cards)]
+    remaining = [code for code in range(52) if code not in known]
+    shares = [0.0] * len(hands)
+    runouts = list(combinations(remaining, 5 - len(board)))
+    for runout in runouts:
+        scores = [Comparator.evaluate_codes(Comparator.encode_cards(hand + board) + list(runout)) for hand in hands]
+        winners = [index for index, score in enumerate(scores) if score == max(scores)]
+        for index in winners:
+            shares[index] += 1 / len(winners)
+    return [share / len(runouts) for share in shares]
+
+
+@pytest.mark.parametrize('hands, board', [
+    ([['AH', 'KH'], ['QC', 'QD']], ['2H', '7H', 'QS', '3C']),
+    ([['AH', 'KH'], ['QC', 'QD'], ['5S', '6S']], ['2H', '7H', 'QS']),
+    ([['AC', '2D'], ['AD', '2C']], ['KS', 'QS', 'JH']),  # mostly split pots
+])
+def test_exact_matches_brute_force(hands, board):
+    results = EquityCalculator(n_workers=1).exact(hands, board)
+    assert [result['EQUITY'] for result in results] == pytest.approx(brute_force_equity(hands, board))
+    assert sum(result['WIN'] + result['TIE'] for result in results) >= 1 - 1e-9
+
+
+def test_calculate_enumerates_small_runouts_and_samples_the_others():
+    calculator = EquityCalculator(n_samples=20000, seed=3, n_workers=1, max_runouts=2000)
+    hands = [['AH', 'KH'], ['QC', 'QD']]
+    flop = ['2H', '7H', 'QS']
+    assert calculator.calculate(hands, flop) == calculator.exact(hands, flop)  # 990 runouts
+    sampled = calculator.calculate(hands)  # 1.7 million runouts preflop
+    assert sampled == calculator.monte_carlo(hands)
+    assert sampled[0]['EQUITY'] == pytest.approx(0.46, abs=0.02)
+    assert calculator.calculate([['AH', 'KH'], None], flop) == calculator.monte_carlo([['AH', 'KH'], None], flop)
+
+
+def test_exact_needs_every_hand():
+    with pytest.raises(ValueError):
+        EquityCalculator(n_workers=1).exact([['AH', 'KH'], None], ['2H', '7H', 'QS'])
+
+
+# %% preflop classes and table
+def test_preflop_classes_cover_every_combo():
+    counts = [0] * 169
+    for combo in COMBO_INDEX:
+        counts[preflop_class_index(combo)] += 1
+    names = dict(zip(PREFLOP_CLASSES, counts))
+    assert len(names) == 169
+    assert (names['AA'], names['AKs'], names['AKo'], names['109o'], names['32o']) == (6, 4, 12, 12, 12)
+    assert sum(counts) == 1326
+    assert PREFLOP_CLASSES.index('AA') == 0 and PREFLOP_CLASSES.index('22') == 168
+
+
+def test_preflop_table_is_consistent_and_shared_read_only(tmp_path):
+    path = build_preflop_table(str(tmp_path / 'preflop.npy'), n_samples=40, seed=0, n_workers=2)
+    table = PreflopTable(path)
+    matrix = np.asarray(table.matrix, dtype=np.float64)
+    assert matrix.shape == (169, 169) and not table.full
+    assert np.allclose(matrix + matrix.T, 1)
+    assert np.all(np.diag(matrix) == 0.5)
+    assert table.equity(['AH', 'AS'], ['7C', '2D']) > 0.6
+    assert table.equity(['KD', 'AD'], ['AC', 'KC']) == 0.5  # the same class, whatever the suits
+    assert table.equity(['7C', '2D'], ['AH', 'AS']) == pytest.approx(1 - table.equity(['AH', 'AS'], ['7C', '2D']))
+    with pytest.raises(ValueError):
+        table.matrix[0, 0] = 0
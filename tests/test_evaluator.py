@@ -0,0 +1,134 @@
+# %% import libraries
+import random
+from itertools import combinations
+import numpy as np
+import pytest
+from texas_holdem import CARD_CODES, CARD_NAMES, Card, Comparator
+
+
+# %% helpers
+def brute_force_rating(names):  # best check_hand rating over every 5 card combination
+    comparator = Comparator()
+    return max(comparator.check_hand(list(hand)) for hand in combinations(names, 5))
+
+
+def make_cards(names):
+    return [Card(name[:-1], name[-1]) for name in names]
+
+
+def random_names(n_cards, seed):
+    return [CARD_NAMES[code] for code in random.Random(seed).sample(range(52), n_cards)]
+
+
+def random_codes(n_hands, n_cards, seed):  # (n_hands, n_cards) array of card codes without repeats in a row
+    return np.random.default_rng(seed).permuted(np.tile(np.arange(52), (n_hands, 1)), axis=1)[:, :n_cards]
+
+
+# %% tests
+@pytest.mark.parametrize('names, rating', [
+    (['AH', 'KH', 'QH', 'JH', '10H', '2C', '3D'], [10]),
+    (['5S', '4S', '3S', '2S', 'AS', 'KD', 'KC'], [9, 3]),  # the wheel straight flush
+    (['9C', '9D', '9H', '9S', '2C', 'KD', 'KC'], [8, 9, 13]),
+    (['9C', '9D', '9H', 'KS', 'KD', '2C', '2D'], [7, 9, 13]),
+    (['9C', '9D', '9H', 'KS', 'KD', 'KC', '2D'], [7, 13, 9]),  # two threes of a kind
+    (['2H', '7H', '9H', 'JH', 'KH', 'AH', 'AS'], [6, 14, 13, 11, 9, 7]),
+    (['AC', '2D', '3H', '4S', '5C', 'KD', 'QC'], [5, 3]),
+    (['6C', '7D', '8H', '9S', '10C', 'JD', '2C'], [5, 9]),
+    (['7C', '7D', '7H', 'AS', '10C', '4D', '2C'], [4, 7, 14, 10]),
+    (['7C', '7D', '4H', '4S', '2C', '2D', 'AC'], [3, 7, 4, 14]),  # three pairs, the best two count
+    (['7C', '7D', 'KH', '9S', '4C', '3D', '2C'], [2, 7, 13, 9, 4]),
+    (['AC', 'JD', '9H', '7S', '5C', '3D', '2C'], [1, 14, 11, 9, 7, 5]),
+])
+def test_known_hands(names, rating):
+    comparator = Comparator()
+    assert comparator.score_to_rating(comparator.evaluate(names)) == rating
+    assert comparator.find_best_hand(make_cards(names)) == rating
+
+
+def test_two_pairs_keep_the_kicker_of_the_best_combination():
+    # the former combination loop mixed the ratings of two combinations here and returned [3, 5, 2, 4]
+    assert Comparator().find_best_hand(make_cards(['4S', '2H', '2D', '5H', '4D', '5S', '3D'])) == [3, 5, 4, 3]
+
+
+@pytest.mark.parametrize('n_cards', [5, 6, 7])
+def test_scores_match_the_brute_force_ratings(n_cards):
+    comparator = Comparator()
+    for seed in range(400):
+        names = random_names(n_cards, seed)
+        assert comparator.score_to_rating(comparator.evaluate(names)) == brute_force_rating(names)
+
+
+def test_scores_order_hands_like_their_ratings():
+    comparator = Comparator()
+    hands = [random_names(7, seed) for seed in range(300)]
+    scores = [comparator.evaluate(names) for names in hands]
+    ratings = [brute_force_rating(names) for names in hands]
+    for i in range(0, len(hands), 2):
+        assert (scores[i] > scores[i + 1]) == (ratings[i] > ratings[i + 1])
+        assert (scores[i] == scores[i + 1]) == (ratings[i] == ratings[i + 1])
+
+
+def test_cards_strings_and_codes_give_the_same_score():
+    names = random_names(7, 0)
+    codes = [CARD_CODES[name] for name in names]
+    assert Comparator.encode_cards(names) == codes
+    assert Comparator.encode_cards(make_cards(names)) == codes
+    assert Comparator().evaluate(names) == Comparator.evaluate_codes(codes)
+
+
+# %% batch evaluation
+@pytest.mark.parametrize('n_cards', [5, 6, 7])
+def test_batch_scores_match_the_single_hand_scores(n_cards):
+    codes = random_codes(3000, n_cards, seed=n_cards)
+    scores = Comparator.evaluate_batch(codes)
+    assert scores.shape == (3000,)
+    assert scores.tolist() == [Comparator.evaluate_codes(hand) for hand in codes.tolist()]
+
+
+def test_batch_covers_every_category():
+    hands = [['AH', 'KH', 'QH', 'JH', '10H', '2C', '3D'], ['5S', '4S', '3S', '2S', 'AS', 'KD', 'KC'],
+             ['9C', '9D', '9H', '9S', '2C', 'KD', 'KC'], ['9C', '9D', '9H', 'KS', 'KD', 'KC', '2D'],
+             ['2H', '7H', '9H', 'JH', 'KH', 'AH', 'AS'], ['AC', '2D', '3H', '4S', '5C', 'KD', 'QC'],
+             ['7C', '7D', '7H', 'AS', '10C', '4D', '2C'], ['7C', '7D', '4H', '4S', '2C', '2D', 'AC'],
+             ['7C', '7D', 'KH', '9S', '4C', '3D', '2C'], ['AC', 'JD', '9H', '7S', '5C', '3D', '2C']]
+    codes = [Comparator.encode_cards(names) for names in hands]
+    scores = Comparator.evaluate_batch(codes)
+    assert (scores >> 20).tolist() == [10, 9, 8, 7, 6, 5, 4, 3, 2, 1]
+    assert scores.tolist() == [Comparator.evaluate_codes(hand) for hand in codes]
+
+
+@pytest.mark.parametrize('shape', [(4,), (3, 4), (3, 8), (2, 7, 1)])
+def test_batch_rejects_other_shapes(shape):
+    with pytest.raises(ValueError):
+        Comparator.evaluate_batch(np.zeros(shape, dtype=np.int64))
+
+
+# %% showdown ranking
+def test_rank_showdown_groups_ties_best_first():
+    board = ['2C', '7D', '9H', 'JS', 'KD']
+    hands = [board + ['AH', '3C'], board + ['KC', '4D'], board + ['AS', '3D'], board + ['5H', '6S'],
+             board + ['KS', '4H']]
+    groups, scores = Comparator().rank_showdown(hands)
+    assert groups == [[1, 4], [0, 2], [3]]  # pairs of kings share the pot, then ace high, then the board
+    assert scores == [Comparator.evaluate_codes(Comparator.encode_cards(hand)) for hand in hands]
+
+
+def test_rank_showdown_agrees_with_pairwise_comparison():
+    comparator = Comparator()
+    for seed in range(100):
+        codes = random.Random(seed).sample(range(52), 5 + 2 * 6)
+        names = [CARD_NAMES[code] for code in codes]
+        hands = [make_cards(names[:5] + names[5 + 2 * p:7 + 2 * p]) for p in range(6)]
+        groups, scores = comparator.rank_showdown(hands)
+        assert sorted(index for group in groups for index in group) == list(range(6))
+        ranks = {index: rank for rank, group in enumerate(groups) for index in group}
+        ratings = [comparator.find_best_hand(hand) for hand in hands]
+        for i in range(6):
+            for j in range(6):
+                assert (ranks[i] < ranks[j]) == (ratings[i] > ratings[j])
+
+
+def test_rank_cards_list_counts_the_hands_beaten():
+    board = ['2C', '7D', '9H', 'JS', 'KD']
+    hands = [board + ['AH', '3C'], board + ['KC', '4D'], board + ['AS', '3D']]
+    assert Comparator().rank_cards_list(hands) == [(str(hands[1]), 2), (str(hands[0]), 0), (str(hands[2]), 0)]
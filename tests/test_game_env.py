@@ -0,0 +1,92 @@
+# %% import libraries
+import pytest
+from replay import ListRecorder, group_hands, replay_hand
+from texas_holdem import BettingState, CallPolicy, GameEnv, Player, RandomPolicy
+
+
+# %% helpers
+class FoldPolicy:
+    def act(self, player, board, current_round_commited):
+        return 'fold', 0
+
+
+def headless_env(policies, points=100, seed=0):
+    players = [Player(f'P{index}', None, policy=policy) for index, policy in enumerate(policies)]
+    env = GameEnv(players, headless=True, seed=seed, recorder=ListRecorder(), table_id=1)
+    env.initial_points(points)
+    return env, players
+
+
+# %% tests
+def test_streets_stop_once_every_other_player_folded():
+    env, players = headless_env([FoldPolicy(), CallPolicy()])
+    env.play_hand()
+    assert env.board == []  # the small blind folded, no flop is dealt
+    assert [row['move'] for row in env.recorder.rows] == ['seat', 'seat', 'fold', 'uncontested']
+
+    env, players = headless_env([FoldPolicy(), FoldPolicy(), CallPolicy()])
+    env.play_hand()
+    assert len(env.board) == 3  # the big blind had matched the bet and folds on the flop, no turn is dealt
+    moves = [(row['player'], row['move'], row['round']) for row in env.recorder.rows if row['move'] != 'seat']
+    assert moves == [('P2', 'call', 0), ('P0', 'fold', 0), ('P1', 'fold', 1), ('P2', 'uncontested', 4)]
+    assert {player.name: player.points for player in players} == {'P0': 99, 'P1': 98, 'P2': 103}
+
+
+def test_betting_state_has_nobody_to_act_once_the_hand_is_over():
+    players = [Player(f'P{index}', None, points=100) for index in range(3)]
+    betting = BettingState(players, big_blind_points=2)
+    betting.start_street(0)
+    assert betting.pending == [2, 0]  # the big blind has matched the bet already
+    betting.step('fold')
+    betting.step('fold')
+    assert betting.hand_over and betting.to_act is None
+    betting.start_street(1)
+    assert betting.to_act is None
+
+
+def test_called_down_hands_deal_the_whole_board():
+    env, players = headless_env([CallPolicy(), CallPolicy()])
+    env.play_hand()
+    assert len(env.board) == 5
+    assert sum(player.points for player in players) == 200
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_recorded_hands_replay_without_differences(seed):
+    env, players = headless_env([RandomPolicy(seed=seed + index) for index in range(4)], seed=seed)
+    for hand in range(30):
+        for player in players:
+            if player.points < 10:
+                player.points = 100
+        env.play_hand()
+    hands = group_hands(env.recorder.rows)
+    assert len(hands) == 30
+    assert all(replay_hand(rows) == [] for rows in hands)
+
+
+def test_table_players_do_not_print_client_messages(capsys):
+    players = [Player(f'P{index}', None) for index in range(2)]
+    GameEnv(players)
+    players[0].points = 10
+    players[0].calling(2)
+    players[0].folding()
+    assert capsys.readouterr().out == ''
+
+
+def test_headless_tables_are_silent_reproducible_and_keep_the_chips(capsys):
+    def play(seed):
+        env, players = headless_env([RandomPolicy(seed=seed + index) for index in range(6)], points=50, seed=seed)
+        for hand in range(200):
+            for player in players:
+                if player.points < 5:
+                    player.points = 50
+            chips = sum(player.points for player in players)
+            env.play_hand()
+            assert sum(player.points for player in players) == chips
+        return [{key: value for key, value in row.items() if key != 'time'} for row in env.recorder.rows]
+
+    rows = play(11)
+    assert rows == play(11)
+    assert rows != play(12)
+    assert capsys.readouterr().out == ''
+    assert {row['move'] for row in rows} >= {'fold', 'check', 'call', 'raising', 'all_in', 'showdown'}
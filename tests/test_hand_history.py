@@ -0,0 +1,78 @@
+# %% import libraries
+import csv
+import time
+import pytest
+from hand_history import HISTORY_COLUMNS, HandHistoryWriter, pa, pq
+
+
+# %% helpers
+def make_row(index):
+    return {'player': f'P{index % 3}', 'hand': '[AS, KD]', 'board': '[]', 'move': 'call', 'amount': 0,
+            'past_bet': 0, 'current_bet': 2, 'in_game': True, 'best_hand': 'Initial Hand', 'table': '1',
+            'hand_id': index // 4 + 1, 'round': 0, 'time': 1.0 + index}
+
+
+def read_csv_rows(paths):
+    return [row for path in paths for row in csv.DictReader(open(path, newline=''))]
+
+
+def read_columnar_rows(paths, file_format):
+    tables = [pq.read_table(path) if file_format == 'parquet' else pa.ipc.open_file(path).read_all() for path in paths]
+    return [row for table in tables for row in table.to_pylist()]
+
+
+# %% tests
+def test_rows_stay_buffered_until_the_buffer_is_full(tmp_path):
+    writer = HandHistoryWriter(tmp_path, buffer_rows=10, flush_seconds=3600)
+    for index in range(9):
+        writer.write(make_row(index))
+    assert writer.paths == []
+    writer.write(make_row(9))
+    assert len(read_csv_rows(writer.paths)) == 10
+    writer.close()
+
+
+def test_timer_flushes_a_table_that_went_quiet(tmp_path):
+    writer = HandHistoryWriter(tmp_path, buffer_rows=4096, flush_seconds=0.1)
+    writer.write(make_row(0))
+    writer.write(make_row(1))
+    deadline = time.monotonic() + 5
+    while not writer.paths and time.monotonic() < deadline:  # no other write comes to trigger the flush
+        time.sleep(0.02)
+    assert [row['player'] for row in read_csv_rows(writer.paths)] == ['P0', 'P1']
+    writer.close()
+    assert not writer.flusher.is_alive()
+
+
+def test_close_writes_every_buffered_row(tmp_path):
+    writer = HandHistoryWriter(tmp_path, buffer_rows=4096, flush_seconds=3600)
+    for index in range(25):
+        writer.write(make_row(index))
+    writer.close()
+    rows = read_csv_rows(writer.paths)
+    assert len(rows) == 25
+    assert list(rows[0]) == HISTORY_COLUMNS
+
+
+def test_files_rotate_by_size_without_losing_rows(tmp_path):
+    writer = HandHistoryWriter(tmp_path, buffer_rows=5, flush_seconds=3600, max_bytes=200)
+    for index in range(40):
+        writer.write(make_row(index))
+    writer.close()
+    assert len(writer.paths) > 1
+    assert [int(row['hand_id']) for row in read_csv_rows(writer.paths)] == [index // 4 + 1 for index in range(40)]
+
+
+@pytest.mark.skipif(pa is None, reason='pyarrow is not installed')
+@pytest.mark.parametrize('file_format', ['parquet', 'arrow'])
+def test_columnar_formats_round_trip(tmp_path, file_format):
+    writer = HandHistoryWriter(tmp_path, file_format=file_format, buffer_rows=7, flush_seconds=3600)
+    for index in range(20):
+        writer.write(make_row(index))
+    writer.close()
+    assert read_columnar_rows(writer.paths, file_format) == [make_row(index) for index in range(20)]
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        HandHistoryWriter(tmp_path, file_format='xlsx')
@@ -0,0 +1,114 @@
+# %% import libraries
+import csv
+import os
+import random
+import pytest
+from hand_history import HISTORY_COLUMNS, HandHistoryWriter
+from hand_store import HandStore, file_order, parse_bool
+from replay import ListRecorder
+from texas_holdem import GameEnv, Player, RandomPolicy
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEGACY_FILE = os.path.join(REPO, 'poker_record_1575758155.csv')
+
+
+# %% helpers
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=HISTORY_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def played_rows(n_hands, seed=0):  # hand history rows of a headless table
+    players = [Player(f'P{index}', None, policy=RandomPolicy(seed=seed + index)) for index in range(3)]
+    env = GameEnv(players, headless=True, seed=seed, recorder=ListRecorder(), table_id='T')
+    env.initial_points(100)
+    for hand in range(n_hands):
+        for player in players:
+            if player.points < 10:
+                player.points = 100
+        env.play_hand()
+    return env.recorder.rows
+
+
+# %% tests
+@pytest.mark.parametrize('value, expected', [(True, True), ('True', True), ('TRUE', True), (' true ', True),
+                                             ('1', True), (1, True), (False, False), ('False', False),
+                                             ('FALSE', False), ('0', False), ('', False)])
+def test_in_game_is_parsed_in_any_case(value, expected):
+    assert parse_bool(value) is expected
+
+
+def test_legacy_files_keep_their_upper_case_in_game(tmp_path):
+    with open(LEGACY_FILE, newline='') as file:
+        flags = [row['in_game'] for row in csv.DictReader(file)]
+    assert {'TRUE', 'FALSE'} <= set(flags)
+    store = HandStore(str(tmp_path / 'store.db'))
+    assert store.ingest([LEGACY_FILE]) == len(flags)
+    assert [row['in_game'] for row in store.actions()] == [flag == 'TRUE' for flag in flags]
+    assert store.ingest([LEGACY_FILE]) == 0  # a file is only ingested once
+    store.close()
+
+
+def test_rotated_files_sort_by_timestamp_then_rotation_number(tmp_path):
+    names = ['poker_record_1700000001.csv', 'poker_record_1700000000_10.csv', 'poker_record_1700000000_2.csv',
+             'poker_record_1700000000.csv', 'poker_record_1700000000_11.csv', 'poker_record_1700000000_1.csv']
+    paths = [str(tmp_path / name) for name in names]
+    assert [os.path.basename(path) for path in sorted(paths, key=file_order)] == [
+        'poker_record_1700000000.csv', 'poker_record_1700000000_1.csv', 'poker_record_1700000000_2.csv',
+        'poker_record_1700000000_10.csv', 'poker_record_1700000000_11.csv', 'poker_record_1700000001.csv']
+
+
+def test_ingest_follows_the_rotation_order(tmp_path):
+    rows = played_rows(12)
+    random.seed(0)
+    chunks = [rows[start:start + 7] for start in range(0, len(rows), 7)]
+    paths = []
+    for index, chunk in enumerate(chunks):
+        name = 'poker_record_1700000000' + (f'_{index}' if index else '')
+        paths.append(str(tmp_path / f'{name}.csv'))
+        write_csv(paths[-1], chunk)
+    assert len(paths) > 10
+    store = HandStore(str(tmp_path / 'store.db'))
+    store.ingest(random.sample(paths, len(paths)))
+    ingested = [path for (path,) in store.db.execute('SELECT path FROM files ORDER BY id')]
+    assert ingested == [os.path.abspath(path) for path in paths]
+    n_hands = store.db.execute('SELECT COUNT(DISTINCT hand_key) FROM actions').fetchone()[0]
+    assert n_hands == 12  # the hands split over two files are kept whole
+    store.close()
+
+
+def test_player_stats_count_hands_and_folds(tmp_path):
+    rows = played_rows(40, seed=3)
+    writer = HandHistoryWriter(tmp_path, buffer_rows=50, flush_seconds=3600)
+    for row in rows:
+        writer.write(row)
+    writer.close()
+    store = HandStore(str(tmp_path / 'store.db'))
+    store.ingest(writer.paths)
+    stats = {player_stats['PLAYER']: player_stats for player_stats in store.player_stats()}
+    assert sorted(stats) == ['P0', 'P1', 'P2']
+    assert all(player_stats['HANDS'] == 40 for player_stats in stats.values())
+    for name, player_stats in stats.items():
+        n_folded = len({row['hand_id'] for row in rows if row['player'] == name and row['move'] == 'fold'})
+        assert player_stats['FOLD_RATE'] == pytest.approx(n_folded / 40)
+    assert len(store.actions(player='P0', street=0)) == sum(
+        1 for row in rows if row['player'] == 'P0' and row['round'] == 0)
+    store.close()
+
+
+def test_an_all_in_that_only_calls_is_not_a_pre_flop_raise(tmp_path):
+    def row(player, move, current_bet, amount=0):
+        return {'player': player, 'hand': '[]', 'board': '[]', 'move': move, 'amount': amount, 'past_bet': 0,
+                'current_bet': current_bet, 'in_game': move != 'fold', 'best_hand': 'Initial Hand', 'table': 'T',
+                'hand_id': 1, 'round': 0, 'time': 1700000000}
+    rows = [row('P0', 'seat', 1, 5), row('P1', 'seat', 2, 100), row('P2', 'seat', 0, 100),
+            row('P2', 'raising', 6, 4), row('P0', 'time_bank', 30000, 900),  # milliseconds left in the bank
+            row('P0', 'all_in', 5), row('P1', 'all_in', 100)]  # the short stack calls, the big blind re-raises
+    write_csv(str(tmp_path / 'poker_record_1700000000.csv'), rows)
+    store = HandStore(str(tmp_path / 'store.db'))
+    store.ingest([str(tmp_path / 'poker_record_1700000000.csv')])
+    assert {stats['PLAYER']: stats['PFR'] for stats in store.player_stats()} == {'P0': 0, 'P1': 1, 'P2': 1}
+    assert store.player_stats(player='P0')[0]['VPIP'] == 1
+    store.close()
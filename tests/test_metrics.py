@@ -0,0 +1,90 @@
+# %% import libraries
+import json
+import socket
+import pytest
+from metrics import LATENCY_BUCKETS, Histogram, ServerMetrics, format_labels
+from protocol import recv_message
+from texas_holdem import GameEnv, Player
+
+
+# %% tests
+def test_histogram_buckets_are_cumulative_upper_bounds():
+    histogram = Histogram()
+    for value in (0.001, 0.005, 0.2, 100):
+        histogram.observe(value)
+    cumulative = dict(histogram.cumulative())
+    assert cumulative[0.005] == 2  # an observation on a bound counts in that bucket
+    assert cumulative[0.25] == 3 and cumulative[60] == 3 and cumulative[float('inf')] == 4
+    assert histogram.summary()['MEAN'] == pytest.approx((0.001 + 0.005 + 0.2 + 100) / 4)
+
+
+def test_histogram_summary_round_trips_and_merges():
+    first, second = Histogram(), Histogram()
+    for value in (0.01, 0.3, 7):
+        first.observe(value)
+    for value in (0.3, 90):
+        second.observe(value)
+    copy = Histogram.from_summary(json.loads(json.dumps(first.summary())))
+    assert (copy.counts, copy.count, copy.sum) == (first.counts, first.count, first.sum)
+    copy.merge(second)
+    assert copy.count == 5 and copy.sum == pytest.approx(97.61)
+    assert copy.counts == [a + b for a, b in zip(first.counts, second.counts)]
+    assert len(copy.counts) == len(LATENCY_BUCKETS) + 1
+
+
+def test_worker_snapshots_are_added_to_the_acceptor_metrics():
+    acceptor, worker = ServerMetrics(), ServerMetrics()
+    acceptor.table_started()
+    acceptor.observe('communication', 0.002)
+    acceptor.socket_error('name')
+    for seconds in (0.001, 0.003):
+        worker.observe('communication', seconds)
+    worker.observe_latency('bob', 0.5)
+    worker.socket_error('name')
+    worker.table_started()
+    worker.hand_played()
+    worker.hand_played()
+    acceptor.update_worker(0, worker.snapshot())
+    acceptor.update_worker(0, worker.snapshot())  # the latest snapshot replaces the previous one
+
+    snapshot = acceptor.snapshot()
+    assert snapshot['HANDS'] == 2 and snapshot['HANDS_PER_MINUTE'] == 2
+    assert snapshot['ACTIVE_TABLES'] == 1  # the acceptor counts the worker tables itself
+    assert snapshot['SOCKET_ERRORS'] == {'name': 2}
+    assert snapshot['TIMINGS']['communication']['COUNT'] == 3
+    assert snapshot['LATENCY']['bob']['COUNT'] == 1
+    text = acceptor.render()
+    assert 'poker_hands_total 2\n' in text
+    assert 'poker_section_seconds_count{section="communication"} 3\n' in text
+    assert 'poker_player_response_seconds_bucket{player="bob",le="0.5"} 1\n' in text
+
+
+def test_labels_are_escaped():
+    assert format_labels((('player', 'a"b\\c\nd'),)) == '{player="a\\"b\\\\c\\nd"}'
+    assert format_labels(()) == ''
+
+
+def test_save_writes_the_snapshot(tmp_path):
+    metrics = ServerMetrics(str(tmp_path / 'metrics.json'), dump_seconds=3600)
+    metrics.hand_played()
+    metrics.save()
+    with open(tmp_path / 'metrics.json') as file:
+        assert json.load(file)['HANDS'] == 1
+    assert not (tmp_path / 'metrics.json.tmp').exists()
+
+
+def test_game_env_times_sends_and_broadcasts_without_waiting_for_answers():
+    pairs = [socket.socketpair() for index in range(3)]
+    players = [Player(f'P{index}', server_end) for index, (server_end, client_end) in enumerate(pairs)]
+    metrics = ServerMetrics()
+    env = GameEnv(players, metrics=metrics)
+    env.verbose = False
+    env.send_update(players[0], 'sending_initial_points', 100)
+    env.broadcast('round_end_update')
+    timings = metrics.snapshot()['TIMINGS']
+    assert (timings['communication']['COUNT'], timings['broadcast']['COUNT']) == (1, 1)
+    assert recv_message(pairs[0][1]) == ('sending_initial_points', 100)
+    assert all(recv_message(client_end) == ('round_end_update', None) for server_end, client_end in pairs)
+    for server_end, client_end in pairs:
+        server_end.close()
+        client_end.close()
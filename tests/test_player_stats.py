@@ -0,0 +1,105 @@
+# %% import libraries
+import json
+from collections import Counter
+from hand_history import TIMER_MOVES
+from player_stats import StatsAggregator
+from replay import ListRecorder
+from texas_holdem import GameEnv, Player, RandomPolicy
+
+
+# %% tests
+def test_counters_follow_the_moves_of_each_hand():
+    stats = StatsAggregator()
+    stats.start_hand(['a', 'b'])
+    stats.record_move('a', 0, 'raising', False)
+    stats.record_move('b', 0, 'raising', True)
+    stats.record_move('a', 0, 'call', True)  # VPIP and PFR count once per hand
+    stats.record_move('a', 1, 'raising', False)
+    stats.record_move('b', 1, 'fold', True)
+    stats.start_hand(['a', 'b'])
+    stats.record_move('a', 0, 'fold', False)
+    stats.record_move('b', 0, 'call', False)
+    stats.record_result('b', showdown=False, won=True)  # no showdown, nothing counted
+    assert stats.summary('a') == {'HANDS': 2, 'VPIP': 0.5, 'PFR': 0.5, 'AGGRESSION_FACTOR': 2.0,
+                                  'FOLD_TO_RAISE': 0.0, 'SHOWDOWNS': 0, 'SHOWDOWN_WIN_RATE': None}
+    assert stats.summary('b') == {'HANDS': 2, 'VPIP': 1.0, 'PFR': 0.5, 'AGGRESSION_FACTOR': 1.0,
+                                  'FOLD_TO_RAISE': 0.5, 'SHOWDOWNS': 0, 'SHOWDOWN_WIN_RATE': None}
+    assert stats.summary('nobody')['VPIP'] is None
+
+
+def test_an_all_in_is_a_raise_only_when_it_goes_over_the_bet():
+    stats = StatsAggregator()
+    stats.start_hand(['a', 'b', 'c'])
+    stats.record_move('a', 0, 'raising', False)
+    stats.record_move('b', 0, 'all_in', True, raised=False)  # a short stack that can only call
+    stats.record_move('c', 0, 'all_in', True, raised=True)
+    assert stats.summary('b')['VPIP'] == 1.0 and stats.summary('b')['PFR'] == 0.0
+    assert (stats.players['b'].calls, stats.players['b'].bets_raises) == (1, 0)
+    assert stats.summary('c')['PFR'] == 1.0 and stats.players['c'].bets_raises == 1
+
+
+def test_snapshots_are_saved_when_due_and_loaded_back(tmp_path):
+    path = str(tmp_path / 'player_stats.json')
+    stats = StatsAggregator(path, snapshot_seconds=-1)  # every hand start is due
+    stats.start_hand(['a'])
+    stats.record_move('a', 0, 'all_in', False, raised=True)
+    stats.start_hand(['a'])
+    with open(path) as file:
+        assert json.load(file)['PLAYERS']['a']['pfr_hands'] == 1
+    stats.record_result('a', showdown=True, won=True)
+    stats.save()
+    loaded = StatsAggregator(path)
+    assert loaded.summary('a') == stats.summary('a')
+    assert loaded.summary('a')['SHOWDOWN_WIN_RATE'] == 1.0
+    assert not (tmp_path / 'player_stats.json.tmp').exists()
+
+
+def test_worker_counts_are_added_player_by_player(tmp_path):
+    worker = StatsAggregator()
+    worker.start_hand(['a', 'b'])
+    worker.record_move('a', 0, 'raising', False)
+    stats = StatsAggregator(str(tmp_path / 'player_stats.json'))
+    stats.start_hand(['a'])
+    stats.record_move('a', 0, 'fold', False)
+    stats.update_worker(0, worker.snapshot())
+    stats.update_worker(0, worker.snapshot())  # the latest snapshot of a worker replaces the previous one
+    assert stats.summary('a') == {'HANDS': 2, 'VPIP': 0.5, 'PFR': 0.5, 'AGGRESSION_FACTOR': None,
+                                  'FOLD_TO_RAISE': None, 'SHOWDOWNS': 0, 'SHOWDOWN_WIN_RATE': None}
+    assert stats.summary('b')['HANDS'] == 1
+    stats.save()
+    assert StatsAggregator(str(tmp_path / 'player_stats.json')).summary('a') == stats.summary('a')
+
+
+def test_without_a_snapshot_path_nothing_is_saved(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    stats = StatsAggregator()
+    stats.start_hand(['a'])
+    stats.save()
+    assert not list(tmp_path.iterdir())
+
+
+def test_table_statistics_match_the_hand_history():
+    players = [Player(f'P{index}', None, policy=RandomPolicy(seed=index)) for index in range(4)]
+    stats = StatsAggregator()
+    recorder = ListRecorder()
+    env = GameEnv(players, headless=True, seed=0, recorder=recorder, stats=stats, table_id='T')
+    env.initial_points(1000)
+    for hand in range(50):
+        env.play_hand()
+    rows = [row for row in recorder.rows if row['move'] not in TIMER_MOVES]
+    highest = {}  # (hand, street): highest bet so far, the blinds of the seat rows included
+    for row in rows:
+        street = (row['hand_id'], row['round'])
+        row['raised'] = row['current_bet'] > highest.get(street, 0)
+        highest[street] = max(highest.get(street, 0), row['current_bet'])
+    for player in players:
+        hands = {row['hand_id'] for row in rows if row['player'] == player.name}
+        vpip = {row['hand_id'] for row in rows if row['player'] == player.name and row['round'] == 0
+                and row['move'] in ('call', 'raising', 'all_in')}
+        moves = [row['move'] for row in rows if row['player'] == player.name]
+        all_ins = Counter(row['raised'] for row in rows if row['player'] == player.name and row['move'] == 'all_in')
+        counters = stats.players[player.name]
+        assert stats.summary(player.name)['HANDS'] == len(hands) == 50
+        assert stats.summary(player.name)['VPIP'] == len(vpip) / 50
+        assert (counters.calls, counters.bets_raises) == (moves.count('call') + all_ins[False],
+                                                          moves.count('raising') + all_ins[True])
@@ -0,0 +1,73 @@
+# %% import libraries
+import random
+from texas_holdem import Player, PotEngine
+
+
+# %% helpers
+def make_pot(contributions):
+    players = [Player(f'P{index}', None) for index in range(len(contributions))]
+    pot = PotEngine(players)
+    for player, amount in zip(players, contributions):
+        for chips in (amount // 3, amount - amount // 3):  # a blind or a bet, then a call
+            pot.add(player, chips)
+    return players, pot
+
+
+def level_by_level(contributions, scores):  # payouts from every distinct contribution level, seat by seat
+    payouts = [0] * len(contributions)
+    previous = 0
+    for level in sorted(set(contributions)):
+        chips = sum(min(amount, level) - min(amount, previous) for amount in contributions)
+        eligible = [seat for seat in scores if contributions[seat] >= level] or list(scores)
+        best = max(scores[seat] for seat in eligible)
+        winners = [seat for seat in sorted(eligible) if scores[seat] == best]
+        for seat in winners:
+            payouts[seat] += chips // len(winners)
+        payouts[winners[0]] += chips % len(winners)
+        previous = level
+    return payouts
+
+
+# %% tests
+def test_three_way_all_in_builds_a_main_and_a_side_pot():
+    players, pot = make_pot([50, 150, 150, 30])  # P3 folded after putting 30 in
+    live = {players[0]: 9, players[1]: 5, players[2]: 7}
+    pots = pot.pots(live)
+    assert [(side_pot['AMOUNT'], sorted(side_pot['PLAYERS'])) for side_pot in pots] == [
+        (180, ['P0', 'P1', 'P2']), (200, ['P1', 'P2'])]
+    payouts = pot.resolve(live)
+    assert [payouts[player] for player in players] == [180, 0, 200, 0]
+
+
+def test_uncalled_chips_go_back_to_the_only_player_who_put_them_in():
+    players, pot = make_pot([40, 100, 40])
+    payouts = pot.resolve({player: 1 for player in players[:2]})  # P2 folded, P0 and P1 split the main pot
+    assert [payouts[player] for player in players] == [60, 120, 0]
+    assert pot.pots({player: 1 for player in players[:2]})[-1] == {'AMOUNT': 60, 'PLAYERS': ['P1']}
+
+
+def test_odd_chips_go_to_the_first_seat():
+    players, pot = make_pot([7, 7, 7])
+    payouts = pot.resolve({players[2]: 3, players[1]: 3, players[0]: 1})
+    assert [payouts[player] for player in players] == [0, 11, 10]
+
+
+def test_layers_nobody_live_reached_go_to_the_best_hands_overall():
+    players, pot = make_pot([10, 10, 80])  # P2 bet big and folded
+    payouts = pot.resolve({players[0]: 2, players[1]: 4})
+    assert [payouts[player] for player in players] == [0, 100, 0]
+
+
+def test_random_hands_match_level_by_level_payouts():
+    rng = random.Random(0)
+    for hand in range(2000):
+        n_player = rng.randint(2, 9)
+        contributions = [rng.choice([0, 1, 2, 5, 17, 40, 40, 100, rng.randint(1, 300)]) for seat in range(n_player)]
+        live_seats = rng.sample(range(n_player), rng.randint(1, n_player))
+        scores = {seat: rng.randint(0, 3) for seat in live_seats}  # few distinct scores, many ties
+        players, pot = make_pot(contributions)
+        payouts = pot.resolve({players[seat]: score for seat, score in scores.items()})
+        assert [payouts[player] for player in players] == level_by_level(contributions, scores)
+        assert sum(payouts.values()) == pot.total == sum(contributions)
+        pots = pot.pots({players[seat] for seat in live_seats})
+        assert sum(side_pot['AMOUNT'] for side_pot in pots) == pot.total
@@ -0,0 +1,242 @@
+# %% import libraries
+import asyncio
+import json
+import socket
+import threading
+import time
+import pytest
+from metrics import ServerMetrics
+from protocol import (HEADER, MAX_MESSAGE_SIZE, broadcast_messages, decode_body, encode_message, read_message,
+                      recv_message)
+from replay import ListRecorder, group_hands, replay_hand
+from texas_holdem import DeckPool, GameEnv, Player
+
+
+# %% helpers
+class ChunkedSocket:
+    """
+    recv returns at most "chunk" bytes of the data, like a TCP stream split into small segments.
+    """
+
+    def __init__(self, data, chunk):
+        self.data = data
+        self.chunk = chunk
+
+    def recv(self, n_bytes):
+        data, self.data = self.data[:min(n_bytes, self.chunk)], self.data[min(n_bytes, self.chunk):]
+        return data
+
+
+class BatchConnection:
+    """
+    Connection whose messages to the whole table are collected by one send_batch call, like TableConnection.
+    """
+
+    def __init__(self, batches):
+        self.batches = batches
+
+    def send_batch(self, pairs):
+        self.batches.append(pairs)
+
+
+def socket_table(n_player):  # players on one end of socket pairs, the client ends to read what they were sent
+    pairs = [socket.socketpair() for index in range(n_player)]
+    players = [Player(f'P{index}', server_end) for index, (server_end, client_end) in enumerate(pairs)]
+    return players, [client_end for server_end, client_end in pairs]
+
+
+def close_table(players, clients):
+    for player, client in zip(players, clients):
+        player.conn.close()
+        client.close()
+
+
+def scripted_client(player, conn, answer, received):  # answers every move request with the frames of "answer"
+    n_requests = 0
+    try:
+        while True:
+            cmd, payload = recv_message(conn)
+            received.append((cmd, payload))
+            if cmd.startswith('request_round'):
+                for frame in answer(player, n_requests, payload):
+                    conn.sendall(frame)
+                n_requests += 1
+    except (ConnectionError, OSError):
+        pass
+
+
+def play_socket_hand(answers, decision_time=None, time_bank=0, received=None):  # one hand between socket players
+    players, clients = socket_table(len(answers))
+    received = received if received is not None else [[] for answer in answers]  # messages sent to each seat
+    threads = [threading.Thread(target=scripted_client, args=(player, client, answer, messages), daemon=True)
+               for player, client, answer, messages in zip(players, clients, answers, received)]
+    for thread in threads:
+        thread.start()
+    env = GameEnv(players, decision_time=decision_time, time_bank=time_bank, recorder=ListRecorder(), table_id=1)
+    env.verbose = False
+    for player in players:
+        player.verbose = False
+    env.initial_points(100)
+    env.play_hand()
+    close_table(players, clients)
+    for thread in threads:
+        thread.join(5)
+    return env, players
+
+
+def call(player, payload):  # the player info of a call, the table waits for the answer so its state is stable
+    bet = payload['CURRENT_BET']
+    return {'MOVE': 'call', 'POINTS': player.points - (bet - player.self_current_round_commited),
+            'PAST_COMMITED': player.self_past_rounds_commited, 'CURRENT_COMMITED': bet, 'IN_GAME': True,
+            'BET_MATCH': True, 'DECISION': payload['DECISION']}
+
+
+# %% framing
+def test_messages_survive_any_tcp_split():
+    data = b''.join(encode_message(cmd, payload) for cmd, payload in
+                    [('request_name', None), ('player_move', {'MOVE': 'call', 'CARDS': ['10H', 'AS']}), ('x', 'é')])
+    for chunk in (1, 3, 7, len(data)):
+        conn = ChunkedSocket(data, chunk)
+        assert [recv_message(conn) for i in range(3)] == [
+            ('request_name', None), ('player_move', {'MOVE': 'call', 'CARDS': ['10H', 'AS']}), ('x', 'é')]
+
+
+def test_closed_connection_and_oversized_message_raise_connection_error():
+    with pytest.raises(ConnectionError):
+        recv_message(ChunkedSocket(encode_message('cut')[:-2], 4))
+    with pytest.raises(ConnectionError):
+        recv_message(ChunkedSocket(HEADER.pack(MAX_MESSAGE_SIZE + 1), 4))
+
+
+def test_stream_reader_reads_merged_messages_and_stops_on_eof():
+    async def read_all(data):
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        messages = []
+        while True:
+            try:
+                messages.append(await read_message(reader))
+            except ConnectionError:
+                return messages
+    data = encode_message('request_name') + encode_message('name', 'bob')
+    assert asyncio.run(read_all(data + data[:3])) == [('request_name', None), ('name', 'bob')]
+    assert asyncio.run(read_all(HEADER.pack(MAX_MESSAGE_SIZE + 1) + data)) == []
+
+
+@pytest.mark.parametrize('body', [b'{"MOVE": "call"}', b'"player_move"', b'null', b'[1, 2]', b'["a"]',
+                                  b'["a", 1, 2]', b'not json', b'\xff\xfe'])
+def test_malformed_bodies_raise_value_error(body):
+    with pytest.raises(ValueError):
+        decode_body(body)
+
+
+def test_body_is_compact_json():
+    body = encode_message('player_move', {'MOVE': 'fold'})[HEADER.size:]
+    assert json.loads(body) == ['player_move', {'MOVE': 'fold'}]
+    assert b' ' not in body
+
+
+# %% broadcasts
+def test_broadcast_sends_one_frame_per_seat_and_returns_the_failed_connections():
+    players, clients = socket_table(3)
+    clients[1].close()
+    messages = [encode_message('update', index) for index in range(3)]
+    failed = broadcast_messages([player.conn for player in players], messages)
+    assert failed == [players[1].conn]
+    assert [recv_message(clients[index]) for index in (0, 2)] == [('update', 0), ('update', 2)]
+    batches = []
+    conns = [BatchConnection(batches) for index in range(3)]
+    assert broadcast_messages(conns, messages) == []
+    assert batches == [list(zip(conns, messages))]  # a single hop to the event loop for the whole table
+    close_table(players, clients)
+
+
+def test_failed_seats_are_logged_counted_and_the_others_still_hear(capsys):
+    players, clients = socket_table(3)
+    clients[0].close()
+    metrics = ServerMetrics()
+    env = GameEnv(players, metrics=metrics)
+    env.broadcast('sending_initial_hand', payloads=[{'SEAT': index} for index in range(3)])
+    assert 'Could not send sending_initial_hand' in capsys.readouterr().out
+    assert metrics.snapshot()['SOCKET_ERRORS'] == {'connection': 1}
+    assert [recv_message(clients[index]) for index in (1, 2)] == [
+        ('sending_initial_hand', {'SEAT': 1}), ('sending_initial_hand', {'SEAT': 2})]
+    close_table(players, clients)
+
+
+def test_hole_cards_only_reach_their_own_seat():
+    players, clients = socket_table(3)
+    env = GameEnv(players)
+    env.verbose = False
+    env.deck = DeckPool(seed=0).next_deck()
+    env.initialize_player_cards()
+    for player, client in zip(players, clients):
+        assert recv_message(client) == ('sending_initial_hand', {'first_card': str(player.hand[0]),
+                                                                 'second_card': str(player.hand[1])})
+    close_table(players, clients)
+
+
+# %% moves over sockets
+def test_stray_frames_before_the_move_are_skipped():
+    def noisy(player, n_requests, payload):
+        return [encode_message('heartbeat'), encode_message('chat', None),
+                encode_message('player_move', dict(call(player, payload), DECISION=payload['DECISION'] - 1)),  # late
+                encode_message('player_move', call(player, payload))]
+    env, players = play_socket_hand([noisy, noisy])
+    assert all(player.in_game for player in players)  # both called every street, nobody folded
+    assert sum(player.points for player in players) == 200
+
+
+def test_a_non_dict_move_folds_the_player():
+    def garbage(player, n_requests, payload):
+        return [encode_message('player_move', 'call')]
+
+    def caller(player, n_requests, payload):
+        return [encode_message('player_move', call(player, payload))]
+    env, players = play_socket_hand([garbage, caller])
+    folded, winner = sorted(players, key=lambda player: player.in_game)
+    assert (folded.points, winner.points) == (99, 101)  # the small blind folded to the big blind
+
+
+
+def test_a_raise_amount_that_is_not_a_number_is_a_minimum_raise():
+    def raiser(player, n_requests, payload):
+        move = {'MOVE': 'raising', 'RAISE_AMOUNT': 'lots', 'DECISION': payload['DECISION']}
+        return [encode_message('player_move', move if n_requests == 0 else call(player, payload))]
+
+    def caller(player, n_requests, payload):
+        return [encode_message('player_move', call(player, payload))]
+    received = [[], []]
+    env, players = play_socket_hand([raiser, caller], received=received)
+    assert all(player.in_game for player in players)
+    corrected = [payload for cmd, payload in received[0] if cmd == 'move_corrected']
+    assert corrected[0]['MOVE'] == 'raising' and corrected[0]['CURRENT_COMMITED'] == 4  # the big blind plus 2
+
+def test_timer_events_are_recorded_and_sent_to_the_table():
+    def slow(player, n_requests, payload):
+        if n_requests == 0:
+            time.sleep(0.25)  # over the decision time, within the time bank
+        return [encode_message('player_move', call(player, payload))]
+
+    def silent_once(player, n_requests, payload):
+        return [] if n_requests == 0 else [encode_message('player_move', call(player, payload))]
+    received = [[], []]
+    env, players = play_socket_hand([slow, silent_once], decision_time=0.1, time_bank=0.3, received=received)
+    events = [(event['PLAYER'], event['EVENT']) for event in env.hand_record]
+    assert events == [('P0', 'time_bank'), ('P1', 'time_bank'), ('P1', 'timeout')]
+    assert env.hand_record[0]['BANK_USED'] == pytest.approx(0.15, abs=0.04)
+    assert env.hand_record[1]['BANK_USED'] == pytest.approx(0.3) and env.hand_record[1]['BANK_LEFT'] == 0
+    assert env.hand_record[2]['ELAPSED'] >= 0.4 and env.hand_record[2]['MOVE'] == 'check'  # the bet was matched
+    assert all(player.in_game for player in players)
+    rows = env.recorder.rows
+    moves = [(row['player'], row['move'], row['round']) for row in rows]
+    assert moves[2:8] == [('P0', 'time_bank', 0), ('P0', 'call', 0), ('P0', 'call', 1),  # the big blind has matched
+                          ('P1', 'time_bank', 1), ('P1', 'timeout', 1), ('P1', 'check', 1)]
+    assert rows[2]['amount'] == pytest.approx(150, abs=40)  # milliseconds over the decision time
+    assert rows[2]['amount'] + rows[2]['current_bet'] == pytest.approx(300, abs=1)  # used and left in the bank
+    assert (rows[5]['amount'], rows[5]['current_bet']) == (300, 0)  # the whole bank
+    assert rows[6]['current_bet'] == 400 and rows[6]['amount'] >= 400  # waited past the limit
+    for messages in received:  # both seats hear about both players
+        assert [(payload['PLAYER'], payload['EVENT']) for cmd, payload in messages if cmd == 'timer_event'] == events
+    assert replay_hand(group_hands(rows)[0]) == []  # the timer rows do not get in the way of a replay
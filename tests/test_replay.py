@@ -0,0 +1,67 @@
+# %% import libraries
+import csv
+import os
+import random
+import pytest
+from hand_history import HandHistoryWriter, pa
+from replay import HandReplayer, ListRecorder, group_hands, replay_hand
+from texas_holdem import GameEnv, Player, RandomPolicy
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEGACY_FILES = [os.path.join(REPO, name) for name in
+                ('poker_record_1575758155.csv', 'poker_record_1575758589.csv', 'poker_record_1575758605.csv')]
+
+
+# %% helpers
+def play_table(recorder, n_hands, seed=0, n_player=4):
+    players = [Player(f'P{index}', None, policy=RandomPolicy(seed=seed + index)) for index in range(n_player)]
+    env = GameEnv(players, headless=True, seed=seed, recorder=recorder, table_id='T')
+    env.initial_points(100)
+    for hand in range(n_hands):
+        for player in players:
+            if player.points < 10:
+                player.points = 100
+        env.play_hand()
+
+
+def read_legacy(path):
+    with open(path, newline='') as file:
+        return list(csv.DictReader(file))
+
+
+# %% tests
+@pytest.mark.parametrize('file_format', ['csv'] + (['parquet', 'arrow'] if pa is not None else []))
+def test_rotated_files_replay_without_differences(tmp_path, file_format):
+    writer = HandHistoryWriter(tmp_path, file_format=file_format, buffer_rows=16, flush_seconds=3600,
+                               max_bytes=1000 if file_format == 'csv' else 1)
+    play_table(writer, 60)
+    writer.close()
+    assert len(writer.paths) > 11  # files _10 and _11 exist, they sort after _2
+    replayer = HandReplayer(n_workers=1, chunk_size=7)
+    summary = replayer.replay_files(random.Random(0).sample(writer.paths, len(writer.paths)))
+    assert (summary['HANDS'], summary['MATCHED'], summary['DIFFS']) == (60, 60, [])
+
+
+def test_a_changed_row_is_reported():
+    recorder = ListRecorder()
+    play_table(recorder, 5, seed=1)
+    hands = group_hands(recorder.rows)
+    row = next(row for row in hands[2] if row['move'] == 'showdown' or row['move'] == 'uncontested')
+    row['amount'] += 1
+    diffs = replay_hand(hands[2])
+    assert [(diff['HAND_ID'], diff['COLUMN'], diff['RECORDED'] - diff['REPLAYED']) for diff in diffs] == [
+        (3, 'amount', 1)]
+    assert all(replay_hand(rows) == [] for index, rows in enumerate(hands) if index != 2)
+
+
+def test_legacy_files_are_one_hand_each_and_skipped():
+    summary = HandReplayer(n_workers=1).replay_files(LEGACY_FILES)
+    assert (summary['HANDS'], summary['SKIPPED'], summary['MATCHED']) == (3, 3, 0)
+
+
+def test_legacy_hands_in_one_file_split_on_the_board_and_the_hole_cards():
+    first, second = (read_legacy(path) for path in LEGACY_FILES[:2])
+    hands = group_hands(first + second)  # no table column: the board starting again tells the hands apart
+    assert [len(rows) for rows in hands] == [len(first), len(second)]
+    preflop = [dict(row, board='[]') for row in first + second]  # same board, the hole cards change with the hand
+    assert [len(rows) for rows in group_hands(preflop)] == [len(first), len(second)]
@@ -0,0 +1,248 @@
+# %% import libraries
+import asyncio
+import csv
+import glob
+import json
+import re
+import socket
+import threading
+import time
+from collections import Counter
+import ServerClient
+from benchmark import bot_client
+from metrics import ServerMetrics
+from protocol import encode_message, read_message, recv_message
+from texas_holdem import Player
+
+
+# %% helpers
+class RunningServer:
+    """
+    A TableServer serving on a free local port from a background event loop thread.
+    """
+
+    def __init__(self, monkeypatch, directory, server_class=ServerClient.TableServer, **kwargs):
+        monkeypatch.setattr(ServerClient, 'METRICS_PORT', None)
+        monkeypatch.setattr(ServerClient, 'HISTORY_DIR', str(directory))
+        monkeypatch.setattr(ServerClient, 'STATS_PATH', str(directory / 'player_stats.json'))
+        monkeypatch.setattr(ServerClient, 'METRICS_PATH', str(directory / 'server_metrics.json'))
+        monkeypatch.setattr(ServerClient, 'SHUTDOWN_TIMEOUT', 10)
+        self.server = server_class(host='localhost', port=0, **kwargs)
+
+        async def no_prompt():
+            pass
+        self.server.start_command = no_prompt
+        self.thread = threading.Thread(target=asyncio.run, args=(self.server.serve(),))
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while self.server.server is None or not self.server.server.sockets:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        self.port = self.server.server.sockets[0].getsockname()[1]
+
+    def wait_tables(self, n_tables, timeout=30):  # until "n_tables" tables have started and ended
+        deadline = time.monotonic() + timeout
+        while self.server.n_tables < n_tables or self.server.tables:
+            assert time.monotonic() < deadline
+            time.sleep(0.02)
+
+    def stop(self):
+        self.server.loop.call_soon_threadsafe(self.server.serve_task.cancel)
+        self.thread.join(30)
+        assert not self.thread.is_alive()
+
+
+def run_bots(port, names):
+    counts = {}
+    bots = [threading.Thread(target=bot_client, args=(name, port, counts)) for name in names]
+    for bot in bots:
+        bot.start()
+    return bots, counts
+
+
+def read_history(directory):
+    return [row for path in glob.glob(str(directory / 'poker_record_*.csv')) for row in csv.DictReader(open(path))]
+
+
+class IdleConnection:
+    """
+    A player connection that is never read from or written to.
+    """
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """
+    The parts of a TableConnection the lobby uses.
+    """
+
+    def __init__(self):
+        self.reader, self.writer = object(), object()
+        self.attached = None
+        self.detached = False
+
+    def attach(self, reader, writer):
+        self.attached = (reader, writer)
+
+    def detach(self):
+        self.detached = True
+
+
+# %% tests
+def test_tables_play_and_shutdown_saves_history_and_stats(monkeypatch, tmp_path, capsys):
+    running = RunningServer(monkeypatch, tmp_path, table_size=2, n_hands=3, action_timeout=10)
+    bots, counts = run_bots(running.port, ['a', 'b', 'c', 'd'])
+    running.wait_tables(2)
+    for bot in bots:
+        bot.join(10)
+    running.stop()
+
+    assert sum(counts.values()) > 0
+    rows = read_history(tmp_path)
+    assert len({(row['table'], row['hand_id']) for row in rows}) == 6  # 2 tables of 3 hands, nothing left buffered
+    assert {row['move'] for row in rows} <= {'seat', 'check', 'call', 'showdown', 'uncontested'}
+    with open(tmp_path / 'player_stats.json') as file:
+        players = json.load(file)['PLAYERS']
+    assert sorted(players) == ['a', 'b', 'c', 'd']
+    assert all(counts['hands'] == 3 for counts in players.values())
+    assert 'Server stopped.' in capsys.readouterr().out
+
+
+def test_sharded_tables_play_on_worker_processes_and_shutdown_joins_them(monkeypatch, tmp_path, capsys):
+    running = RunningServer(monkeypatch, tmp_path, server_class=ServerClient.ShardedTableServer, n_workers=2,
+                            table_size=2, n_hands=3, action_timeout=10)
+    bots, counts = run_bots(running.port, ['a', 'b', 'c', 'd'])
+    running.wait_tables(2)  # both tables were reported ended by their worker
+    for bot in bots:
+        bot.join(10)
+    processes = [process for process, pipe in running.server.workers]
+    running.stop()
+
+    assert [process.exitcode for process in processes] == [0, 0]  # the workers stopped and were joined
+    assert sum(counts.values()) > 0  # the sockets passed to the workers carried the hands
+    out = capsys.readouterr().out
+    assert set(re.findall(r'Table \d starts on worker (\d)', out)) <= {'0', '1'}
+    assert sorted(re.findall(r'Table (\d) ends \| Points', out)) == ['1', '2']
+    rows = read_history(tmp_path)  # written by the workers to their own files
+    assert len({(row['table'], row['hand_id']) for row in rows}) == 6
+    assert not running.server.tables and running.server.worker_load == [0, 0]
+    with open(tmp_path / 'player_stats.json') as file:  # the acceptor saved the counts sent by the workers
+        players = json.load(file)['PLAYERS']
+    assert sorted(players) == ['a', 'b', 'c', 'd']
+    assert all(counts['hands'] == 3 for counts in players.values())
+    assert running.server.stats.summary('a')['HANDS'] == 3
+    assert not glob.glob(str(tmp_path / 'player_stats_*'))
+
+
+def test_shutdown_lets_the_hand_in_progress_end_and_starts_no_other(monkeypatch, tmp_path):
+    running = RunningServer(monkeypatch, tmp_path, table_size=2, n_hands=10 ** 6, action_timeout=10)
+    bots, counts = run_bots(running.port, ['a', 'b'])
+    deadline = time.monotonic() + 10
+    while not running.server.tables:  # the table has started
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    time.sleep(0.2)
+    running.stop()
+    for bot in bots:
+        bot.join(10)
+
+    rows = read_history(tmp_path)
+    hand_ids = {row['hand_id'] for row in rows}
+    river_moves = Counter(row['hand_id'] for row in rows if row['round'] == '3')
+    assert hand_ids and all(river_moves[hand_id] == 2 for hand_id in hand_ids)  # every hand was called to the end
+    assert not running.server.tables
+
+
+def test_tables_deal_seeded_decks_and_history_and_stats_can_be_turned_off(monkeypatch):
+    monkeypatch.setattr(ServerClient, 'HandHistoryWriter', None)  # would fail if the server opened one
+    monkeypatch.setattr(ServerClient, 'StatsAggregator', None)
+    server = ServerClient.TableServer(port=0, record_history=False, keep_stats=False, seed=7)
+    assert server.recorder is None and server.stats is None
+    assert [server.table_seed(table_id) for table_id in (1, 2)] == [8, 9]
+    assert ServerClient.TableServer(port=0, record_history=False, keep_stats=False).table_seed(1) is None
+
+
+def test_closed_stdin_only_closes_the_prompt(monkeypatch, capsys):
+    def closed_stdin(prompt):
+        raise EOFError
+    monkeypatch.setattr('builtins.input', closed_stdin)
+    server = ServerClient.TableServer(port=0)
+
+    async def prompt():
+        server.loop = asyncio.get_running_loop()
+        await asyncio.wait_for(server.start_command(), 5)
+    asyncio.run(prompt())
+    assert 'No command input, the command prompt is closed.' in capsys.readouterr().out
+
+
+def test_tables_beyond_max_tables_wait_for_a_free_thread(capsys):
+    server = ServerClient.TableServer(port=0, max_tables=1)
+    intervals = []
+
+    def play_table(env):
+        start = time.monotonic()
+        time.sleep(0.1)
+        intervals.append((start, time.monotonic()))
+    server.play_table = play_table
+
+    async def run():
+        server.loop = asyncio.get_running_loop()
+        server.lobby.waiting = {f'P{index}': Player(f'P{index}', IdleConnection()) for index in range(4)}
+        server.start_table(2)
+        server.start_table(2)
+        while server.tables or len(intervals) < 2:
+            await asyncio.sleep(0.01)
+    asyncio.run(asyncio.wait_for(run(), 10))
+    assert intervals[0][1] <= intervals[1][0]  # the second table started once the first one was over
+    out = capsys.readouterr().out
+    assert '***** WARNING: 1 tables are running, table 2 is queued. *****' in out
+    assert 'Table 1 ends.' in out and 'Table 2 ends.' in out
+
+
+# %% lobby
+def test_lobby_resumes_seats_by_name():
+    lobby = ServerClient.Lobby()
+    first = FakeConnection()
+    player, table_id = lobby.join('a', first)
+    assert table_id is None and lobby.waiting == {'a': player}
+    lobby.seat(7, lobby.take(1))
+    lobby.disconnected(first)  # a seated player keeps the seat
+    second = FakeConnection()
+    assert lobby.join('a', second) == (player, 7)
+    assert first.attached == (second.reader, second.writer) and second.detached
+    lobby.forget(player)
+    assert not lobby.seated and not lobby.by_conn
+
+
+def test_heartbeats_keep_answering_players_and_idle_ones_are_evicted(capsys):
+    async def run():
+        loop = asyncio.get_running_loop()
+        metrics = ServerMetrics()
+        lobby = ServerClient.Lobby(heartbeat_interval=0.05, idle_timeout=0.5, metrics=metrics)
+        clients = {}
+        for name in ('alive', 'silent'):
+            server_end, client_end = socket.socketpair()
+            reader, writer = await asyncio.open_connection(sock=server_end)
+            lobby.join(name, ServerClient.TableConnection(reader, writer, loop, on_disconnect=lobby.disconnected))
+            clients[name] = await asyncio.open_connection(sock=client_end)
+        heartbeat = asyncio.ensure_future(lobby.heartbeat())
+        (alive_reader, alive_writer), (silent_reader, silent_writer) = clients['alive'], clients['silent']
+        n_heartbeats = 0
+        while 'silent' in lobby.waiting:
+            assert await asyncio.wait_for(read_message(alive_reader), 5) == ('heartbeat', None)
+            alive_writer.write(encode_message('heartbeat'))
+            n_heartbeats += 1
+        assert n_heartbeats >= 5
+        assert list(lobby.waiting) == ['alive']
+        assert metrics.snapshot()['SOCKET_ERRORS'] == {'idle': 1}
+        while await asyncio.wait_for(silent_reader.read(1024), 5):  # the heartbeats before the eviction, then EOF
+            pass
+        heartbeat.cancel()
+        for reader, writer in clients.values():
+            writer.close()
+    asyncio.run(asyncio.wait_for(run(), 10))
+    out = capsys.readouterr().out
+    assert '***** WARNING: Player silent timed out, closing the connection. *****' in out
+    assert 'Player silent left the lobby | Players waiting: 1' in out
@@ -0,0 +1,56 @@
+# %% import libraries
+import pytest
+from texas_holdem import *
+from tournament import Tournament
+
+
+# %% helpers
+def make_players(n_player, seed=0):
+    return [Player(f'P{i}', None, policy=RandomPolicy(seed=seed + i)) for i in range(n_player)]
+
+
+# %% tests
+def test_tournament_ends_with_every_player_placed_once():
+    players = make_players(12)
+    tournament = Tournament(players, table_size=5, headless=True, seed=3, hands_per_level=2)
+    standings = tournament.run()
+    assert sorted(standings) == sorted(player.name for player in players)
+    assert sum(player.points for player in players) == 12 * 1000
+    with pytest.raises(RuntimeError):  # the table threads were shut down
+        tournament.executor.submit(print)
+
+
+def test_table_sizes_differ_by_at_most_one_after_balancing():
+    tournament = Tournament(make_players(14), table_size=6, headless=True, seed=1)
+    tournament.seat_players()
+    del tournament.tables[0].players_list[2:]  # as if most of the first table busted
+    n_alive = sum(env.n_player for env in tournament.tables)
+    tournament.balance_tables()
+    sizes = [env.n_player for env in tournament.tables]
+    assert max(sizes) - min(sizes) <= 1
+    assert sum(sizes) == n_alive
+
+
+def test_players_busted_in_the_same_hand_are_placed_by_starting_stack():
+    players = make_players(6)
+    tournament = Tournament(players, table_size=3, headless=True, seed=0)
+    tournament.seat_players()
+    large, small = tournament.tables[0].players_list[0], tournament.tables[1].players_list[0]
+    tournament.starting_stacks = {player: 1000 for player in players}
+    tournament.starting_stacks.update({small: 50, large: 400})
+    small.points = 0
+    large.points = 0
+    tournament.remove_busted()
+    assert tournament.busted == [small, large]  # the smaller stack busts first and finishes lower
+
+
+def test_moved_player_keeps_time_bank():
+    tournament = Tournament(make_players(4), table_size=2, headless=True, seed=0, decision_time=10, time_bank=60)
+    tournament.seat_players()
+    source, target = tournament.tables
+    player = source.players_list[0]
+    source.time_banks[player.name] = 12.5
+    Tournament.move_player(player, source, target)
+    assert player in target.players_list and player not in source.players_list
+    assert target.time_banks[player.name] == 12.5
+    assert player.name not in source.time_banks
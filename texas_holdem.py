@@ -1,26 +1,81 @@
 # %% import library
-import ast
 import random
+import time
 from collections import defaultdict
+from functools import total_ordering
 from itertools import combinations
 import operator
 import numpy as np
-import pandas as pd
-from math import floor
+from protocol import broadcast_messages, encode_message, send_message, recv_message
+
+
+# %% card encoding and hand evaluation lookup tables
+# a card is encoded as an integer code = 4 * rank index + suit index, rank index 0 is '2' and 12 is 'A'
+RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+SUITS = ['C', 'D', 'H', 'S']  # Club, Diamond, Heart, Spades
+CARD_CODES = {f'{rank}{suit}': 4 * r + s for r, rank in enumerate(RANKS) for s, suit in enumerate(SUITS)}
+CARD_NAMES = [f'{rank}{suit}' for rank in RANKS for suit in SUITS]
+
+# a hand score packs the rating list [category, v1, v2, ...] into 4 bits per field,
+# so that comparing two scores as integers is the same as comparing the rating lists
+_RATING_LENGTH = {10: 1, 9: 2, 8: 3, 7: 3, 6: 6, 5: 2, 4: 4, 3: 4, 2: 5, 1: 6, 0: 1}
+
+
+def _build_tables():  # tables indexed by a 13 bit rank mask
+    bit_count = [0] * 8192
+    top_five = [0] * 8192  # packed values of the (up to) 5 highest ranks in the mask
+    straight_top = [0] * 8192  # value of the highest straight card in the mask, 0 if there is no straight
+    for mask in range(8192):
+        values = [r + 2 for r in range(12, -1, -1) if mask >> r & 1]
+        bit_count[mask] = len(values)
+        packed = 0
+        for v in (values + [0] * 5)[:5]:
+            packed = packed << 4 | v
+        top_five[mask] = packed
+        for top in range(14, 5, -1):
+            if mask >> (top - 6) & 31 == 31:
+                straight_top[mask] = top
+                break
+        else:
+            if mask & 0b1000000001111 == 0b1000000001111:  # A, 2, 3, 4, 5
+                straight_top[mask] = 5
+    return bit_count, top_five, straight_top
+
+
+_BIT_COUNT, _TOP_FIVE, _STRAIGHT_TOP = _build_tables()
+_BIT_COUNT_ARRAY = np.array(_BIT_COUNT, dtype=np.int64)
+_TOP_FIVE_ARRAY = np.array(_TOP_FIVE, dtype=np.int64)
+_STRAIGHT_TOP_ARRAY = np.array(_STRAIGHT_TOP, dtype=np.int64)
+_RANK_BITS_ARRAY = 1 << np.arange(13, dtype=np.int64)
 
 
 # %% single card class definition
+@total_ordering
 class Card:
     """
     A single poker card in the game.
+    -------------------------------------------------------------------------------------------------------------------
+    Cards are interned: Card(rank, suit) always returns the same instance, ordered and hashed by card code.
     """
 
-    def __init__(self, rank, suit):  # initialization
-        self._rank_value = {'2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, '8': 8, '9': 9,
-                            '10': 10, 'J': 11, 'Q': 12, 'K': 13, 'A': 14}
-        self.rank = rank
-        self.suit = suit
-        self.val = self._rank_value[self.rank]
+    __slots__ = ('rank', 'suit', 'val', 'code')
+    _rank_value = {'2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, '8': 8, '9': 9,
+                   '10': 10, 'J': 11, 'Q': 12, 'K': 13, 'A': 14}
+    _interned = {}
+
+    def __new__(cls, rank, suit):  # initialization, once per distinct card
+        card = cls._interned.get((rank, suit))
+        if card is None:
+            card = super().__new__(cls)
+            card.rank = rank
+            card.suit = suit
+            card.val = cls._rank_value[rank]
+            card.code = CARD_CODES[f"{rank}{suit}"]
+            cls._interned[(rank, suit)] = card
+        return card
+
+    def __reduce__(self):  # unpickling goes through __new__ and returns the interned card
+        return Card, (self.rank, self.suit)
 
     def __str__(self):
         return f"{self.rank}{self.suit}"
@@ -29,33 +84,76 @@ class Card:
         return f"{self.rank}{self.suit}"
 
     def __eq__(self, other):
-        return self.rank == other.rank and self.suit == other.suit
+        if not isinstance(other, Card):
+            return NotImplemented
+        return self.code == other.code
+
+    def __lt__(self, other):
+        if not isinstance(other, Card):
+            return NotImplemented
+        return self.code < other.code
+
+    def __hash__(self):
+        return self.code
 
 
 # %% deck class definition
+CARD_TABLE = tuple(Card(rank, suit) for rank in RANKS for suit in SUITS)  # the 52 shared cards, indexed by card code
+
+
 class Deck:
     """
     One or more poker decks in the game, does not include jokers, a total of 52 cards.
+    -------------------------------------------------------------------------------------------------------------------
+    The deck is an order of card codes into CARD_TABLE and a cursor, drawing a card only moves the cursor.
     """
 
-    def __init__(self, n_pack):  # initialization
-        self._suit = ['C', 'D', 'H', 'S']  # Club, Diamond, Heart, Spades
-        self._rank = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
+    def __init__(self, n_pack, order=None):  # initialization
         self.packs = n_pack
-        self.cards = []
-        for pack in range(0, n_pack):
-            for suit in self._suit:
-                for rank in self._rank:
-                    self.cards.append(Card(rank, suit))
+        self.order = list(range(52)) * n_pack if order is None else list(order)
+        self.position = 0
+
+    @property
+    def cards(self):  # the cards left in the deck, next card first
+        return [CARD_TABLE[code] for code in self.order[self.position:]]
 
     def shuffle(self):  # shuffle the deck
-        random.shuffle(self.cards)
+        random.shuffle(self.order)
+        self.position = 0
 
     def draw_card(self):  # returns the first card of the deck and remove it from the deck
-        card = self.cards[0]
-        self.cards.pop(0)
+        card = CARD_TABLE[self.order[self.position]]
+        self.position += 1
         return card
 
+    @staticmethod
+    def shuffled_orders(n_decks, seed=None, n_pack=1):  # (n_decks, 52 * n_pack) array, one shuffled deck per row
+        rng = np.random.default_rng(seed)
+        return rng.permuted(np.tile(np.arange(52), (n_decks, n_pack)), axis=1)
+
+
+class DeckPool:
+    """
+    Pre-shuffled decks generated in bulk from a seeded random generator, refilled "size" decks at a time.
+    """
+
+    def __init__(self, size=1024, seed=None, n_pack=1):
+        self.size = size
+        self.n_pack = n_pack
+        self.seed = seed
+        self.rng = None  # created with the first decks, a GameEnv built for a single hand never needs it
+        self.orders = []
+        self.position = 0
+
+    def next_deck(self):
+        if self.position == len(self.orders):
+            if self.rng is None:
+                self.rng = np.random.default_rng(self.seed)
+            self.orders = Deck.shuffled_orders(self.size, self.rng, self.n_pack).tolist()
+            self.position = 0
+        self.position += 1
+        return Deck(self.n_pack, self.orders[self.position - 1])
+
 
 # %% single player class definition
 class Player:
@@ -63,13 +161,19 @@ class Player:
     A single player in the game.
     """
 
-    def __init__(self, name, conn, hand=None, points=0):
+    __slots__ = ('hand', 'name', 'conn', 'policy', 'verbose', 'points', 'self_past_rounds_commited',
+                 'self_current_round_commited', 'in_game', 'round_requirement_met', 'exist_error',
+                 'all_available_cards', 'best_hand_rating', 'game_end_return')
+
+    def __init__(self, name, conn, hand=None, points=0, policy=None):
         if hand is None:
             self.hand = []
         else:
             self.hand = hand
         self.name = name
         self.conn = conn
+        self.policy = policy  # decides the moves when the game runs headless
+        self.verbose = True
         self.points = points
         self.self_past_rounds_commited = 0
         self.self_current_round_commited = 0
@@ -81,17 +185,21 @@ class Player:
         self.best_hand_rating = None
         self.game_end_return = 0
 
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
     def dealed_card(self, card):
         if len(self.hand) < 2:
             self.hand.append(card)
         else:
-            print('***** WARNING: Cannot have more than 2 cards in hand. *****')
+            self.log('***** WARNING: Cannot have more than 2 cards in hand. *****')
             return False
 
     def folding(self):
         self.self_past_rounds_commited += self.self_current_round_commited
         self.self_current_round_commited = 0
-        print(f'You have folded.')
+        self.log(f'You have folded.')
         self.round_requirement_met = True
         self.in_game = False
         return {'MOVE': 'fold',
@@ -103,7 +211,7 @@ class Player:
 
     def checking(self, current_round_commited):
         if self.self_current_round_commited == current_round_commited:
-            print(f'You want to check.')
+            self.log(f'You want to check.')
             self.round_requirement_met = True
             return {'MOVE': 'check',
                     'POINTS': self.points,
@@ -112,12 +220,12 @@ class Player:
                     'IN_GAME': self.in_game,
                     'BET_MATCH': self.round_requirement_met}
         else:
-            print('***** WARNING: You need to match the bet. *****')
+            self.log('***** WARNING: You need to match the bet. *****')
             return False
 
     def calling(self, current_round_commited):
         if self.points >= current_round_commited - self.self_current_round_commited:
-            print(f'You called {current_round_commited - self.self_current_round_commited} points.')
+            self.log(f'You called {current_round_commited - self.self_current_round_commited} points.')
             self.points -= (current_round_commited - self.self_current_round_commited)
             self.self_current_round_commited = current_round_commited
             self.round_requirement_met = True
@@ -128,14 +236,14 @@ class Player:
                     'IN_GAME': self.in_game,
                     'BET_MATCH': self.round_requirement_met}
         else:
-            print('***** WARNING: You do not have enough points to call. *****')
+            self.log('***** WARNING: You do not have enough points to call. *****')
             return False
 
     def raising(self, current_round_commited, raise_amount):
         if current_round_commited - self.self_current_round_commited + raise_amount <= self.points:
             self.points -= current_round_commited - self.self_current_round_commited + raise_amount
             self.self_current_round_commited = current_round_commited + raise_amount
-            print(f'You raised {raise_amount} points in addition to the previous bet of {current_round_commited} points.')
+            self.log(f'You raised {raise_amount} points in addition to the previous bet of {current_round_commited} points.')
             self.round_requirement_met = True
             return {'MOVE': 'raising',
                     'RAISE_AMOUNT': raise_amount,
@@ -145,8 +253,8 @@ class Player:
                     'IN_GAME': self.in_game,
                     'BET_MATCH': self.round_requirement_met}
         else:
-            print(f'***** WARNING: You do not have enough to raise {raise_amount} points. *****')
-            print(f'A maximum of {self.points + self.self_current_round_commited - current_round_commited} points available for raise.')
+            self.log(f'***** WARNING: You do not have enough to raise {raise_amount} points. *****')
+            self.log(f'A maximum of {self.points + self.self_current_round_commited - current_round_commited} points available for raise.')
             return False
 
     def all_in(self):
@@ -154,7 +262,7 @@ class Player:
             self.self_current_round_commited += self.points
             self.points = 0
             self.round_requirement_met = True
-            print('You have decided to all-in.')
+            self.log('You have decided to all-in.')
             return {'MOVE': 'all_in',
                     'POINTS': self.points,
                     'PAST_COMMITED': self.self_past_rounds_commited,
@@ -162,15 +270,15 @@ class Player:
                     'IN_GAME': self.in_game,
                     'BET_MATCH': self.round_requirement_met}
         else:
-            print(f'***** WARNING: You already bet all your points. *****')
+            self.log(f'***** WARNING: You already bet all your points. *****')
             return False
 
     def ask_for_move(self, current_round_commited):
-        print(f'You have commited {self.self_past_rounds_commited + self.self_current_round_commited} points this game.')
+        self.log(f'You have commited {self.self_past_rounds_commited + self.self_current_round_commited} points this game.')
         if current_round_commited == self.self_current_round_commited:
-            print(f'You have matched the bet this round.')
+            self.log(f'You have matched the bet this round.')
         else:
-            print(f'You need to commit additional {current_round_commited - self.self_current_round_commited} points.')
+            self.log(f'You need to commit additional {current_round_commited - self.self_current_round_commited} points.')
         self.exist_error = True
         while self.exist_error:
             move = input(f'Please select a move: (fold, check, call, raising, all_in)')
@@ -193,8 +301,8 @@ class Player:
                     if isinstance(outputs, dict):
                         self.exist_error = False
                 except():
-                    print('***** WARNING: Entered points to raise is invalid. *****')
-                    print('\n')
+                    self.log('***** WARNING: Entered points to raise is invalid. *****')
+                    self.log('\n')
             elif move == 'all_in':
                 outputs = self.all_in()
                 if isinstance(outputs, dict):
@@ -202,6 +310,25 @@ class Player:
             if not self.exist_error:
                 return outputs
 
+    def apply_move(self, current_round_commited, move, amount=0, min_raise=0):  # play a move from a policy or a client
+        to_call = current_round_commited - self.self_current_round_commited
+        if move == 'fold':
+            outputs = self.folding()
+        elif move == 'check':
+            outputs = self.checking(current_round_commited)
+        elif move == 'call':  # a call that is not affordable is an all-in
+            outputs = self.calling(current_round_commited) if to_call <= self.points else self.all_in()
+        elif move == 'raising':  # a raise is at least the minimum raise, a raise that is not affordable is an all-in
+            amount = max(amount, min_raise)
+            outputs = self.raising(current_round_commited, amount) if to_call + amount <= self.points else self.all_in()
+        elif move == 'all_in':
+            outputs = self.all_in()
+        else:
+            outputs = False
+        if not isinstance(outputs, dict):  # an invalid move checks if possible, otherwise folds
+            outputs = self.checking(current_round_commited) or self.folding()
+        return outputs
+
     def get_info(self):
         return {'POINTS': self.points,
                 'PAST_COMMITED': self.self_past_rounds_commited,
@@ -210,6 +337,42 @@ class Player:
                 'BET_MATCH': self.round_requirement_met}
 
 
+# %% headless player policies, "act" returns a move and the amount to raise
+class CallPolicy:
+    """
+    Check when possible, otherwise call, all-in when the call is not affordable.
+    """
+
+    @staticmethod
+    def act(player, board, current_round_commited):
+        to_call = current_round_commited - player.self_current_round_commited
+        if to_call == 0:
+            return 'check', 0
+        if to_call <= player.points:
+            return 'call', 0
+        return 'all_in', 0
+
+
+class RandomPolicy:
+    """
+    Pick a random move with the given weights, raises are a random multiple of the big blind.
+    """
+
+    def __init__(self, seed=None, weights=(1, 4, 4, 1, 0), big_blind_points=2):
+        self.rng = random.Random(seed)
+        self.moves = ['fold', 'check', 'call', 'raising', 'all_in']
+        self.weights = weights
+        self.big_blind_points = big_blind_points
+
+    def act(self, player, board, current_round_commited):
+        move = self.rng.choices(self.moves, weights=self.weights)[0]
+        if move == 'check' and current_round_commited != player.self_current_round_commited:
+            move = 'call'
+        if move == 'call' and current_round_commited - player.self_current_round_commited > player.points:
+            move = 'all_in'
+        return move, self.big_blind_points * self.rng.randint(1, 4)
+
+
 # %% comparator class definition
 class Comparator:
     """
@@ -219,8 +382,9 @@ class Comparator:
     def __init__(self):
         self._rank_value = {'2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, '8': 8, '9': 9,
                             '10': 10, 'J': 11, 'Q': 12, 'K': 13, 'A': 14}
-        self._hand_dict = {9: "straight flush", 8: "four of a kind", 7: "full house", 6: "flush", 5: "straight",
-                           4: "three of a kind", 3: "two pairs", 2: "one pair", 1: "high card"}
+        self._hand_dict = {10: "royal flush", 9: "straight flush", 8: "four of a kind", 7: "full house", 6: "flush", 5: "straight",
+                           4: "three of a kind", 3: "two pairs", 2: "one pair", 1: "high card", 0: "Initial Hand"}
+
     def num2hand(self, rating):
         return self._hand_dict[rating]
 
@@ -374,7 +538,122 @@ class Comparator:
             fifth = sorted_values[4][0]
             return [1, first, second, third, fourth, fifth]
 
+    @staticmethod
+    def encode_cards(cards):  # Card objects or strings such as '10H' to integer card codes
+        return [card.code if isinstance(card, Card) else CARD_CODES[card] for card in cards]
+
+    @staticmethod
+    def score_to_rating(score):  # unpack a hand score into the rating list returned by check_hand
+        category = score >> 20
+        return [category] + [score >> (16 - 4 * i) & 15 for i in range(_RATING_LENGTH[category] - 1)]
+
+    @staticmethod
+    def evaluate_codes(codes):  # score of the best 5 card hand out of 5 to 7 card codes, in a single pass
+        counts = [0] * 13
+        suit_masks = [0, 0, 0, 0]
+        for code in codes:
+            counts[code >> 2] += 1
+            suit_masks[code & 3] |= 1 << (code >> 2)
+        return Comparator.score_state(counts, suit_masks)
+
+    @staticmethod
+    def score_state(counts, suit_masks):  # score from the count of each rank and the rank mask of each suit
+        for mask in suit_masks:  # with 7 cards or less a flush excludes four of a kind and full house
+            if _BIT_COUNT[mask] >= 5:
+                top = _STRAIGHT_TOP[mask]
+                if top == 14:
+                    return 10 << 20
+                if top:
+                    return 9 << 20 | (top - 2) << 16
+                return 6 << 20 | _TOP_FIVE[mask]
+
+        rank_mask = suit_masks[0] | suit_masks[1] | suit_masks[2] | suit_masks[3]
+        four = -1
+        threes = []
+        twos = []
+        for r in range(12, -1, -1):
+            n = counts[r]
+            if n == 2:
+                twos.append(r)
+            elif n == 3:
+                threes.append(r)
+            elif n == 4:
+                four = r
+        if four >= 0:
+            return 8 << 20 | (four + 2) << 16 | (_TOP_FIVE[rank_mask ^ 1 << four] >> 16) << 12
+        if threes and (len(threes) > 1 or twos):
+            two = max(threes[1] if len(threes) > 1 else -1, twos[0] if twos else -1)
+            return 7 << 20 | (threes[0] + 2) << 16 | (two + 2) << 12
+        top = _STRAIGHT_TOP[rank_mask]
+        if top:
+            return 5 << 20 | (top - 2) << 16
+        if threes:
+            return 4 << 20 | (threes[0] + 2) << 16 | (_TOP_FIVE[rank_mask ^ 1 << threes[0]] >> 12) << 8
+        if len(twos) > 1:
+            kickers = rank_mask ^ 1 << twos[0] ^ 1 << twos[1]
+            return 3 << 20 | (twos[0] + 2) << 16 | (twos[1] + 2) << 12 | (_TOP_FIVE[kickers] >> 16) << 8
+        if twos:
+            return 2 << 20 | (twos[0] + 2) << 16 | (_TOP_FIVE[rank_mask ^ 1 << twos[0]] >> 8) << 4
+        return 1 << 20 | _TOP_FIVE[rank_mask]
+
+    def evaluate(self, cards):  # comparable integer score of the best 5 card hand, higher is better
+        return self.evaluate_codes(self.encode_cards(cards))
+
+    @staticmethod
+    def evaluate_batch(cards_array):  # (N, 7) array of card codes to an (N,) array of the evaluate_codes scores
+        cards_array = np.asarray(cards_array, dtype=np.int64)
+        if cards_array.ndim != 2 or not 5 <= cards_array.shape[1] <= 7:
+            raise ValueError(f'Expected an (N, 5) to (N, 7) array of card codes, got shape {cards_array.shape}.')
+        ranks = cards_array >> 2
+        suits = cards_array & 3
+        rank_bits = 1 << ranks
+
+        def top_value(mask):  # value of the highest rank in each mask, 0 for an empty mask
+            return _TOP_FIVE_ARRAY[mask] >> 16
+
+        def without(mask, value):  # remove the rank with the given value from each mask
+            return mask & ~np.where(value > 0, 1 << np.maximum(value - 2, 0), 0)
+
+        counts = (ranks[:, :, None] == np.arange(13)).sum(axis=1)
+        suit_masks = np.stack([np.where(suits == s, rank_bits, 0).sum(axis=1) for s in range(4)], axis=1)
+        flush_mask = np.where(_BIT_COUNT_ARRAY[suit_masks] >= 5, suit_masks, 0).max(axis=1)
+        flush_top = _STRAIGHT_TOP_ARRAY[flush_mask]
+        rank_mask = (counts > 0) @ _RANK_BITS_ARRAY
+        four_mask = (counts == 4) @ _RANK_BITS_ARRAY
+        three_mask = (counts == 3) @ _RANK_BITS_ARRAY
+        two_mask = (counts == 2) @ _RANK_BITS_ARRAY
+        straight_top = _STRAIGHT_TOP_ARRAY[rank_mask]
+
+        four = top_value(four_mask)
+        three_1 = top_value(three_mask)
+        three_2 = top_value(without(three_mask, three_1))
+        two_1 = top_value(two_mask)
+        two_2 = top_value(without(two_mask, two_1))
+        full_house_two = np.maximum(three_2, two_1)
+
+        conditions = [flush_top == 14,
+                      flush_top > 0,
+                      four > 0,
+                      (three_1 > 0) & (full_house_two > 0),
+                      flush_mask > 0,
+                      straight_top > 0,
+                      three_1 > 0,
+                      two_2 > 0,
+                      two_1 > 0]
+        choices = [np.full(len(cards_array), 10 << 20, dtype=np.int64),
+                   9 << 20 | (flush_top - 2) << 16,
+                   8 << 20 | four << 16 | top_value(without(rank_mask, four)) << 12,
+                   7 << 20 | three_1 << 16 | full_house_two << 12,
+                   6 << 20 | _TOP_FIVE_ARRAY[flush_mask],
+                   5 << 20 | (straight_top - 2) << 16,
+                   4 << 20 | three_1 << 16 | (_TOP_FIVE_ARRAY[without(rank_mask, three_1)] >> 12) << 8,
+                   3 << 20 | two_1 << 16 | two_2 << 12 | top_value(without(without(rank_mask, two_1), two_2)) << 8,
+                   2 << 20 | two_1 << 16 | (_TOP_FIVE_ARRAY[without(rank_mask, two_1)] >> 8) << 4]
+        return np.select(conditions, choices, default=1 << 20 | _TOP_FIVE_ARRAY[rank_mask])
+
     def find_best_hand(self, cards):
+        if 5 <= len(cards) <= 7:
+            return self.score_to_rating(self.evaluate(cards))
         best_value = [0]
         possible_combos = combinations(cards, 5)
         for c in possible_combos:
@@ -388,34 +667,174 @@ class Comparator:
                         best_value = hand_value
         return best_value
 
-    def rank_cards_list(self, cards_list):
-        value_counts = defaultdict(lambda: 0)
-        for i in cards_list:
-            value_counts[str(i)] = 0
-        print(value_counts)
-        possible_combos = combinations(cards_list, 2)
-        for c in possible_combos:
-            cards_1, cards_2 = c
-            print(cards_1, cards_2)
-            value_1 = self.find_best_hand(cards_1)
-            value_2 = self.find_best_hand(cards_2)
-            print(value_1, value_2)
-            if value_1[0] > value_2[0]:
-                value_counts[str(cards_1)] += 1
-            elif value_1[0] < value_2[0]:
-                value_counts[str(cards_2)] += 1
-            else:
-                for card in range(len(value_1) - 1):
-                    if value_1[card + 1] > value_2[card + 1]:
-                        value_counts[str(cards_1)] += 1
-                        break
-                    elif value_1[card + 1] < value_2[card + 1]:
-                        value_counts[str(cards_2)] += 1
-                        break
-            print(value_counts)
+    def rank_showdown(self, cards_list):  # evaluate each hand once, return tie groups of indices (best first) and scores
+        scores = [self.evaluate(cards) for cards in cards_list]
+        groups = defaultdict(list)
+        for index, score in enumerate(scores):
+            groups[score].append(index)
+        return [groups[score] for score in sorted(groups, reverse=True)], scores
+
+    def rank_cards_list(self, cards_list):  # number of other hands each hand beats, sorted from best to worst
+        groups, _ = self.rank_showdown(cards_list)
+        value_counts = {}
+        n_beaten = len(cards_list)
+        for group in groups:
+            n_beaten -= len(group)
+            for index in group:
+                value_counts[str(cards_list[index])] = n_beaten
         return sorted(value_counts.items(), key=operator.itemgetter(1), reverse=True)
 
 
+# %% pot engine class definition
+class PotEngine:
+    """
+    Chips put in by each player during a hand, main and side pots, and the payouts at showdown.
+    -------------------------------------------------------------------------------------------------------------------
+    Every blind, call, raise and all-in is recorded with add, folded players keep their contributions in the pots.
+    The pots are the layers between the sorted contribution levels, each layer goes to the best hands among the
+    players still in the hand who reached that level (to the best hands overall if every such player folded), odd
+    chips go to the winner in the first seat. Payouts always add up to the chips put in.
+    """
+
+    def __init__(self, players):
+        self.seat = {player: index for index, player in enumerate(players)}
+        self.contributions = {player: 0 for player in players}
+        self.total = 0
+
+    def add(self, player, amount):
+        self.contributions[player] += amount
+        self.total += amount
+
+    def layers(self):  # (player, chips in the layer capped by its contribution, players paying it) from the top down
+        players = sorted(self.contributions, key=self.contributions.get)
+        for k in range(len(players) - 1, -1, -1):
+            below = self.contributions[players[k - 1]] if k else 0
+            yield players[k], (self.contributions[players[k]] - below) * (len(players) - k), len(players) - k
+
+    def pots(self, live_players):  # main pot first, then the side pots, with the names of the players who can win them
+        pots = []
+        eligible = []
+        for player, chips, n_paying in self.layers():
+            if player in live_players:
+                eligible.append(player.name)
+            if chips and pots and pots[0]['PLAYERS'] == eligible:
+                pots[0]['AMOUNT'] += chips
+            elif chips:
+                pots.insert(0, {'AMOUNT': chips, 'PLAYERS': list(eligible)})
+        return pots
+
+    def resolve(self, scores):  # scores of the players still in the hand to the chips each player gets back
+        overall_best = max(scores.values())
+        overall_winners = [player for player, score in scores.items() if score == overall_best]
+        payouts = {player: 0 for player in self.contributions}
+        best, winners = None, []
+        for player, chips, n_paying in self.layers():  # the players who reached the layer grow by one at each step
+            if player in scores:
+                if best is None or scores[player] > best:
+                    best, winners = scores[player], [player]
+                elif scores[player] == best:
+                    winners.append(player)
+            if chips:
+                layer_winners = sorted(winners or overall_winners, key=self.seat.get)
+                for winner in layer_winners:
+                    payouts[winner] += chips // len(layer_winners)
+                payouts[layer_winners[0]] += chips % len(layer_winners)
+        return payouts
+
+
+# %% betting state machine class definition
+class BettingState:
+    """
+    Betting of one hand as a state machine over the seats of "players" (Small Blind, Big Blind, other players).
+    -------------------------------------------------------------------------------------------------------------------
+    start_street(street) opens a betting round, then step(move, amount) plays the move of the player at "to_act"
+    and moves the action pointer, "to_act" is None once the street is over. The players who can still bet form a
+    ring of next/previous seats and the players left to act are always the arc of the ring after the last player
+    who acted, so counting them is enough and every step is O(1). A raise is at least "min_raise", the size of
+    the last raise and never less than the big blind.
+    """
+
+    def __init__(self, players, big_blind_points, pot=None):
+        self.players = players
+        self.big_blind_points = big_blind_points
+        self.pot = pot  # PotEngine recording the chips of every move
+        self.street = 0
+        self.current_bet = 0
+        self.min_raise = big_blind_points
+        self.to_act = None
+        self.n_pending = 0  # players left to act on this street
+        self.n_in_game = len(players)  # players who have not folded
+        self.ring_size = 0
+        self.next_seat = [None] * len(players)
+        self.previous_seat = [None] * len(players)
+
+    @property
+    def hand_over(self):  # every other player has folded
+        return self.n_in_game <= 1
+
+    @property
+    def pending(self):  # seats left to act, in order
+        seats = []
+        seat = self.to_act
+        for i in range(self.n_pending):
+            seats.append(seat)
+            seat = self.next_seat[seat]
+        return seats
+
+    def start_street(self, street):
+        n_player = len(self.players)
+        self.street = street
+        self.current_bet = self.big_blind_points if street == 0 else 0
+        self.min_raise = self.big_blind_points
+        self.n_in_game = sum(player.in_game for player in self.players)
+        first = 2 % n_player if street == 0 else 0  # pre-flop starts after the big blind, later streets at small blind
+        seats = [(first + i) % n_player for i in range(n_player)]
+        seats = [seat for seat in seats if self.players[seat].in_game and self.players[seat].points > 0]
+        self.ring_size = len(seats)
+        for i, seat in enumerate(seats):
+            self.next_seat[seat] = seats[(i + 1) % len(seats)]
+            self.previous_seat[seat] = seats[i - 1]
+
+        if self.hand_over or not seats:
+            self.n_pending = 0
+        elif len(seats) == 1:  # the last player who can bet only acts to match a bet
+            self.n_pending = int(self.players[seats[0]].self_current_round_commited < self.current_bet)
+        elif street == 0 and seats[-1] == 1:  # the big blind has matched the bet already
+            self.n_pending = len(seats) - 1
+        else:
+            self.n_pending = len(seats)
+        self.to_act = seats[0] if self.n_pending else None
+
+    def remove_seat(self, seat):  # the player folded or is all-in, its next seat stays valid for the action pointer
+        self.next_seat[self.previous_seat[seat]] = self.next_seat[seat]
+        self.previous_seat[self.next_seat[seat]] = self.previous_seat[seat]
+        self.ring_size -= 1
+
+    def step(self, move, amount=0):  # play the move of the player to act, return the player info
+        seat = self.to_act
+        player = self.players[seat]
+        commited = player.self_past_rounds_commited + player.self_current_round_commited
+        player_info = player.apply_move(self.current_bet, move, amount, self.min_raise)
+        if self.pot is not None:
+            self.pot.add(player, player.self_past_rounds_commited + player.self_current_round_commited - commited)
+        self.n_pending -= 1
+        raised = player.self_current_round_commited > self.current_bet
+        if raised:
+            self.min_raise = max(self.min_raise, player.self_current_round_commited - self.current_bet)
+            self.current_bet = player.self_current_round_commited
+        if not player.in_game:
+            self.n_in_game -= 1
+        in_ring = player.in_game and player.points > 0
+        if not in_ring:
+            self.remove_seat(seat)
+        if raised:  # a raise re-opens the betting for everyone else who can still bet
+            self.n_pending = self.ring_size - in_ring
+        if self.hand_over:
+            self.n_pending = 0
+        self.to_act = self.next_seat[seat] if self.n_pending else None
+        return player_info
+
+
 # %% game environment class definition
 class GameEnv:
     """
@@ -424,341 +843,402 @@ class GameEnv:
     Input player list "players_list" is assumed to be sorted by the seat order:
         Small Blind, Big Blind, other players.
 
+    With "headless" the game runs in process: no sockets and no prints, each player's moves come from its
+    "policy" object (see CallPolicy and RandomPolicy). Decks come from a DeckPool, "seed" makes their order reproducible.
+
+    With "decision_time" every socket decision has that many seconds plus what is left of the player's "time_bank",
+    time over "decision_time" is taken from the bank. When the time runs out the player checks if possible, otherwise
+    folds. The timer events go to "hand_record", are sent to the table as 'timer_event' and, with a recorder, are
+    written as 'time_bank' and 'timeout' rows just before the row of the move they timed.
 
+    With a "recorder" (see hand_history.HandHistoryWriter) every move is written as one hand history row, after a
+    'seat' row per player (stack, blind and hole cards) and followed by a 'showdown' (or 'uncontested') row with the
+    chips won for each player left at the end of the hand, enough to replay the hand (see replay.HandReplayer). With
+    "stats" (see player_stats.StatsAggregator) the player statistics are updated on every move. With "metrics" (see
+    metrics.ServerMetrics) the messages, streets, payouts and hand evaluations are timed, along with the response time
+    of every player and the socket errors.
     """
 
-    def __init__(self, players_list, small_blind_points=1, big_blind_points=2, recording=True):
+    def __init__(self, players_list, small_blind_points=1, big_blind_points=2, recording=True, headless=False,
+                 seed=None, decision_time=None, time_bank=0, recorder=None, table_id=None, stats=None, metrics=None):
         self.players_list = players_list
         self.small_blind_points = small_blind_points
         self.big_blind_points = big_blind_points
+        self.headless = headless
+        self.verbose = not headless
 
-        self.n_player = len(self.players_list)
         self.deck = None
+        self.deck_pool = DeckPool(seed=seed)
         self.board = None
-
-        self.record_out = pd.DataFrame()
-
-    @staticmethod
-    def communication(conn, cmd):
-        conn.send(str.encode(cmd))  # sending command to player client
-        print(f'Sent command: {cmd}')
-        player_response = str(conn.recv(20480), "utf-8")  # receiving message from player client
-        print(f'Received message: {player_response}')
-        return player_response
+        self.betting = None
+        self.pot = None
+
+        self.decision_time = decision_time
+        self.time_bank = time_bank
+        self.time_banks = {}  # player name: seconds left in the bank
+        self.n_decisions = 0
+        self.recording = recording
+        self.hand_record = []  # events of the current hand
+
+        self.recorder = recorder
+        self.stats = stats
+        self.metrics = metrics
+        self.table_id = table_id
+        self.n_hands = 0
+        self.comparator = Comparator()
+        for player in self.players_list:  # the 'You ...' lines of a Player are for its client, the table logs the moves
+            player.verbose = False
+
+    @property
+    def n_player(self):  # players can join or leave between hands, e.g. when tournament tables are balanced
+        return len(self.players_list)
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
+    def communication(self, conn, cmd, payload=None):  # one framed message, answers are read by receive_move
+        start = time.perf_counter()
+        send_message(conn, cmd, payload)  # sending command and payload to player client
+        if self.metrics is not None:
+            self.metrics.observe('communication', time.perf_counter() - start)
+        self.log(f'Sent command: {cmd} {payload}')
+
+    def send_update(self, player, cmd, payload=None):  # send a command and its payload, skipped when headless
+        if self.headless:
+            return
+        try:
+            self.communication(player.conn, cmd, payload)
+        except (TimeoutError, ConnectionError) as error:
+            self.log(f'***** WARNING: Could not send {cmd} to player {player.name}. *****')
+            if self.metrics is not None:
+                self.metrics.socket_error('timeout' if isinstance(error, TimeoutError) else 'connection')
+
+    def broadcast(self, cmd, payload=None, payloads=None):  # one message to every seat, "payloads" per seat if given
+        if self.headless:
+            return
+        start = time.perf_counter()
+        if payloads is None:
+            messages = [encode_message(cmd, payload)] * self.n_player
+        else:
+            messages = [encode_message(cmd, player_payload) for player_payload in payloads]
+        failed = broadcast_messages([player.conn for player in self.players_list], messages)
+        if self.metrics is not None:
+            self.metrics.observe('broadcast', time.perf_counter() - start)
+        self.log(f'Sent command to all players: {cmd}')
+        for conn in failed:
+            self.log(f'***** WARNING: Could not send {cmd} to connection {conn}. *****')
+            if self.metrics is not None:
+                self.metrics.socket_error('connection')
+
+    def record_event(self, event, player, round_index, **info):  # a timer event for the hand record, history and table
+        event_info = {'EVENT': event, 'PLAYER': player.name, 'ROUND': round_index, **info}
+        if self.recording:
+            self.hand_record.append(event_info)
+        if self.recorder is not None:
+            self.record_timer(player, round_index, event_info)
+        self.broadcast('timer_event', event_info)
+
+    def decision_limit(self, player):  # seconds for the next decision of the player, None without decision timers
+        if self.decision_time is None:
+            return None
+        return self.decision_time + self.time_banks.setdefault(player.name, self.time_bank)
+
+    def receive_move(self, player, start, limit):  # the answer to the current decision, a non-dict one as an empty move
+        while True:
+            if limit is not None:
+                player.conn.settimeout(max(limit - (time.monotonic() - start), 0.001))
+            player_cmd, client_info = recv_message(player.conn)
+            self.log(f'Received message: {player_cmd} {client_info}')
+            if player_cmd != 'player_move':  # a late heartbeat answer or another stray frame
+                continue
+            if not isinstance(client_info, dict):  # played as an invalid move: check if possible, otherwise fold
+                return {}
+            if client_info.get('DECISION', self.n_decisions) == self.n_decisions:  # not a late answer to an earlier one
+                return client_info
+
+    def request_move(self, player, round_index, outputs):  # play the next move of the player, return the player info
+        if self.headless:
+            move, amount = player.policy.act(player, self.board, self.betting.current_bet)
+            return self.betting.step(move, amount)
+        self.n_decisions += 1
+        limit = self.decision_limit(player)
+        outputs = dict(outputs, DECISION=self.n_decisions, TIME_LIMIT=limit)
+        start = time.monotonic()
+        previous_timeout = player.conn.gettimeout()
+        client_info = None
+        try:
+            if limit is not None:
+                player.conn.settimeout(limit)
+            self.communication(player.conn, f'request_round_{round_index}_move', outputs)
+            client_info = self.receive_move(player, start, limit)
+        except (TimeoutError, ConnectionError) as error:
+            client_info = None
+            if self.metrics is not None:
+                self.metrics.socket_error('timeout' if isinstance(error, TimeoutError) else 'connection')
+        finally:
+            player.conn.settimeout(previous_timeout)
+        elapsed = time.monotonic() - start
+        if self.metrics is not None and client_info is not None:
+            self.metrics.observe_latency(player.name, elapsed)
+        if limit is not None:
+            bank_used = min(max(elapsed - self.decision_time, 0), self.time_banks[player.name])
+            if bank_used > 0:
+                self.time_banks[player.name] -= bank_used
+                self.record_event('time_bank', player, round_index, ELAPSED=elapsed, BANK_USED=bank_used,
+                                  BANK_LEFT=self.time_banks[player.name])
+            if elapsed > limit:  # an answer after the deadline is ignored
+                client_info = None
+        if client_info is None:  # a player who does not answer in time checks if possible, otherwise folds
+            player_info = self.betting.step('timeout')
+            self.log(f'***** WARNING: No move from player {player.name} in time, {player_info["MOVE"]}. *****')
+            self.record_event('timeout', player, round_index, ELAPSED=elapsed, TIME_LIMIT=limit,
+                              MOVE=player_info['MOVE'])
+            self.send_update(player, 'move_timeout', player_info)
+            return player_info
+        amount = client_info.get('RAISE_AMOUNT', 0)
+        if not isinstance(amount, int) or isinstance(amount, bool):
+            amount = 0
+        player_info = self.betting.step(client_info.get('MOVE'), amount)
+        if (player_info['MOVE'], player_info['CURRENT_COMMITED']) != (client_info.get('MOVE'),
+                                                                     client_info.get('CURRENT_COMMITED')):
+            self.send_update(player, 'move_corrected', player_info)  # e.g. a raise below the minimum raise
+        return player_info
 
     def initialize_player_cards(self):
-        outputs = {}
+        outputs = []
         for player in self.players_list:
-            print(f'----- Initialize hands for player {player.name} -----')
+            self.log(f'----- Initialize hands for player {player.name} -----')
             player.dealed_card(self.deck.draw_card())  # player draws a card
-            outputs['first_card'] = str(player.hand[0])
             player.dealed_card(self.deck.draw_card())  # player draws another card
-            outputs['second_card'] = str(player.hand[1])
-
-            if self.communication(player.conn, 'sending_initial_hand') == 'acknowledged_initial_hand':
-                player.conn.send(str.encode(str(outputs)))
+            outputs.append({'first_card': str(player.hand[0]), 'second_card': str(player.hand[1])})
+        self.broadcast('sending_initial_hand', payloads=outputs)
 
     def apply_blinds(self):
-        print(f'----- apply blinds for players -----')
-        self.players_list[0].points -= self.small_blind_points  # small blind player
-        self.players_list[0].self_current_round_commited = self.small_blind_points
-        if self.communication(self.players_list[0].conn, 'sending_small_blind') == 'acknowledged_small_blind':
-            self.players_list[0].conn.send(str.encode(str(self.small_blind_points)))
-
-        self.players_list[1].points -= self.big_blind_points  # big blind player
-        self.players_list[1].self_current_round_commited = self.big_blind_points
-        if self.communication(self.players_list[1].conn, 'sending_big_blind') == 'acknowledged_big_blind':
-            self.players_list[1].conn.send(str.encode(str(self.big_blind_points)))
+        self.log(f'----- apply blinds for players -----')
+        small_blind = min(self.small_blind_points, self.players_list[0].points)  # a short stack posts what it has
+        self.players_list[0].points -= small_blind  # small blind player
+        self.players_list[0].self_current_round_commited = small_blind
+        self.pot.add(self.players_list[0], small_blind)
+        self.send_update(self.players_list[0], 'sending_small_blind', small_blind)
+
+        big_blind = min(self.big_blind_points, self.players_list[1].points)
+        self.players_list[1].points -= big_blind  # big blind player
+        self.players_list[1].self_current_round_commited = big_blind
+        self.pot.add(self.players_list[1], big_blind)
+        self.send_update(self.players_list[1], 'sending_big_blind', big_blind)
 
     def initial_points(self, initial_points=1000):
+        self.log(f'----- ----- Initialize points for all players ----- -----')
         for player in self.players_list:
-            print(f'----- ----- Initialize points for player {player.name} ----- -----')
-            if self.communication(player.conn, 'sending_initial_points') == 'acknowledged_initial_points':
-                player.conn.send(str.encode(str(initial_points)))
-                player.points = initial_points
+            player.points = initial_points
+        self.broadcast('sending_initial_points', initial_points)
 
     def reset(self):
-        print(self.players_list)
+        self.log(self.players_list)
         for player in self.players_list:
             player.hand = []
             player.round_requirement_met = False
             player.in_game = True
+            player.self_past_rounds_commited = 0
+            player.self_current_round_commited = 0
             player.all_available_cards = None
             player.best_hand_rating = None
             player.game_end_return = 0
-            self.communication(player.conn, 'game_start_reset')
-        self.deck = Deck(1)
-        self.deck.shuffle()
+        self.n_hands += 1
+        self.hand_record = []
+        self.broadcast('game_start_reset')
+        self.deck = self.deck_pool.next_deck()
         self.board = []
 
     def game_start_setup(self):  # distribute initial points apply blinds and each player draws two cards
-        print(f'----- ----- ----- ----- ----- ----- ----- ---- ----- ----- ----- ----- ----- -----')
-        print(f'----- ----- ----- ----- ----- ----- Game Start ----- ----- ----- ----- ----- -----')
-        print(f'----- ----- ----- ----- ----- ----- ----- ---- ----- ----- ----- ----- ----- -----')
+        self.log(f'----- ----- ----- ----- ----- ----- ----- ---- ----- ----- ----- ----- ----- -----')
+        self.log(f'----- ----- ----- ----- ----- ----- Game Start ----- ----- ----- ----- ----- -----')
+        self.log(f'----- ----- ----- ----- ----- ----- ----- ---- ----- ----- ----- ----- ----- -----')
         self.reset()
+        self.pot = PotEngine(self.players_list)
         self.apply_blinds()
         self.initialize_player_cards()
-
-    def round_start_setup(self, round_0=False):  # set all players' round reqirement to not met
+        if self.recorder is not None:
+            self.record_seats()
+        self.betting = BettingState(self.players_list, self.big_blind_points, self.pot)
+        if self.stats is not None:
+            self.stats.start_hand([player.name for player in self.players_list])
+
+    def play_hand(self):  # play one full hand, from the blinds to the payouts
+        self.game_start_setup()
+        for round_index in range(4):
+            if self.betting.hand_over:  # every other player folded, no more cards are dealt
+                break
+            self.play_street(round_index)
+        self.game_end_update()
+
+    def record_move(self, player, round_index, player_info):  # one hand history row
+        if self.board:
+            best_hand = self.comparator.num2hand(self.comparator.evaluate(self.board + player.hand) >> 20)
+        else:
+            best_hand = self.comparator.num2hand(0)
+        self.recorder.write({'player': player.name,
+                             'hand': str(player.hand),
+                             'board': str(self.board),
+                             'move': player_info['MOVE'],
+                             'amount': player_info.get('RAISE_AMOUNT', 0),
+                             'past_bet': player_info['PAST_COMMITED'],
+                             'current_bet': player_info['CURRENT_COMMITED'],
+                             'in_game': player_info['IN_GAME'],
+                             'best_hand': best_hand,
+                             'table': str(self.table_id),
+                             'hand_id': self.n_hands,
+                             'round': round_index,
+                             'time': time.time()})
+
+    def record_timer(self, player, round_index, event_info):  # one hand history row, times in milliseconds
+        if event_info['EVENT'] == 'time_bank':  # seconds taken from the bank and seconds left in it
+            amount, current_bet = event_info['BANK_USED'], event_info['BANK_LEFT']
+        else:  # seconds waited and the time limit, none for a disconnected player without a decision timer
+            amount, current_bet = event_info['ELAPSED'], event_info['TIME_LIMIT'] or 0
+        self.recorder.write({'player': player.name,
+                             'hand': str(player.hand),
+                             'board': str(self.board),
+                             'move': event_info['EVENT'],
+                             'amount': round(amount * 1000),
+                             'past_bet': round(event_info['ELAPSED'] * 1000),
+                             'current_bet': round(current_bet * 1000),
+                             'in_game': player.in_game,
+                             'best_hand': self.comparator.num2hand(0),
+                             'table': str(self.table_id),
+                             'hand_id': self.n_hands,
+                             'round': round_index,
+                             'time': time.time()})
+
+    def record_seats(self):  # one 'seat' row per player in seat order: stack before the blinds, blind and hole cards
+        for index, player in enumerate(self.players_list):
+            self.recorder.write({'player': player.name,
+                                 'hand': str(player.hand),
+                                 'board': str(self.board),
+                                 'move': 'seat',
+                                 'amount': player.points + player.self_current_round_commited,
+                                 'past_bet': 0,
+                                 'current_bet': [self.small_blind_points, self.big_blind_points, 0][min(index, 2)],
+                                 'in_game': True,
+                                 'best_hand': self.comparator.num2hand(0),
+                                 'table': str(self.table_id),
+                                 'hand_id': self.n_hands,
+                                 'round': 0,
+                                 'time': time.time()})
+
+    def record_result(self, scores):  # one hand history row per player left in the hand, round 4 is the result
+        move = 'showdown' if len(scores) > 1 else 'uncontested'
+        for player in scores:
+            self.recorder.write({'player': player.name,
+                                 'hand': str(player.hand),
+                                 'board': str(self.board),
+                                 'move': move,
+                                 'amount': player.game_end_return,
+                                 'past_bet': player.self_past_rounds_commited,
+                                 'current_bet': 0,
+                                 'in_game': True,
+                                 'best_hand': self.comparator.num2hand(player.best_hand_rating[0]),
+                                 'table': str(self.table_id),
+                                 'hand_id': self.n_hands,
+                                 'round': 4,
+                                 'time': time.time()})
+
+    def play_street(self, round_index):  # deal the street, then one betting round through the betting state machine
+        self.log(f'----- ----- ----- ----- Round {round_index} Starts ----- ----- ----- -----')
+        start = time.perf_counter()
+        if round_index == 1:
+            for i in range(3):  # add 3 cards to the board
+                self.board.append(self.deck.draw_card())
+        elif round_index > 1:
+            self.board.append(self.deck.draw_card())  # add a card to the board
+        self.betting.start_street(round_index)
+        while self.betting.to_act is not None:
+            player = self.players_list[self.betting.to_act]
+            self.log(f'----- Player {player.name} move -----')
+            outputs = {'HAND': player.hand,
+                       'BOARD': self.board,
+                       'CURRENT_BET': self.betting.current_bet,
+                       'MIN_RAISE': self.betting.min_raise}
+            facing_raise = self.betting.current_bet > max(player.self_current_round_commited,
+                                                          self.big_blind_points if round_index == 0 else 0)
+            current_bet = self.betting.current_bet
+            player_info = self.request_move(player, round_index, outputs)
+            self.log(f'Received player info: {player_info}')
+            if self.stats is not None:
+                self.stats.record_move(player.name, round_index, player_info['MOVE'], facing_raise,
+                                       raised=player_info['CURRENT_COMMITED'] > current_bet)
+            if self.recorder is not None:
+                self.record_move(player, round_index, player_info)
+        self.log(f'----- ----- ----- Round End Update ----- ----- -----')
         for player in self.players_list:
-            player.round_requirement_met = False
-            if player.name == self.players_list[1].name and round_0:
-                player.round_requirement_met = True
-
-    def round_0_play(self):  # need to check number of players still in tournament
-        print(f'----- ----- ----- ----- Round 0 Starts ----- ----- ----- -----')
-        self.round_start_setup(round_0=True)
-        iteration = 2  # skipping small and big blind
-        round_continues = True
-        current_round_commited = 2
-        while round_continues:
-            round_requirement = [True]
-            player_index = iteration % self.n_player
-            if self.players_list[player_index].points > 0 and self.players_list[player_index].in_game:  # check if player has all-in or folded
-                print(f'----- Player {self.players_list[player_index].name} move -----')
-
-                outputs = {'HAND': str(self.players_list[player_index].hand),
-                           'BOARD': str(self.board),
-                           'CURRENT_BET': str(current_round_commited)}
-                if self.communication(self.players_list[player_index].conn, 'request_round_0_move') == 'acknowledged_request':
-                    self.players_list[player_index].conn.send(str.encode(str(outputs)))
-
-                player_info = str(self.players_list[player_index].conn.recv(20480), "utf-8")
-                player_info = ast.literal_eval(player_info)
-                print(f'Received player info: {player_info}')
-
-                self.players_list[player_index].points = player_info['POINTS']
-                self.players_list[player_index].self_past_rounds_commited = player_info['PAST_COMMITED']
-                self.players_list[player_index].self_current_round_commited = player_info['CURRENT_COMMITED']
-                self.players_list[player_index].in_game = player_info['IN_GAME']
-                self.players_list[player_index].round_requirement_met = player_info['BET_MATCH']
-                if player_info['CURRENT_COMMITED'] > current_round_commited:
-                    current_round_commited = player_info['CURRENT_COMMITED']
-                iteration += 1
-                if player_info['MOVE'] != 'raising':
-                    for player in self.players_list:  # append current round
-                        if player.points >= 0 and player.in_game:
-                            round_requirement.append(player.round_requirement_met)
-                    if all(item is True for item in round_requirement):  # check to end current round
-                        if current_round_commited == 2:
-                            round_continues = False
-            if round_continues is False:
-                for player in self.players_list:
-                    print(f'----- ----- ----- Player {self.players_list[player_index].name} Round End Update ----- ----- -----')
-                    player.self_past_rounds_commited += player.self_current_round_commited
-                    player.self_current_round_commited = 0
-                    self.communication(player.conn, 'round_end_update')
-        print(f'----- ----- ----- ----- Round 0 Ends ----- ----- ----- -----')
-
-    def round_1_play(self):
-        print(f'----- ----- ----- ----- Round 1 Starts ----- ----- ----- -----')
-        self.round_start_setup()
-        for i in range(3):  # add 3 cards to the board
-            self.board.append(self.deck.draw_card())
-        iteration = 0  # start at small blind
-        round_continues = True
-        current_round_commited = 0
-        while round_continues:
-            round_requirement = [True]
-            player_index = iteration % self.n_player
-            if self.players_list[player_index].points > 0 and self.players_list[player_index].in_game:  # check if player has all-in or folded
-                print(f'----- Player {self.players_list[player_index].name} move -----')
-
-                outputs = {'HAND': str(self.players_list[player_index].hand),
-                           'BOARD': str(self.board),
-                           'CURRENT_BET': str(current_round_commited)}
-                if self.communication(self.players_list[player_index].conn,
-                                      'request_round_1_move') == 'acknowledged_request':
-                    self.players_list[player_index].conn.send(str.encode(str(outputs)))
-
-                player_info = str(self.players_list[player_index].conn.recv(20480), "utf-8")
-                player_info = ast.literal_eval(player_info)
-                print(f'Received player info: {player_info}')
-
-                self.players_list[player_index].points = player_info['POINTS']
-                self.players_list[player_index].self_past_rounds_commited = player_info['PAST_COMMITED']
-                self.players_list[player_index].self_current_round_commited = player_info['CURRENT_COMMITED']
-                self.players_list[player_index].in_game = player_info['IN_GAME']
-                self.players_list[player_index].round_requirement_met = player_info['BET_MATCH']
-                if player_info['CURRENT_COMMITED'] > current_round_commited:
-                    current_round_commited = player_info['CURRENT_COMMITED']
-                iteration += 1
-                if player_info['MOVE'] != 'raising':
-                    for player in self.players_list:  # append current round
-                        if player.points >= 0 and player.in_game:
-                            round_requirement.append(player.round_requirement_met)
-                    if all(item is True for item in round_requirement):  # check to end current round
-                        round_continues = False
-                if round_continues is False:
-                    print(f'----- ----- ----- Round End Update ----- ----- -----')
-                    for player in self.players_list:
-                        player.self_past_rounds_commited += player.self_current_round_commited
-                        player.self_current_round_commited = 0
-                        self.communication(self.players_list[player_index].conn, 'round_end_update')
-        print(f'----- ----- ----- ----- Round 1 Ends ----- ----- ----- -----')
-
-    def round_2_play(self):
-        print(f'----- ----- ----- ----- Round 2 Starts ----- ----- ----- -----')
-        self.round_start_setup()
-        self.board.append(self.deck.draw_card())  # add a card to the board
-        iteration = 0  # start at small blind
-        round_continues = True
-        current_round_commited = 0
-        while round_continues:
-            round_requirement = [True]
-            player_index = iteration % self.n_player
-            if self.players_list[player_index].points > 0 and self.players_list[player_index].in_game:  # check if player has all-in or folded
-                print(f'----- Player {self.players_list[player_index].name} move -----')
-
-                outputs = {'HAND': str(self.players_list[player_index].hand),
-                           'BOARD': str(self.board),
-                           'CURRENT_BET': str(current_round_commited)}
-                if self.communication(self.players_list[player_index].conn,
-                                      'request_round_2_move') == 'acknowledged_request':
-                    self.players_list[player_index].conn.send(str.encode(str(outputs)))
-
-                player_info = str(self.players_list[player_index].conn.recv(20480), "utf-8")
-                player_info = ast.literal_eval(player_info)
-                print(f'Received player info: {player_info}')
-
-                self.players_list[player_index].points = player_info['POINTS']
-                self.players_list[player_index].self_past_rounds_commited = player_info['PAST_COMMITED']
-                self.players_list[player_index].self_current_round_commited = player_info['CURRENT_COMMITED']
-                self.players_list[player_index].in_game = player_info['IN_GAME']
-                self.players_list[player_index].round_requirement_met = player_info['BET_MATCH']
-                if player_info['CURRENT_COMMITED'] > current_round_commited:
-                    current_round_commited = player_info['CURRENT_COMMITED']
-                iteration += 1
-                if player_info['MOVE'] != 'raising':
-                    for player in self.players_list:  # append current round
-                        if player.points >= 0 and player.in_game:
-                            round_requirement.append(player.round_requirement_met)
-                    if all(item is True for item in round_requirement):  # check to end current round
-                        round_continues = False
-                if round_continues is False:
-                    print(f'----- ----- ----- Round End Update ----- ----- -----')
-                    for player in self.players_list:
-                        player.self_past_rounds_commited += player.self_current_round_commited
-                        player.self_current_round_commited = 0
-                        self.communication(self.players_list[player_index].conn, 'round_end_update')
-        print(f'----- ----- ----- ----- Round 2 Ends ----- ----- ----- -----')
-
-    def round_3_play(self):
-        print(f'----- ----- ----- ----- Round 3 Starts ----- ----- ----- -----')
-        self.round_start_setup()
-        self.board.append(self.deck.draw_card())  # add a card to the board
-        iteration = 0  # start at small blind
-        round_continues = True
-        current_round_commited = 0
-        while round_continues:
-            round_requirement = [True]
-            player_index = iteration % self.n_player
-            if self.players_list[player_index].points > 0 and self.players_list[player_index].in_game:  # check if player has all-in or folded
-                print(f'----- Player {self.players_list[player_index].name} move -----')
-
-                outputs = {'HAND': str(self.players_list[player_index].hand),
-                           'BOARD': str(self.board),
-                           'CURRENT_BET': str(current_round_commited)}
-                if self.communication(self.players_list[player_index].conn,
-                                      'request_round_3_move') == 'acknowledged_request':
-                    self.players_list[player_index].conn.send(str.encode(str(outputs)))
-
-                player_info = str(self.players_list[player_index].conn.recv(20480), "utf-8")
-                player_info = ast.literal_eval(player_info)
-                print(f'Received player info: {player_info}')
-
-                self.players_list[player_index].points = player_info['POINTS']
-                self.players_list[player_index].self_past_rounds_commited = player_info['PAST_COMMITED']
-                self.players_list[player_index].self_current_round_commited = player_info['CURRENT_COMMITED']
-                self.players_list[player_index].in_game = player_info['IN_GAME']
-                self.players_list[player_index].round_requirement_met = player_info['BET_MATCH']
-                if player_info['CURRENT_COMMITED'] > current_round_commited:
-                    current_round_commited = player_info['CURRENT_COMMITED']
-                iteration += 1
-                if player_info['MOVE'] != 'raising':
-                    for player in self.players_list:
-                        if player.points >= 0 and player.in_game:
-                            round_requirement.append(player.round_requirement_met)
-                    if all(item is True for item in round_requirement):  # check to end current round
-                        round_continues = False
-                if round_continues is False:
-                    print(f'----- ----- ----- Round End Update ----- ----- -----')
-                    for player in self.players_list:
-                        player.self_past_rounds_commited += player.self_current_round_commited
-                        player.self_current_round_commited = 0
-                        self.communication(self.players_list[player_index].conn, 'round_end_update')
-        print(f'----- ----- ----- ----- Round 3 Ends ----- ----- ----- -----')
+            player.self_past_rounds_commited += player.self_current_round_commited
+            player.self_current_round_commited = 0
+        self.broadcast('round_end_update')
+        if self.metrics is not None:
+            self.metrics.observe(f'street_{round_index}', time.perf_counter() - start)
+        self.log(f'----- ----- ----- ----- Round {round_index} Ends ----- ----- ----- -----')
 
     def game_end_update(self):
-        print(f'----- ----- ----- ----- ----- Game End Update ----- ----- ----- ----- -----')
-        comparator = Comparator()
+        self.log(f'----- ----- ----- ----- ----- Game End Update ----- ----- ----- ----- -----')
+        start = time.perf_counter()
+        evaluation_time = 0  # seconds spent in the Comparator
+        comparator = self.comparator
         hand_dict = {}
         commited_dict = {}
         return_dict = {}
-        points_list = []
-        index_list = []
-        cards_list = []
-        for index in range(len(self.players_list)):
-            if self.players_list[index].in_game:
-                hand_dict.update({self.players_list[index].name: self.players_list[index].hand})
-
-                self.players_list[index].self_past_rounds_commited += self.players_list[index].self_current_rounds_commited
-                self.players_list[index].self_current_rounds_commited = 0
-                commited_dict.update({self.players_list[index].name: self.players_list[index].self_past_rounds_commited})
-
-                points_list.append(self.players_list[index].self_past_rounds_commited)
-
-                all_available_cards = self.board
-                for card in self.players_list[index].hand:
-                    all_available_cards.append(card)
-                self.players_list[index].all_available_cards = all_available_cards
-                index_list.append(index)
-                cards_list.append(all_available_cards)
-
-        rank_list = comparator.rank_cards_list(cards_list)
-        ranks = [i[1] for i in rank_list]
-        ranks_set = set(ranks)
-        for rank in np.arange(-1, -len(ranks_set), -1):
-            if sum(points_list) > 0:
-                winner_bet_total = 0
-                rank_list_temp = list(filter(None, [i[0] if i[1] == ranks[rank] else None for i in rank_list]))
-                for player in self.players_list:
-                    if str(player.all_available_cards) in rank_list_temp:
-                        winner_bet_total += player.self_past_rounds_commited
-                winner_points_list = [min(winner_bet_total, i) for i in points_list]
-                points_list = list(np.array(points_list) - np.array(winner_points_list))
-                for player in self.players_list:
-                    if str(player.all_available_cards) in rank_list_temp:
-                        player.game_end_return = floor(sum(winner_points_list) *
-                                                       player.self_past_rounds_commited/winner_bet_total)
-                    return_dict.update({self.players_list[index].name: self.players_list[index].game_end_return})
+        scores = {}
+        for player in self.players_list:
+            player.self_past_rounds_commited += player.self_current_round_commited
+            player.self_current_round_commited = 0
+            if player.in_game:
+                hand_dict.update({player.name: player.hand})
+                commited_dict.update({player.name: player.self_past_rounds_commited})
+                player.all_available_cards = self.board + player.hand
+                evaluation_start = time.perf_counter()
+                scores[player] = comparator.evaluate(player.all_available_cards)
+                player.best_hand_rating = comparator.score_to_rating(scores[player])
+                evaluation_time += time.perf_counter() - evaluation_start
+
+        pots = self.pot.pots(scores)
+        payouts = self.pot.resolve(scores)
+        for player in self.players_list:
+            player.game_end_return = payouts[player]
+            return_dict.update({player.name: player.game_end_return})
+            if player.best_hand_rating is None:  # folded players still get told their best hand
+                evaluation_start = time.perf_counter()
+                player.best_hand_rating = comparator.find_best_hand(self.board + player.hand)
+                evaluation_time += time.perf_counter() - evaluation_start
+        if self.recorder is not None:
+            self.record_result(scores)
+        if self.stats is not None:
+            for player in scores:
+                self.stats.record_result(player.name, len(scores) > 1, player.game_end_return > 0)
 
         # print(f'Remaining player hands: {hand_dict}')
         # print(f'Player bets: {commited_dict}')
         # print(f'Player returns: {return_dict}')
 
+        outputs = []
         for player in self.players_list:
-            print(f'----- ----- ----- ----- Game End Player {player.name} Update ----- ----- ----- -----')
-            if self.communication(player.conn, 'game_end_hand_update') == 'acknowledged_game_end_hand_update':
-                player.conn.send(str.encode(str(hand_dict)))
-
-            if self.communication(player.conn, 'game_end_bet_update') == 'acknowledged_game_end_bet_update':
-                player.conn.send(str.encode(str(commited_dict)))
-
-            if self.communication(player.conn, 'game_end_return_update') == 'acknowledged_game_end_return_update':
-                player.conn.send(str.encode(str(return_dict)))
-
-            outputs = {'TOTAL_COMMITED': player.self_past_rounds_commited,
-                       'END_RETURN': player.game_end_return,
-                       'BOARD': self.board,
-                       'YOUR_HAND': player.hand,
-                       'YOUR_BEST_HAND': comparator.num2hand(comparator.find_best_hand(player.all_available_cards)[0])}
-            if self.communication(player.conn, 'game_end_points_update') == 'acknowledged_game_end_points_update':
-                player.conn.send(str.encode(str(outputs)))
-
+            outputs.append({'HANDS': hand_dict,
+                            'BETS': commited_dict,
+                            'RETURNS': return_dict,
+                            'POTS': pots,
+                            'TOTAL_COMMITED': player.self_past_rounds_commited,
+                            'END_RETURN': player.game_end_return,
+                            'BOARD': self.board,
+                            'YOUR_HAND': player.hand,
+                            'YOUR_BEST_HAND': comparator.num2hand(player.best_hand_rating[0])})
             player.points += player.game_end_return
-            self.players_list.append(self.players_list[0])
-            self.players_list.pop(0)
+        self.log(f'----- ----- ----- ----- Game End Players Update ----- ----- ----- -----')
+        self.broadcast('game_end_update', payloads=outputs)
+        self.players_list.append(self.players_list[0])  # the blinds move to the next seat
+        self.players_list.pop(0)
+        if self.metrics is not None:
+            self.metrics.observe('comparator', evaluation_time)
+            self.metrics.observe('game_end_update', time.perf_counter() - start)
+            self.metrics.hand_played()
 
 
 # %%
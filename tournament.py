@@ -0,0 +1,125 @@
+# %% import libraries
+import random
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil
+from texas_holdem import *
+
+
+# %% tournament parameters
+BLIND_LEVELS = [(1, 2), (2, 4), (3, 6), (5, 10), (10, 20), (15, 30), (25, 50), (50, 100), (75, 150), (100, 200),
+                (150, 300), (200, 400), (300, 600), (500, 1000), (1000, 2000)]
+
+
+# %% multi-table tournament class definition
+class Tournament:
+    """
+    Multi-table tournament over many GameEnv tables.
+    -------------------------------------------------------------------------------------------------------------------
+    Registered players are seated at random over tables of at most "table_size" players. Every table plays its hand
+    at the same time (hand for hand), then busted players leave, tables are broken or balanced so table sizes differ
+    by at most one, and the blinds follow "blind_levels", a list of (small blind, big blind) going up every
+    "hands_per_level" hands. Players busted in the same hand are placed by their stack at the start of that hand,
+    the larger stack finishing higher. "decision_time" and "time_bank" set the decision timers of every table (see
+    GameEnv), a player moved to another table keeps what is left of their time bank.
+    "recorder", "stats" and "metrics" are the hand history writer, the player statistics and the server metrics the
+    tables share.
+    """
+
+    def __init__(self, players, table_size=9, starting_points=1000, blind_levels=None, hands_per_level=10,
+                 headless=False, seed=None, max_workers=None, decision_time=None, time_bank=0,
+                 recorder=None, stats=None, metrics=None):
+        self.players = players
+        self.table_size = table_size
+        self.starting_points = starting_points
+        self.blind_levels = BLIND_LEVELS if blind_levels is None else blind_levels
+        self.hands_per_level = hands_per_level
+        self.headless = headless
+        self.seed = seed
+        self.decision_time = decision_time
+        self.time_bank = time_bank
+        self.recorder = recorder
+        self.stats = stats
+        self.metrics = metrics
+        self.rng = random.Random(seed)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        self.tables = []  # one GameEnv per table
+        self.n_hands = 0
+        self.busted = []  # players in the order they busted
+        self.starting_stacks = {}  # player: points at the start of the current hand
+        self.stopped = False
+
+    def blinds(self):  # (small blind, big blind) of the current level
+        level = min(self.n_hands // self.hands_per_level, len(self.blind_levels) - 1)
+        return self.blind_levels[level]
+
+    def n_tables_needed(self, n_alive):
+        return max(1, min(ceil(n_alive / self.table_size), n_alive // 2))
+
+    def seat_players(self):
+        players = list(self.players)
+        self.rng.shuffle(players)
+        n_tables = self.n_tables_needed(len(players))
+        for index in range(n_tables):
+            table_seed = None if self.seed is None else self.seed + index
+            env = GameEnv(players[index::n_tables], headless=self.headless, seed=table_seed,
+                          decision_time=self.decision_time, time_bank=self.time_bank, recorder=self.recorder,
+                          table_id=f'tournament-{index}', stats=self.stats, metrics=self.metrics)
+            env.initial_points(initial_points=self.starting_points)
+            self.tables.append(env)
+
+    def remove_busted(self):  # players busted in the same hand leave in order of their starting stack, smallest first
+        busted = [(player, env) for env in self.tables for player in env.players_list if player.points <= 0]
+        busted.sort(key=lambda pair: self.starting_stacks.get(pair[0], 0))
+        for player, env in busted:
+            env.players_list.remove(player)
+            env.send_update(player, 'tournament_bust', {'PLACE': len(self.players) - len(self.busted)})
+            self.busted.append(player)
+            env.log(f'----- Player {player.name} busted -----')
+
+    @staticmethod
+    def move_player(player, source, target):  # the player keeps the time bank left at the old table
+        source.players_list.remove(player)
+        target.players_list.append(player)
+        if player.name in source.time_banks:
+            target.time_banks[player.name] = source.time_banks.pop(player.name)
+
+    def balance_tables(self):  # break the smallest tables, then move players from the largest to the smallest table
+        n_alive = sum(env.n_player for env in self.tables)
+        while len(self.tables) > self.n_tables_needed(n_alive):
+            broken = min(self.tables, key=lambda env: env.n_player)
+            self.tables.remove(broken)
+            for player in list(broken.players_list):
+                self.move_player(player, broken, min(self.tables, key=lambda env: env.n_player))
+        while True:
+            largest = max(self.tables, key=lambda env: env.n_player)
+            smallest = min(self.tables, key=lambda env: env.n_player)
+            if largest.n_player - smallest.n_player <= 1:
+                break
+            self.move_player(largest.players_list[-1], largest, smallest)
+
+    def play_hand_round(self):  # every table plays one hand in parallel
+        small_blind, big_blind = self.blinds()
+        for env in self.tables:
+            env.small_blind_points = small_blind
+            env.big_blind_points = big_blind
+        self.starting_stacks = {player: player.points for env in self.tables for player in env.players_list}
+        list(self.executor.map(GameEnv.play_hand, self.tables))
+        self.n_hands += 1
+
+    def stop(self):  # from another thread, the tournament ends after the hands in progress
+        self.stopped = True
+
+    def run(self, max_hands=None):  # play until one player has every point, return the names from first place down
+        self.seat_players()
+        try:
+            while sum(env.n_player for env in self.tables) > 1 and (max_hands is None or self.n_hands < max_hands) \
+                    and not self.stopped:
+                self.play_hand_round()
+                self.remove_busted()
+                self.balance_tables()
+        finally:  # the table threads end with the tournament, even a failed one
+            self.executor.shutdown()
+        remaining = sorted((player for env in self.tables for player in env.players_list),
+                           key=lambda player: player.points, reverse=True)
+        return [player.name for player in remaining + self.busted[::-1]]